@@ -0,0 +1,9 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+from .api import convert, Conversion, ConversionResult
+from .utils import AlgoFsmError
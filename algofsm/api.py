@@ -0,0 +1,98 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# In-process conversion API. Each conversion keeps its state in its own
+# objects, nothing is shared between conversions, so it can be used from
+# several threads or asyncio tasks at once. Errors are raised as
+# AlgoFsmError instead of exiting
+#
+#   from algofsm import convert
+#   res = convert(text, {"behav": False, "clk": "clk"}, file="design.v")
+#   print(res.output)
+# ------------------------------------------------------------------------------
+import io
+import time
+from . import utils
+from . import cli
+from . import block_cache
+from . import parse_input
+from . import state_profile
+from . import vlog_prep
+
+# only meaningful on the command line
+CLI_ONLY = (
+    "file",
+    "out",
+    "deps",
+    "pair",
+    "batch",
+    "jobs",
+    "watch",
+    "watch_interval",
+    "stats",
+)
+
+
+class ConversionResult:
+    def __init__(self, output, warnings, blocks, secs):
+        self.output = output  # converted text
+        self.warnings = warnings  # list of warning messages
+        self.blocks = blocks  # number of SM blocks converted
+        self.secs = secs
+
+
+# --------------------------------------------------------------------
+# Context of one conversion: its options and what it has found
+# --------------------------------------------------------------------
+class Conversion:
+    def __init__(self, options=None, file="<input>"):
+        args = cli.makeCmdParser().parse_args([])
+        for name, val in (options or {}).items():
+            if name in CLI_ONLY or not hasattr(args, name):
+                raise ValueError(f"unknown conversion option '{name}'")
+            setattr(args, name, val)
+        self.args = cli.finishArgs(args)
+        self.args.file = file
+        self.warnings = []
+        self.blocks = 0
+
+    def run(self, text):
+        start = time.perf_counter()
+        fout = io.StringIO()
+        cache = block_cache.openCache(self.args)
+        with utils.collect_warnings() as warnings:
+            if self.args.state_transitions is None:
+                state_profile.loadProfile(self.args)
+            if self.args.prep:
+                text, _ = vlog_prep.preprocessText(
+                    self.args, text, self.args.file, cache
+                )
+            items = parse_input.scanText(text, self.args.file)
+            parse_input.convertItems(
+                self.args, self._count_blocks(items), fout, cache
+            )
+        self.warnings += warnings
+        return ConversionResult(
+            fout.getvalue(),
+            self.warnings,
+            self.blocks,
+            time.perf_counter() - start,
+        )
+
+    def _count_blocks(self, items):
+        for item in items:
+            if isinstance(item, parse_input.SmBlock):
+                self.blocks += 1
+            yield item
+
+
+def convert(text, options=None, file="<input>"):
+    """convert the text of a design holding SmBegin/SmEnd blocks. options
+    has the command line option names (without -) and their values, file
+    is the name used in error messages. Returns a ConversionResult"""
+    return Conversion(options, file).run(text)
@@ -0,0 +1,111 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Convert many input files in a single invocation
+# ------------------------------------------------------------------------------
+import copy
+import io
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stderr
+from . import utils
+from . import parse_input
+
+
+class FileStatus:
+    def __init__(self, file, out, ok, secs, msgs, prep_hits=0, prep_misses=0):
+        self.file = file
+        self.out = out
+        self.ok = ok
+        self.secs = secs
+        self.msgs = msgs
+        # preprocessing cache lookups (-prep with -cache)
+        self.prep_hits = prep_hits
+        self.prep_misses = prep_misses
+
+
+# get input/output pairs from -pair options and the -batch manifest, which
+# has an input and output filename per line. Lines starting with # are
+# comments
+def getPairs(args):
+    pairs = [tuple(pair) for pair in args.pair or []]
+    if args.batch:
+        with open(args.batch) as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if line == "" or line.startswith("#"):
+                    continue
+                fields = line.split()
+                if len(fields) != 2:
+                    utils.error(
+                        f"{args.batch}:{line_no}: expecting 'input output' "
+                        f"but got: {line}"
+                    )
+                pairs.append(tuple(fields))
+    return pairs
+
+
+# convert one file of the batch capturing anything reported on stderr
+def convertFile(args, file, out):
+    file_args = copy.copy(args)
+    file_args.file = "/dev/stdin" if file == "-" else file
+    file_args.out = "/dev/stdout" if out == "-" else out
+    file_args.jobs = 1
+
+    msgs = io.StringIO()
+    start = time.perf_counter()
+    ok = False
+    cache = None
+    with redirect_stderr(msgs):
+        try:
+            cache = parse_input.parseInputFile(file_args)
+            ok = True
+        except utils.AlgoFsmError as e:
+            e.report()
+        except Exception as e:
+            print(f"ERROR: {type(e).__name__}: {e}", file=sys.stderr)
+    secs = time.perf_counter() - start
+    prep = (cache.prep_hits, cache.prep_misses) if cache else (0, 0)
+    return FileStatus(file, out, ok, secs, msgs.getvalue(), *prep)
+
+
+# convert all the pairs given, in a pool of processes if args.jobs > 1.
+# Returns a FileStatus per pair in the order given
+def convertBatch(args, pairs):
+    if args.jobs <= 1:
+        return [convertFile(args, file, out) for file, out in pairs]
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [
+            pool.submit(convertFile, args, file, out) for file, out in pairs
+        ]
+        return [future.result() for future in futures]
+
+
+def printSummary(results, f=sys.stderr):
+    for res in results:
+        if res.msgs:
+            print(f"--- {res.file}", file=f)
+            print(res.msgs, end="", file=f)
+    for res in results:
+        status = "OK  " if res.ok else "FAIL"
+        print(f"{status} {res.secs:7.3f}s {res.file} -> {res.out}", file=f)
+    failed = sum(1 for res in results if not res.ok)
+    print(
+        f"{len(results)} files processed, {failed} failed, "
+        f"{sum(res.secs for res in results):.3f}s",
+        file=f,
+    )
+    hits = sum(res.prep_hits for res in results)
+    total = hits + sum(res.prep_misses for res in results)
+    if total:
+        print(
+            f"preprocessing cache: {hits}/{total} hits "
+            f"({100 * hits / total:.0f}% hit rate)",
+            file=f,
+        )
@@ -0,0 +1,202 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# On-disk cache of the code generated for SM blocks, with the warnings given
+# generating it. Entries are named after a hash of everything the generated
+# code depends on, and the least recently used ones are evicted when the
+# cache grows beyond its size bound
+# ------------------------------------------------------------------------------
+import glob
+import hashlib
+import json
+import os
+import tempfile
+from . import utils
+
+# options the generated code depends on
+KEY_ARGS = [
+    "behav",
+    "pymodel",
+    "equiv",
+    "equiv_lanes",
+    "equiv_cycles",
+    "equiv_seed",
+    "latency",
+    "latency_format",
+    "clk",
+    "rst",
+    "ena",
+    "sd",
+    "prefix",
+    "state",
+    "name",
+    "tab",
+    "state_suffix",
+    "factorize",
+    "encoding",
+    "state_transitions",
+    "perfcounters",
+    "perfcounters_width",
+    "perfcounters_transitions",
+    "max_depth",
+    "depth_cost",
+    "max_state_size",
+    "rename_states",
+    "file",
+]
+
+_tool_version = None
+
+
+def tool_version():
+    """fingerprint of the tool sources, so any change invalidates entries"""
+    global _tool_version
+    if _tool_version is None:
+        h = hashlib.sha256()
+        here = os.path.dirname(os.path.abspath(__file__))
+        for path in sorted(glob.glob(os.path.join(here, "*.py"))):
+            with open(path, "rb") as f:
+                h.update(f.read())
+        _tool_version = h.hexdigest()
+    return _tool_version
+
+
+def fileDigest(path):
+    """hash of the contents of a file, None if it cannot be read"""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def prepKey(args, file, text):
+    """hash of what the preprocessing of text depends on but the files it
+    includes, which are checked when the entry is found"""
+    fields = (tool_version(), os.getcwd(), file, text, args.D, args.I)
+    return hashlib.sha256(repr(fields).encode()).hexdigest()
+
+
+class BlockCache:
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.mismatches = 0
+        self.prep_hits = 0
+        self.prep_misses = 0
+        os.makedirs(path, exist_ok=True)
+        self.size = sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        """(path, size, last use) of each entry"""
+        for entry in os.scandir(self.path):
+            if entry.name.endswith((".json", ".prep")) and entry.is_file():
+                st = entry.stat()
+                yield entry.path, st.st_size, st.st_mtime
+
+    def _entry_path(self, key, suffix=".json"):
+        return os.path.join(self.path, key + suffix)
+
+    def key(self, args, blk):
+        fields = (
+            tool_version(),
+            blk.sm_num,
+            blk.decl_in,
+            blk.inp,
+            blk.line_decl_base,
+            blk.line_forever_base,
+            [getattr(args, name) for name in KEY_ARGS],
+        )
+        return hashlib.sha256(repr(fields).encode()).hexdigest()
+
+    def get(self, key):
+        """(generated code, warnings) or None"""
+        path = self._entry_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path)  # flag as recently used
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["out"], entry["warnings"]
+
+    def put(self, key, out, warnings=()):
+        entry = json.dumps({"out": out, "warnings": list(warnings)})
+        self._write(self._entry_path(key), entry)
+
+    def _write(self, path, out):
+        # write to a temporary file first so that concurrent runs sharing
+        # the cache never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(out)
+        os.replace(tmp, path)
+        self.size += len(out.encode())
+        if self.size > self.max_bytes:
+            self.evict()
+
+    # --------------------------------------------------------------------
+    # preprocessed input files (-prep), valid while the files they include
+    # keep their contents
+    # --------------------------------------------------------------------
+    def get_prep(self, key):
+        """(preprocessed text, files included) or None"""
+        path = self._entry_path(key, ".prep")
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+        if entry is None or any(
+            fileDigest(dep) != digest for dep, digest in entry["deps"]
+        ):
+            self.prep_misses += 1
+            return None
+        os.utime(path)
+        self.prep_hits += 1
+        return entry["out"], [dep for dep, _ in entry["deps"]]
+
+    def put_prep(self, key, out, included):
+        deps = [(dep, fileDigest(dep)) for dep in included]
+        entry = json.dumps({"deps": deps, "out": out})
+        self._write(self._entry_path(key, ".prep"), entry)
+
+    def evict(self):
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        self.size = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self.size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.size -= size
+
+    def report(self):
+        utils.info(
+            f"cache {self.path}: {self.hits} hits, {self.misses} misses"
+            + (f", {self.mismatches} mismatches" if self.mismatches else "")
+        )
+        prep_total = self.prep_hits + self.prep_misses
+        if prep_total:
+            utils.info(
+                f"cache {self.path}: preprocessing {self.prep_hits} hits, "
+                f"{self.prep_misses} misses "
+                f"({100 * self.prep_hits / prep_total:.0f}% hit rate)"
+            )
+
+
+def openCache(args):
+    if args.cache == "" or args.dbg > 0:  # dbg output needs a conversion
+        return None
+    return BlockCache(args.cache, args.cache_size * 1024 * 1024)
@@ -0,0 +1,446 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Command line interface, a thin layer over the conversion routines
+# ------------------------------------------------------------------------------
+import argparse
+from . import utils
+from . import state_encoding
+from . import state_profile
+from . import latency
+from . import parse_input
+from . import batch
+from . import watch
+
+# options of the first release. An abbreviation that selected one of them
+# keeps doing so when options added later start the same way (e.g. -c for
+# -clk, despite -check)
+HISTORIC_OPTS = (
+    "-out", "-behav", "-clk", "-rst", "-ena", "-sd", "-prefix", "-state",
+    "-name", "-indent", "-state_suffix", "-dbg",
+)
+
+
+class CmdParser(argparse.ArgumentParser):
+    def _get_option_tuples(self, option_string):
+        found = super()._get_option_tuples(option_string)
+        historic = [opt for opt in found if opt[1] in HISTORIC_OPTS]
+        return historic if len(historic) == 1 else found
+
+
+# --------------------------------------------------------------------
+# M A I N
+# --------------------------------------------------------------------
+def makeCmdParser():
+    cmdParser = CmdParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    cmdParser.add_argument(
+        "file",
+        type=str,
+        default="-",
+        nargs="?",
+        help=f"filename of the Input file to process. Give - for stdin",
+    )
+    cmdParser.add_argument(
+        "-out",
+        type=str,
+        default="/dev/stdout",
+        help=f"generated output filename",
+    )
+    cmdParser.add_argument(
+        "-prep",
+        action="store_true",
+        default=False,
+        help=(
+            "preprocess the input (`define, `ifdef, `include...) with the "
+            "built-in preprocessor instead of vlog_prep.sh"
+        ),
+    )
+    cmdParser.add_argument(
+        "-I",
+        type=str,
+        action="append",
+        default=[],
+        metavar="DIR",
+        help="directory where to look for `include files with -prep",
+    )
+    cmdParser.add_argument(
+        "-D",
+        type=str,
+        action="append",
+        default=[],
+        metavar="NAME[=VAL]",
+        help="macro defined before preprocessing with -prep",
+    )
+    cmdParser.add_argument(
+        "-deps",
+        action="store_true",
+        default=False,
+        help=(
+            "write a make rule with the files the output depends on (the "
+            "input and those it includes) to the output name with .d "
+            "extension"
+        ),
+    )
+    cmdParser.add_argument(
+        "-behav",
+        action="store_true",
+        default=False,
+        help=f"output is behavioral. By default is synthesizable",
+    )
+    cmdParser.add_argument(
+        "-pymodel",
+        action="store_true",
+        default=False,
+        help=(
+            "output is a Python module with a cycle model class per SM "
+            "block instead of Verilog"
+        ),
+    )
+    cmdParser.add_argument(
+        "-equiv",
+        action="store_true",
+        default=False,
+        help=(
+            "instead of converting, check each SM block behaves as its "
+            "FSM running both with random inputs, output is a report"
+        ),
+    )
+    cmdParser.add_argument(
+        "-equiv_lanes",
+        type=int,
+        default=1024,
+        help="number of instances run at once by -equiv",
+    )
+    cmdParser.add_argument(
+        "-equiv_cycles",
+        type=int,
+        default=1000,
+        help="number of clock cycles run by -equiv",
+    )
+    cmdParser.add_argument(
+        "-equiv_seed",
+        type=int,
+        default=1,
+        help="seed of the random inputs of -equiv",
+    )
+    cmdParser.add_argument(
+        "-latency",
+        action="store_true",
+        default=False,
+        help=(
+            "instead of converting, report the clock cycles each loop of "
+            "each SM block takes per iteration and those to reach its /// "
+            "comments"
+        ),
+    )
+    cmdParser.add_argument(
+        "-latency_format",
+        type=str,
+        default="text",
+        choices=latency.FORMATS,
+        help="format of the -latency report",
+    )
+    cmdParser.add_argument(
+        "-clk",
+        type=str,
+        default="clk",
+        help=f"clock signal name. Prefix with ~ for negedge active"
+    )
+    cmdParser.add_argument(
+        "-rst",
+        type=str,
+        default="~rst_n",
+        help=(
+            "reset signal name. Prefix with ~ for negedge active, "
+            "suffix with : for sync"
+        )
+    )
+    cmdParser.add_argument(
+        "-ena",
+        type=str,
+        default="",
+        help=(
+            "if provided the FSM enable will advance controlled "
+            "by this active high signal (with FSM number appended)"
+        )
+    )
+    cmdParser.add_argument(
+        "-sd",
+        type=int,
+        default=0,
+        help=(
+            "if you want a delay for <= assignements, e.g. 1 for #1. "
+            "Enter 0 for no delay added"
+        )
+    )
+    cmdParser.add_argument(
+        "-prefix",
+        type=str,
+        default="SM",
+        help=f"prefix for localparam state constants",
+    )
+    cmdParser.add_argument(
+        "-state",
+        type=str,
+        default="state",
+        help=f"name of state variable generated",
+    )
+    cmdParser.add_argument(
+        "-name",
+        type=str,
+        default="algofsm",
+        help=f"prefix used to derive block name etc.",
+    )
+    cmdParser.add_argument(
+        "-indent",
+        type=int,
+        default=4,
+        help=f"number of spaces used to indent"
+    )
+    cmdParser.add_argument(
+        "-state_suffix",
+        type=str,
+        default="_r",
+        help=f"suffix for flopped state variables",
+    )
+    cmdParser.add_argument(
+        "-factorize",
+        action="store_true",
+        default=False,
+        help=(
+            "emit once the code reached by several paths within a state, "
+            "instead of once per path"
+        ),
+    )
+    cmdParser.add_argument(
+        "-encoding",
+        type=str,
+        default="binary",
+        choices=state_encoding.ENCODINGS,
+        help=(
+            "encoding of the state register. auto picks one from the "
+            "number of states and transitions"
+        ),
+    )
+    cmdParser.add_argument(
+        "-state_profile",
+        type=str,
+        default="",
+        metavar="VCD",
+        help=(
+            "VCD of a simulation of the design converted with binary "
+            "encoding. The states are given the codes toggling the state "
+            "register the least in the transitions taken in it"
+        ),
+    )
+    cmdParser.add_argument(
+        "-perfcounters",
+        action="store_true",
+        default=False,
+        help=(
+            "add counters of the cycles spent in each state, compiled in "
+            "when ALGOFSM_PERFCOUNTERS is defined"
+        ),
+    )
+    cmdParser.add_argument(
+        "-perfcounters_width",
+        type=int,
+        default=32,
+        help="bits of each -perfcounters counter, saturating at its maximum",
+    )
+    cmdParser.add_argument(
+        "-perfcounters_transitions",
+        action="store_true",
+        default=False,
+        help="with -perfcounters, count also the times transitions are taken",
+    )
+    cmdParser.add_argument(
+        "-max_depth",
+        type=int,
+        default=0,
+        metavar="LEVELS",
+        help=(
+            "split the states whose code is estimated to take more logic "
+            "levels, inserting `tick where needed. Enter 0 for no limit"
+        ),
+    )
+    cmdParser.add_argument(
+        "-depth_cost",
+        type=str,
+        action="append",
+        default=[],
+        metavar="OP=LEVELS",
+        help=(
+            "logic levels of an operator (+, *, <, ==, <<, &, mux...) in the "
+            "estimates of -max_depth"
+        ),
+    )
+    cmdParser.add_argument(
+        "-max_state_size",
+        type=float,
+        default=16,
+        help=(
+            "abort if the code generated for a state exceeds this size in "
+            "MB. Enter 0 for no limit"
+        ),
+    )
+    cmdParser.add_argument(
+        "-pair",
+        type=str,
+        nargs=2,
+        action="append",
+        metavar=("IN", "OUT"),
+        help=f"input and output filenames to convert in batch mode",
+    )
+    cmdParser.add_argument(
+        "-batch",
+        type=str,
+        default="",
+        help=(
+            "manifest with an input and output filename per line to "
+            "convert in a single invocation"
+        ),
+    )
+    cmdParser.add_argument(
+        "-jobs",
+        type=int,
+        default=1,
+        help=(
+            "number of processes converting SM blocks (or files in batch "
+            "mode) concurrently"
+        ),
+    )
+    cmdParser.add_argument(
+        "-watch",
+        action="store_true",
+        default=False,
+        help=(
+            "keep running, converting again the SM blocks changed "
+            "whenever an input file changes"
+        ),
+    )
+    cmdParser.add_argument(
+        "-watch_interval",
+        type=float,
+        default=0.5,
+        help="seconds between checks for changes in -watch mode",
+    )
+    cmdParser.add_argument(
+        "-cache",
+        type=str,
+        default="",
+        help=(
+            "directory where to cache the code generated per SM block "
+            "(and the preprocessed input with -prep)"
+        ),
+    )
+    cmdParser.add_argument(
+        "-cache_size",
+        type=int,
+        default=100,
+        help=f"cache size bound in MB, least recently used entries go first",
+    )
+    cmdParser.add_argument(
+        "-cache_stats",
+        action="store_true",
+        default=False,
+        help=f"report cache hits and misses",
+    )
+    cmdParser.add_argument(
+        "-cache_verify",
+        action="store_true",
+        default=False,
+        help=f"convert also on cache hits and check the cached code matches",
+    )
+    cmdParser.add_argument(
+        "-stats",
+        type=str,
+        default="",
+        help=(
+            "JSON file where to save time, node and state counts of each "
+            "pass of the conversion of each SM block"
+        ),
+    )
+    cmdParser.add_argument(
+        "-profile",
+        type=str,
+        default="",
+        help="directory where to save cProfile stats of each SM block",
+    )
+    cmdParser.add_argument(
+        "-check",
+        action="store_true",
+        default=False,
+        help=f"cross-check incrementally maintained data (slow, debug)",
+    )
+    cmdParser.add_argument(
+        "-dbg",
+        type=int,
+        default=0,
+        help=f"debug Level. More detailed for higher numbers",
+    )
+    return cmdParser
+
+
+# derive the options used internally from the ones given
+def finishArgs(args):
+    args.sd = "#" + str(args.sd) + " " if args.sd > 0 else ""
+    args.rename_states = True  # False only for debug/development
+    args.tab = " " * args.indent
+    args.state_transitions = None  # read from -state_profile
+    if args.file == "-":
+        args.file = "/dev/stdin"
+    if args.out == "-":
+        args.out = "/dev/stdout"
+
+    return args
+
+
+def mainCmdParser(argv=None):
+    return finishArgs(makeCmdParser().parse_args(argv))
+
+
+def main(argv=None):
+    args = mainCmdParser(argv)
+    try:
+        if args.stats and (args.pair or args.batch or args.watch):
+            utils.error("-stats is only supported converting a single file")
+        if args.pymodel and (args.behav or args.watch):
+            utils.error("-pymodel can't be combined with -behav or -watch")
+        if args.equiv and (args.behav or args.pymodel or args.watch):
+            utils.error(
+                "-equiv can't be combined with -behav, -pymodel or -watch"
+            )
+        if args.equiv and args.max_depth:
+            utils.error(
+                "-equiv can't be combined with -max_depth, which adds cycles "
+                "the code doesn't have"
+            )
+        if args.latency and (
+            args.behav or args.pymodel or args.equiv or args.watch
+        ):
+            utils.error(
+                "-latency can't be combined with -behav, -pymodel, -equiv "
+                "or -watch"
+            )
+        state_profile.loadProfile(args)
+        if args.watch:
+            pairs = batch.getPairs(args) or [(args.file, args.out)]
+            watch.watch(args, pairs)
+            return 0
+        if args.pair or args.batch:
+            results = batch.convertBatch(args, batch.getPairs(args))
+            batch.printSummary(results)
+            return 0 if all(res.ok for res in results) else 1
+        parse_input.parseInputFile(args)
+    except utils.AlgoFsmError as e:
+        e.report()
+        return 1
+    return 0
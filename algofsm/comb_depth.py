@@ -0,0 +1,267 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Logic depth of the states of a SM block and their split (-max_depth)
+#
+# The code of a state runs in a single clock cycle, so its longest chain of
+# dependent operations bounds the clock frequency. The depth of a value is
+# estimated in logic levels, each operator costing those given in COSTS
+# (changed with -depth_cost), from the start of the state, where all variables
+# are registers (depth 0). A value assigned under if/else, case or loop
+# conditions also waits for them, selected by a mux.
+#
+# A state deeper than -max_depth is split by inserting a `tick before the
+# first statement (or condition) of its code taking a path over the budget,
+# as late as possible so the fewest cycles are added, and so on with the new
+# state. Only the statements of the code with `tick can be split: if, case
+# and loops without `tick are taken as a whole, a loop by one iteration
+# ------------------------------------------------------------------------------
+from . import utils
+from .state_region import EXIT, region_succs, sort_region
+from .vlog_expr import ExprParser, TranslateError
+
+# logic levels of each operator, those of the table of -depth_cost
+LEVELS = (
+    (("+", "-", "<", "<=", ">", ">="), 4),  # adders and comparators
+    (("*",), 12),
+    (("/", "%", "**"), 40),
+    (("==", "!=", "===", "!=="), 2),
+    (("<<", ">>", "<<<", ">>>"), 3),  # by a constant amount they are free
+    (("&", "|", "^", "^~", "~^", "~&", "~|", "&&", "||", "!"), 1),
+    (("~",), 0),
+    (("mux",), 1),  # a value selected by a condition
+)
+COSTS = {op: cost for ops, cost in LEVELS for op in ops}
+SHIFTS = ("<<", ">>", "<<<", ">>>")
+
+
+# COSTS with the changes given by -depth_cost OP=LEVELS
+def costTable(args):
+    costs = dict(COSTS)
+    for item in args.depth_cost:
+        op, _, cost = item.rpartition("=")
+        op = op.strip()
+        if op not in costs or not cost.strip().isdigit():
+            utils.error(
+                f"-depth_cost expects OP=LEVELS with OP one of "
+                f"{' '.join(costs)}, got '{item}'"
+            )
+        costs[op] = int(cost)
+    return costs
+
+
+# the depth of the variables assigned on a path of a state, and of the
+# conditions selecting it (sel)
+class Path:
+    def __init__(self, depths=None, sel=0):
+        self.depths = depths or {}
+        self.sel = sel
+
+    # depth of the values set since the path was before
+    def added(self, before):
+        depths = [
+            depth
+            for name, depth in self.depths.items()
+            if before.depths.get(name) != depth
+        ]
+        if self.sel != before.sel:
+            depths.append(self.sel)
+        return max(depths, default=0)
+
+    def join(self, other):
+        depths = dict(self.depths)
+        for name, depth in other.depths.items():
+            depths[name] = max(depths.get(name, 0), depth)
+        return Path(depths, max(self.sel, other.sel))
+
+
+class DepthEstimator:
+    def __init__(self, costs):
+        self.costs = costs
+
+    # depth of the value of an expression parsed by vlog_expr
+    def expr(self, node, path):
+        typ = node[0]
+        if typ == "num":
+            return 0
+        if typ == "id":
+            return path.depths.get(node[1], 0)
+        if typ == "un":
+            cost = 0 if node[1] == "+" else self.costs.get(node[1], 0)
+            return self.expr(node[2], path) + cost
+        if typ == "bin":
+            op, a, b = node[1:]
+            cost = self.costs.get(op, 0)
+            if op in SHIFTS and b[0] == "num":
+                cost = 0
+            return max(self.expr(a, path), self.expr(b, path)) + cost
+        if typ == "cond":
+            depth = max(self.expr(n, path) for n in node[1:])
+            return depth + self.costs["mux"]
+        if typ == "sel":
+            return self._select(node, self.expr(node[1], path), path)
+        if typ == "rep":
+            return max([self.expr(n, path) for n in node[2]], default=0)
+        parts = node[1] if typ == "cat" else node[2]  # call arguments
+        return max([self.expr(n, path) for n in parts], default=0)
+
+    # a bit or part select by a variable index is a mux
+    def _select(self, node, depth, path):
+        index = [n for n in node[2:] if n is not None and n[0] != "num"]
+        if not index:
+            return depth
+        depth = max([depth] + [self.expr(n, path) for n in index])
+        return depth + self.costs["mux"]
+
+    # path going on when cond is known
+    def cond(self, cond, path):
+        if utils.is_one(cond) or utils.is_zero(cond):
+            return path
+        try:
+            depth = self.expr(ExprParser(cond).parse_all(), path)
+        except TranslateError:
+            depth = 0
+        depth = max(path.sel, depth) + self.costs["mux"]
+        return Path(path.depths, depth)
+
+    # path going on after an assignment. Anything else (task calls, system
+    # tasks...) is taken to add no logic to the state
+    def statement(self, text, path):
+        try:
+            p = ExprParser(text)
+            lhs = p.primary()
+            p.expect("=")
+            rhs = p.expr()
+            p.end()
+        except TranslateError:
+            return path
+        depths = dict(path.depths)
+        self._assign(lhs, max(path.sel, self.expr(rhs, path)), path, depths)
+        return Path(depths, path.sel)
+
+    def _assign(self, lhs, depth, path, depths):
+        if lhs[0] == "cat":
+            for part in lhs[1]:
+                self._assign(part, depth, path, depths)
+        elif lhs[0] == "id":
+            depths[lhs[1]] = depth
+        elif lhs[0] == "sel":
+            # the rest of the bits keep their value
+            var = lhs
+            while var[0] == "sel":
+                var = var[1]
+            if var[0] == "id":
+                depth = self._select(lhs, depth, path)
+                depths[var[1]] = max(depths.get(var[1], 0), depth)
+
+    # path going on after a node of a state
+    def node(self, node, path):
+        typ = node.typ
+        if typ == "sn":
+            return self.statement(node.code, path)
+        if typ == "eif":
+            return self.cond(node.code, path)
+        if typ == "if":
+            taken = self.cond(node.code, path)
+            done = self._list(node.child[1], taken)
+            if node.child[2] is not None:
+                done = done.join(self._list(node.child[2], taken))
+            else:
+                done = done.join(path)
+            return Path(done.depths, path.sel)
+        if typ == "wh":
+            done = self._list(node.child[1], self.cond(node.code, path))
+            return Path(done.join(path).depths, path.sel)
+        if typ == "fo":
+            parts = node.code.split(";")
+            if len(parts) != 3:
+                return path
+            init = self.statement(parts[0], path)
+            done = self._list(node.child[1], self.cond(parts[1], init))
+            done = self.statement(parts[2], done)
+            return Path(done.join(init).depths, path.sel)
+        if typ == "cs":
+            return self._case(node, path)
+        return path
+
+    def _case(self, node, path):
+        try:
+            depth = self.expr(ExprParser(node.code).parse_all(), path)
+        except TranslateError:
+            depth = 0
+        depth = max(path.sel, depth + self.costs["=="]) + self.costs["mux"]
+        taken = Path(path.depths, depth)
+        done = path
+        item = node.child[1]
+        while item is not None:
+            if item.typ == "csb":
+                done = done.join(self._list(item.child[1], taken))
+            item = item.nxt
+        return Path(done.depths, path.sel)
+
+    # path going on after a list of nodes without `tick
+    def _list(self, node, path):
+        while node is not None:
+            path = self.node(node, path)
+            node = node.nxt
+        return path
+
+
+# --------------------------------------------------------------------
+# split the states of the DAG of parser deeper than budget inserting tk
+# nodes. Returns the offsets in the input of the code each inserted one
+# goes before, and (offset, depth) of the code alone deeper than budget
+# --------------------------------------------------------------------
+def splitStates(parser, costs, budget):
+    estimator = DepthEstimator(costs)
+    inserted = []
+    too_deep = {}  # uid: (offset, depth)
+
+    # offset of the code of a node, that of the code before when unknown
+    def offset(node, before):
+        known = parser.positions.get(node.uid)
+        if known is None:
+            known = parser.positions.get(node.clone_id)
+        return before if known is None else known[1]
+
+    for tk in [node for node in parser.nodes if node.typ == "tk"]:
+        entry = tk.child[1]
+        if entry is None or entry.typ == "tk":
+            continue
+        order, _, loop = sort_region(entry)
+        if loop:  # a loop without `tick, reported when written
+            continue
+        paths = {entry.uid: Path()}
+        before = {entry.uid: parser.tick_pos[int(tk.code)]}
+        for node in order:
+            path = paths.pop(node.uid)
+            pos = offset(node, before.pop(node.uid))
+            done = estimator.node(node, path)
+            depth = done.added(path)
+            if depth > budget and node is not entry:
+                alone = estimator.node(node, Path())
+                if alone.added(Path()) < depth:
+                    new = parser.node_add("tk", str(parser.tick_num))
+                    parser.change_links_to(new, node)
+                    new.child = [None, node, None]
+                    parser.tick_num += 1
+                    parser.tick_pos.append(pos)
+                    inserted.append(pos)
+                    done = alone
+                    depth = alone.added(Path())
+            if depth > budget:
+                too_deep[node.uid] = (pos, depth)
+            for succ in region_succs(node):
+                if succ is EXIT or succ.typ == "tk":
+                    continue
+                if succ.uid in paths:
+                    paths[succ.uid] = paths[succ.uid].join(done)
+                else:
+                    paths[succ.uid] = done
+                    before[succ.uid] = pos
+    return inserted, sorted(too_deep.values())
@@ -6,6 +6,7 @@
 # Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
 # ------------------------------------------------------------------------------
 from . import utils
+from .state_region import region_succs
 
 
 # --------------------------------------------------------------------
@@ -59,6 +60,11 @@ def _expand_tree_structs(parser, root, node, ind, sm_num, dbg, cnt):
                 if ending_node:
                     ending_node.nxt = post_node
 
+                # init and post are written in the for statement
+                for_pos = parser.positions[node.uid][1]
+                parser.positions[init_node.uid] = ("sn", for_pos)
+                parser.positions[post_node.uid] = ("sn", for_pos)
+
                 # expand for block, given post_node as nxt
                 _expand_tree_structs(parser, root, body, ind, sm_num, dbg, cnt)
                 expanded = True
@@ -119,6 +125,12 @@ def _convert_to_dag(parser, root, node, ind, top_nxt, sm_num, dbg, cnt):
                 # refill node with the original body block
                 node.copy_flds_from(body)
                 parser.node_rm(body)  # this node got copied, now removed
+                # the loop is now eif_node and node is the body head
+                positions = parser.positions
+                do_pos = positions.pop(node.uid)
+                if body.uid in positions:
+                    positions[node.uid] = positions.pop(body.uid)
+                positions[eif_node.uid] = do_pos
                 _convert_to_dag(
                     parser, root, node, ind, eif_node, sm_num, dbg, cnt
                 )
@@ -168,3 +180,39 @@ def _convert_to_dag(parser, root, node, ind, top_nxt, sm_num, dbg, cnt):
 
         node = org_nxt
     # end while(node)
+
+
+# --------------------------------------------------------------------
+# remove the nodes of the DAG the FSM can't reach from root: the states
+# after an endless loop or in a branch whose condition is constant false,
+# with the code only they lead to. Returns the states (tk nodes) and the
+# number of statements removed
+# --------------------------------------------------------------------
+def prune_unreachable(parser, root):
+    live = set()
+    todo = [root]
+    while todo:
+        node = todo.pop()
+        if node is None or node.uid in live:
+            continue
+        live.add(node.uid)
+        if node.typ == "eif":
+            todo += region_succs(node)
+        else:
+            todo += [node.nxt] + list(node.child)
+
+    dead = [node for node in parser.nodes if node.uid not in live]
+    states = [node for node in dead if node.typ == "tk"]
+    statements = sum(1 for node in dead if node.typ == "sn")
+    for node in dead:
+        node.nxt = None
+        node.child = [None] * len(node.child)
+    for node in dead:
+        # a branch a constant condition never takes
+        for pred, link in list(node.preds):
+            if link == "nx":
+                pred.nxt = None
+            else:
+                pred.child[link] = None
+        parser.node_rm(node)
+    return states, statements
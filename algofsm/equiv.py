@@ -0,0 +1,549 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Randomized equivalence checking of a block (-equiv). The code as written
+# (its syntax tree before any transformation) and the merged DAG the RTL is
+# generated from are run side by side for many independent instances with
+# random inputs. Each instance is a lane of NumPy arrays holding the values
+# of the registers, branches are followed by the lanes selected with a mask,
+# and the registers declared in SmBegin are compared after each clock
+# ------------------------------------------------------------------------------
+import time
+from . import fsm_converter_py
+from . import fsm_converter_rtl
+from . import utils
+from . import vlog_expr
+from . import vlogparser
+from .vlog_expr import pyName, unparse
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAX_WIDTH = 64  # lanes hold uint64 values
+MAX_ITERATIONS = 1 << 16  # of a loop without `tick before giving up
+RESET_RATE = 1 / 256  # chance of a lane being reset in a cycle
+ENA_RATE = 3 / 4  # of a lane being enabled in a cycle (-ena)
+CHANGE_RATE = 1 / 8  # of an input taking a new value in a cycle
+SMALL = 16  # half the values taken by inputs are below this
+
+
+def parity(x):
+    x = np.asarray(x, dtype=np.uint64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        x = x ^ (x >> np.uint64(shift))
+    return x & np.uint64(1)
+
+
+def toUint(cond):
+    return np.asarray(cond, dtype=np.uint64)
+
+
+# init, condition and post statement of a for, the condition of others
+def loopParts(node):
+    if node.typ != "fo":
+        return "", node.code, ""
+    return tuple((node.code.split(";") + ["", ""])[:3])
+
+
+# names the code translated by VectorTranslator uses
+def vectorGlobals():
+    return {
+        "_U": np.uint64,
+        "_u": toUint,
+        "_where": np.where,
+        "_parity": parity,
+    }
+
+
+# --------------------------------------------------------------------
+# translation into code working on arrays of lanes: conditions are arrays
+# of bools and constants are uint64 so that results never become signed
+# --------------------------------------------------------------------
+class VectorTranslator(vlog_expr.Translator):
+    def value(self, node, w):
+        if w > MAX_WIDTH:
+            raise vlog_expr.TranslateError(
+                f"'{unparse(node)}' takes more than {MAX_WIDTH} bits"
+            )
+        code, bits = super().value(node, w)
+        if node[0] == "num" or (node[0] == "id" and node[1] in self.consts):
+            code = f"_U({int(code) & vlog_expr.mask(MAX_WIDTH):#x})"
+        return code, bits
+
+    def _int(self, cond):
+        return f"_u({cond})"
+
+    def _not(self, cond):
+        return f"~({cond})"
+
+    def _logic(self, op, a, b):
+        return f"({a}) {'&' if op == '&&' else '|'} ({b})"
+
+    def _nonzero(self, code):
+        return f"({code} != 0)"
+
+    def _select(self, cond, a, b):
+        return f"_where({cond}, {a}, {b})"
+
+    def _parity(self, code):
+        return f"_parity({code})"
+
+
+# --------------------------------------------------------------------
+# registers and state of the lanes of one of the models. pc is the state
+# each lane is in, changed to next_pc by step()
+# --------------------------------------------------------------------
+class LaneModel:
+    def __init__(self, conv, lanes):
+        self.conv = conv
+        self.env = {
+            pyName(var): np.zeros(lanes, np.uint64) for var in conv.widths
+        }
+        self.glb = vectorGlobals()
+        self.pc = np.zeros(lanes, np.int64)
+        self.next_pc = self.pc
+        self.start = 0
+
+    def reset(self, mask):
+        env = self.env
+        for var, init in self.conv.inits.items():
+            py = pyName(var)
+            env[py] = np.where(mask, init, env[py])
+        self.pc = np.where(mask, self.start, self.pc)
+
+    def step(self, inputs, active):
+        self.env.update(inputs)
+        self.next_pc = self.pc.copy()
+        for state in np.unique(self.pc[active]):
+            self.run(state, active & (self.pc == state))
+        self.pc = self.next_pc
+
+    def run(self, state, mask):
+        raise NotImplementedError
+
+    def cond(self, text):
+        return eval(self.conv.cond(text), self.glb, self.env)
+
+    # --- the lanes not in mask keep the values they had
+    def execute(self, text, mask):
+        code, assigned = self.conv.statement(text)
+        env = self.env
+        old = [(var, env[var]) for var in assigned]
+        exec(code, self.glb, env)
+        for var, val in old:
+            env[var] = np.where(mask, env[var], val)
+
+    def case_conds(self, node):
+        """condition text of each item of a case, None for default"""
+        conds = []
+        item = node.child[1]
+        while item:
+            label = item.code.rstrip(":")
+            conds.append(
+                None if label == "default" else (node.code, label)
+            )
+            item = item.nxt
+        return conds
+
+    def case_masks(self, node, mask):
+        """mask of the lanes taking each item of a case"""
+        left = mask
+        masks = []
+        for cond in self.case_conds(node):
+            if cond is None:
+                taken = left
+            else:
+                taken = left & eval(self.conv.case_cond(*cond), self.glb,
+                                    self.env)
+            masks.append(taken)
+            left = left & ~taken
+        return masks
+
+    def loop_error(self, text):
+        self.conv._error(
+            f"loop ({text}) still running after {MAX_ITERATIONS} iterations"
+        )
+
+
+# --------------------------------------------------------------------
+# the code as written. Each lane waits at a `tick (pc holds its number,
+# 0 is the one added before the code), and resumes from there running the
+# rest of the statements holding it, going up the loops and if/else around
+# --------------------------------------------------------------------
+class CodeModel(LaneModel):
+    def __init__(self, conv, root, lanes):
+        super().__init__(conv, lanes)
+        self.none = np.zeros(lanes, bool)
+        self.parent = {}  # uid: node holding it in one of its bodies
+        self.ticks = {}  # number: tk node
+        self._scan(root, None)
+
+    def _scan(self, node, parent):
+        while node:
+            self.parent[node.uid] = parent
+            typ = node.typ
+            if typ == "tk":
+                self.ticks[int(node.code)] = node
+            elif typ == "sn":
+                self.conv.statement(node.code)
+            elif typ == "cs":
+                item = node.child[1]
+                while item:
+                    self.conv.case_cond(node.code, item.code.rstrip(":"))
+                    self._scan(item.child[1], node)
+                    item = item.nxt
+            elif typ != "cm":
+                init, cond, post = loopParts(node)
+                for text in (init, post):
+                    if text.strip():
+                        self.conv.statement(text)
+                self.conv.cond(cond)
+                self._scan(node.child[1], node)
+                self._scan(node.child[2], node)
+            node = node.nxt
+
+    def run(self, state, mask):
+        node = self.ticks[state]
+        mask = self.exec_list(node.nxt, mask)
+        while mask.any():
+            parent = self.parent[node.uid]
+            if parent is None:
+                break  # can't be, the code is within a while (1)
+            if parent.typ in ("wh", "fo"):
+                post = loopParts(parent)[2]
+                if post.strip():
+                    self.execute(post, mask)
+                mask = self.loop(parent, mask)
+            elif parent.typ == "do":
+                mask = self.do_loop(parent, mask, True)
+            mask = self.exec_list(parent.nxt, mask)
+            node = parent
+
+    # --- run the statements from node, returns the lanes reaching the end
+    def exec_list(self, node, mask):
+        while node and mask.any():
+            typ = node.typ
+            if typ == "sn":
+                self.execute(node.code, mask)
+            elif typ == "tk":
+                self.next_pc[mask] = int(node.code)
+                return self.none
+            elif typ == "if":
+                c = self.cond(node.code)
+                mask = self.exec_list(node.child[1], mask & c) | (
+                    self.exec_list(node.child[2], mask & ~c)
+                )
+            elif typ == "wh":
+                mask = self.loop(node, mask)
+            elif typ == "fo":
+                init = loopParts(node)[0]
+                if init.strip():
+                    self.execute(init, mask)
+                mask = self.loop(node, mask)
+            elif typ == "do":
+                mask = self.do_loop(node, mask)
+            elif typ == "cs":
+                item = node.child[1]
+                done = self.none
+                left = mask  # lanes taking no item
+                for taken in self.case_masks(node, mask):
+                    done = done | self.exec_list(item.child[1], taken)
+                    left = left & ~taken
+                    item = item.nxt
+                mask = done | left
+            node = node.nxt
+        return mask
+
+    # --- from the evaluation of the condition of a while/for
+    def loop(self, node, mask):
+        _, text, post = loopParts(node)
+        done = self.none
+        for _ in range(MAX_ITERATIONS):
+            c = self.cond(text)
+            done = done | (mask & ~c)
+            mask = mask & c
+            if not mask.any():
+                return done
+            mask = self.exec_list(node.child[1], mask)
+            if post.strip():
+                self.execute(post, mask)
+        self.loop_error(text)
+
+    def do_loop(self, node, mask, at_cond=False):
+        done = self.none
+        for _ in range(MAX_ITERATIONS):
+            if not at_cond:
+                mask = self.exec_list(node.child[1], mask)
+            at_cond = False
+            c = self.cond(node.code)
+            done = done | (mask & ~c)
+            mask = mask & c
+            if not mask.any():
+                return done
+        self.loop_error(node.code)
+
+
+# --------------------------------------------------------------------
+# the merged DAG, walked the same way the RTL code of each state is
+# written (see dump_subdag_sm). pc holds the number of the state
+# --------------------------------------------------------------------
+class FsmModel(LaneModel):
+    def __init__(self, conv, p, root, lanes):
+        super().__init__(conv, lanes)
+        self.states = {
+            conv.rename_state[node]: node
+            for node in p.nodes
+            if node.typ == "tk"
+        }
+        first = fsm_converter_rtl.FsmConverterRTL.find_first_tk(p, root)
+        self.start = conv.rename_state[first]
+        for node in p.nodes:
+            if node.typ == "sn":
+                conv.statement(node.code)
+            elif node.typ in ("eif", "if", "wh"):
+                conv.cond(node.code)
+
+    def state_name(self, state):
+        return self.conv.state_name(self.states[state])
+
+    def run(self, state, mask):
+        self.walk(self.states[state].succ(), mask)
+
+    def walk(self, node, mask):
+        while node and mask.any():
+            typ = node.typ
+            nx, ch1, ch2 = node.nxt, node.child[1], node.child[2]
+            if typ == "eif":
+                c = self.cond(node.code)
+                self.walk(ch1, mask & c)
+                self.walk(ch2 if ch2 else nx, mask & ~c)
+                return
+            if typ == "if":
+                c = self.cond(node.code)
+                self.walk(ch1, mask & c)
+                self.walk(ch2, mask & ~c)
+                node = nx
+            elif typ == "sn":
+                self.execute(node.code, mask)
+                node = node.succ()
+            elif typ == "tk":
+                self.next_pc[mask] = self.conv.rename_state[node]
+                return
+            elif typ in ("fo", "wh"):
+                self.loop(node, mask)
+                node = nx
+            elif typ == "cs":
+                item = ch1
+                for taken in self.case_masks(node, mask):
+                    self.walk(item.child[1], taken)
+                    item = item.nxt
+                node = nx
+            else:
+                node = node.succ()  # comments, and what the RTL ignores
+
+    def loop(self, node, mask):
+        init, text, post = loopParts(node)
+        if init.strip():
+            self.execute(init, mask)
+        for _ in range(MAX_ITERATIONS):
+            mask = mask & self.cond(text)
+            if not mask.any():
+                return
+            self.walk(node.child[1], mask)
+            if post.strip():
+                self.execute(post, mask)
+        self.loop_error(text)
+
+
+# --------------------------------------------------------------------
+# random inputs of the lanes, half of them small so that they match the
+# values counters go through. Each changes now and then
+# --------------------------------------------------------------------
+class Stimulus:
+    def __init__(self, inputs, lanes, seed, ena):
+        self.rng = np.random.default_rng(seed)
+        self.widths = {py: width for py, width in inputs.values()}
+        self.lanes = lanes
+        self.ena = ena
+        self.cycle = 0
+        self.values = {py: self._draw(w) for py, w in self.widths.items()}
+
+    def _draw(self, width):
+        rng, lanes = self.rng, self.lanes
+        full = rng.integers(0, 1 << width, lanes, dtype=np.uint64)
+        small = rng.integers(0, min(SMALL, 1 << width), lanes, np.uint64)
+        return np.where(rng.random(lanes) < 0.5, small, full)
+
+    def next(self):
+        """values of the inputs, lanes reset and lanes stepping"""
+        rng, lanes = self.rng, self.lanes
+        if self.cycle:
+            for py, width in self.widths.items():
+                change = rng.random(lanes) < CHANGE_RATE
+                value = self._draw(width)
+                self.values[py] = np.where(change, value, self.values[py])
+            reset = rng.random(lanes) < RESET_RATE
+        else:
+            reset = np.ones(lanes, bool)
+        active = ~reset
+        if self.ena:
+            active &= rng.random(lanes) < ENA_RATE
+        self.cycle += 1
+        return dict(self.values), reset, active
+
+
+# --------------------------------------------------------------------
+# converter running both models of a block instead of writing code, the
+# output is a report line
+# --------------------------------------------------------------------
+class FsmConverterEquiv(fsm_converter_py.FsmConverterPy):
+    option = "-equiv"
+    translator = VectorTranslator
+
+    def __init__(self, args, sm_num=0, module=None):
+        super().__init__(args, sm_num, module)
+        self.code = None  # syntax tree of the code as written
+        self.inits = {}  # reset value of the registers having one
+        self._conds = {}  # compiled code by Verilog text
+        self._statements = {}
+        self._assigned = None  # registers assigned by a statement
+
+    def process_block(self, beh_in, ind, line_base, file_base=""):
+        if np is None:
+            utils.error("-equiv needs NumPy (pip install numpy)")
+        inp = fsm_converter_rtl.FsmConverterRTL._expand_input(beh_in)
+        parser = vlogparser.VlogParser(inp, line_base, file_base)
+        self.code = parser.start_rule()
+        return super().process_block(beh_in, ind, line_base, file_base)
+
+    def lvalues(self, name):
+        py, width = super().lvalues(name)
+        if self._assigned is not None:
+            self._assigned.add(py)
+        return py, width
+
+    def cond(self, text):
+        code = self._conds.get(text)
+        if code is None:
+            code = compile(self._cond(text), "<equiv>", "eval")
+            self._conds[text] = code
+        return code
+
+    def statement(self, text):
+        """compiled code of a statement and registers it assigns"""
+        text = text.strip()
+        compiled = self._statements.get(text)
+        if compiled is None:
+            self._assigned = set()
+            try:
+                lines = self.tr.statement(text)
+            except vlog_expr.TranslateError as e:
+                self._error(e)
+            if self.tr.hooks:
+                self._error(
+                    f"task {self.tr.hooks[0]} can't be modeled, only tasks "
+                    "made of assignments are"
+                )
+            code = compile("\n".join(lines), "<equiv>", "exec")
+            compiled = code, sorted(self._assigned)
+            self._statements[text] = compiled
+            self._assigned = None
+        return compiled
+
+    def case_cond(self, sel, label):
+        key = (sel, label)
+        code = self._conds.get(key)
+        if code is None:
+            tr = self.tr
+            try:
+                node = vlog_expr.parse(sel)
+                conds = []
+                for item in vlog_expr.ExprParser(label).items():
+                    w = max(tr.width(node), tr.width(item))
+                    conds.append(f"({tr.clean(node, w)} == "
+                                 f"{tr.clean(item, w)})")
+            except vlog_expr.TranslateError as e:
+                self._error(e)
+            code = compile(" | ".join(conds), "<equiv>", "eval")
+            self._conds[key] = code
+        return code
+
+    # run the models and compare them instead of writing the RTL
+    def dump_dag_sm(self, p, root, ind, line_base, file_base):
+        self.widths = {
+            var: self._width(self.reg_track_width[var])
+            for var in self.reg_track_init
+        }
+        for var, width in self.widths.items():
+            if width > MAX_WIDTH:
+                self._error(f"{var} is wider than {MAX_WIDTH} bits")
+        self.tr = self._translator()
+        for var, init in self.reg_track_init.items():
+            if init.strip():
+                self.inits[var] = self._init(var)
+        tks_by_code = {node.code: node for node in p.nodes if node.typ == "tk"}
+        self._compute_localpars(tks_by_code)
+        if self.stats:
+            self.stats.set("states", len(tks_by_code))
+
+        args = self.args
+        lanes, cycles = args.equiv_lanes, args.equiv_cycles
+        code = CodeModel(self, self.code, lanes)
+        fsm = FsmModel(self, p, root, lanes)
+        stimulus = Stimulus(self.inputs, lanes, args.equiv_seed, args.ena)
+        secs = [0.0, 0.0]
+        with np.errstate(all="ignore"):
+            for cycle in range(cycles):
+                inputs, reset, active = stimulus.next()
+                before = code.pc, fsm.pc
+                for i, model in enumerate((code, fsm)):
+                    start = time.perf_counter()
+                    model.reset(reset)
+                    model.step(inputs, active)
+                    secs[i] += time.perf_counter() - start
+                self._compare(code, fsm, cycle, inputs, before)
+
+        def rate(secs):
+            return f"{lanes * cycles / max(secs, 1e-9):.3g}"
+
+        return (
+            f"SM{self.sm_num} {file_base}:{line_base}: equivalent over "
+            f"{lanes} lanes x {cycles} cycles ({len(self.widths)} registers"
+            f", {len(fsm.states)} states)"
+            f". Instance-cycles/s: code {rate(secs[0])}, FSM "
+            f"{rate(secs[1])}\n"
+        )
+
+    # report the first lane where the registers differ
+    def _compare(self, code, fsm, cycle, inputs, before):
+        differ = None
+        for var in self.widths:
+            py = pyName(var)
+            diff = code.env[py] != fsm.env[py]
+            differ = diff if differ is None else differ | diff
+        if differ is None or not differ.any():
+            return
+        lane = int(np.flatnonzero(differ)[0])
+        regs = []
+        for var in self.widths:
+            a, b = (int(m.env[pyName(var)][lane]) for m in (code, fsm))
+            if a != b:
+                regs.append(f"{var} is {a:#x} in the code, {b:#x} in the FSM")
+        ins = ", ".join(
+            f"{name}={int(inputs[py][lane]):#x}"
+            for name, (py, _) in self.inputs.items()
+        )
+        tick, state = before[0][lane], fsm.state_name(before[1][lane])
+        self._error(
+            f"lane {lane} differs at cycle {cycle} (seed "
+            f"{self.args.equiv_seed}) stepping from `tick {tick} in the code"
+            f", state {state} in the FSM{' with ' + ins if ins else ''}: "
+            + "; ".join(regs)
+        )
@@ -12,12 +12,10 @@ from . import utils
 # Base class dumps only a behavioral description of the input which has
 # almost no code transformation. Mostly to verify the algorithm
 class FsmConverter:
-
-    sm_num = -1
-
-    def __init__(self, args):
+    def __init__(self, args, sm_num=0):
         self.args = args
-        FsmConverter.sm_num += 1
+        self.sm_num = sm_num
+        self.stats = None  # BlockStats when measuring the conversion
         self.oname = f"{self.args.name}{self.sm_num}"
         self.ff_local_decl_in = ""
         self.ff_rst_in = ""
@@ -26,6 +24,8 @@ class FsmConverter:
         self.ff_update_ffs_beh = ""
         self.ff_update_nxt = ""
         self.reg_track_init = {}
+        self.reg_track_width = {}  # declared [msb:lsb] of each register
+        self.reg_track_local = set()  # registers declared local
 
     # gather some information to build the output FSM
     def extract_initial(self, txt, line_decl_base):
@@ -84,6 +84,9 @@ class FsmConverter:
                     width, var = get_width_var(width, var)
 
                     self.reg_track_init[var] = init
+                    self.reg_track_width[var] = width.strip()
+                    if local:
+                        self.reg_track_local.add(var)
 
                     if not (local or reg):
                         utils.error(
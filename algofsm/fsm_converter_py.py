@@ -0,0 +1,483 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Python cycle models (-pymodel). The merged DAG the RTL is generated from
+# is walked the same way, writing a Python class per block whose step()
+# does what the always block does on a clock edge. Parameter values, input
+# widths and the tasks called by the block come from the module holding it
+# ------------------------------------------------------------------------------
+import re
+from . import fsm_converter
+from . import fsm_converter_rtl
+from . import utils
+from . import vlog_expr
+from .vlog_expr import pyName
+
+COMMENT = re.compile(r'"(?:\\.|[^"\\])*"|//[^\n]*|/\*.*?\*/', re.S)
+MODULE = re.compile(r"\bmodule\b(.*?)(\bendmodule\b|$)", re.S)
+PARAM = re.compile(r"\b(?:parameter|localparam)\b")
+DECL = re.compile(r"\b(?:input|output|inout|wire|reg)\b")
+DECL_TYPE = re.compile(r"\s*\b(?:wire|reg|logic|signed)\b")
+RANGE = re.compile(r"\s*(\[[^\]]*\])?")
+TASK = re.compile(r"\btask\s+(?:automatic\s+)?(\w+)\s*;(.*?)\bendtask\b", re.S)
+NOT_INLINED = re.compile(r"\b(?:if|case|for|while|repeat|reg|integer)\b|#|@")
+
+
+# --- text with its comments (and strings) blanked, keeping offsets
+def blankComments(text):
+    def blank(m):
+        return re.sub(r"[^\n]", " ", m.group(0))
+
+    return COMMENT.sub(blank, text)
+
+
+# --- split at the commas outside parenthesis/braces/brackets, until a
+# --- closing one without its opening or a ;
+def splitList(text, pos):
+    items = []
+    depth = 0
+    start = pos
+    while pos < len(text):
+        c = text[pos]
+        if c in "([{":
+            depth += 1
+        elif c in ")]}" and depth > 0:
+            depth -= 1
+        elif c in ")]};" or (c == "," and depth == 0):
+            items.append(text[start:pos])
+            if c != ",":
+                break
+            start = pos + 1
+        pos += 1
+    return items
+
+
+# --------------------------------------------------------------------
+# what the models of the blocks of a module need to know about it
+# --------------------------------------------------------------------
+class ModuleInfo:
+    def __init__(self, text=""):
+        self.params = {}  # name: value
+        self.ranges = {}  # name: [msb:lsb] text of ports and nets
+        self.tasks = {}  # name: (inputs [(name, range)], statements)
+        self.consts = vlog_expr.Translator(self._no_names, self.params)
+        text = self._scan_tasks(blankComments(text))
+        self._scan_params(text)
+        self._scan_decls(text)
+
+    @staticmethod
+    def _no_names(name):
+        raise vlog_expr.TranslateError(f"'{name}' is not a parameter")
+
+    def _scan_tasks(self, text):
+        for m in TASK.finditer(text):
+            name, body = m.groups()
+            inputs = []
+            stms = []
+            for stm in body.split(";"):
+                stm = re.sub(r"\b(?:begin|end)\b", " ", stm).strip()
+                if stm.startswith("input"):
+                    rng = RANGE.match(stm, len("input")).group(1) or ""
+                    rest = stm[RANGE.match(stm, len("input")).end():]
+                    inputs += [(n.strip(), rng) for n in rest.split(",")]
+                elif stm:
+                    stms.append(stm)
+            if any(NOT_INLINED.search(stm) for stm in stms):
+                continue  # called through a method of the model
+            self.tasks[name] = (inputs, stms)
+        return TASK.sub("", text)
+
+    def _scan_params(self, text):
+        for m in PARAM.finditer(text):
+            for item in splitList(text, m.end()):
+                item = PARAM.sub("", item)
+                item = re.sub(r"^\s*(?:integer\b|signed\b)?", "", item)
+                item = RANGE.sub("", item, count=1)
+                if "=" not in item:
+                    break
+                name, expr = item.split("=", 1)
+                try:
+                    self.params[name.strip()] = self.consts.const(expr)
+                except vlog_expr.TranslateError:
+                    pass  # not usable by the models
+
+    def _scan_decls(self, text):
+        for m in DECL.finditer(text):
+            pos = m.end()
+            while True:
+                mt = DECL_TYPE.match(text, pos)
+                if mt is None:
+                    break
+                pos = mt.end()
+            mr = RANGE.match(text, pos)
+            rng = mr.group(1) or ""
+            for item in splitList(text, mr.end()):
+                name = re.match(r"\s*([A-Za-z_]\w*)", item)
+                if name is None or DECL.match(name.group(1)):
+                    break
+                self.ranges.setdefault(name.group(1), rng)
+
+    def width(self, rng):
+        """width of a declaration range, [] for 1 bit"""
+        m = re.match(r"\[(.*):(.*)\]", rng.strip())
+        if m is None:
+            return 1
+        msb, lsb = (self.consts.const(x) for x in m.groups())
+        return abs(msb - lsb) + 1
+
+
+# --- ModuleInfo of each module of text by its offset range
+def scanModules(text):
+    modules = []
+    for m in MODULE.finditer(blankComments(text)):
+        info = ModuleInfo(text[m.start():m.end()])
+        modules.append((m.start(), m.end(), info))
+    return modules
+
+
+# --- ModuleInfo of the module holding offset
+def findModule(modules, offset):
+    for start, end, info in modules:
+        if start <= offset <= end:
+            return info
+    return None
+
+
+# --- the registers of a block are seen as nets of its module by others
+def addRegisters(args, blk, modules, offset):
+    info = findModule(modules, offset)
+    if info is None:
+        return
+    conv = fsm_converter.FsmConverter(args, blk.sm_num)
+    conv.extract_initial(blk.decl_in, blk.line_decl_base)
+    for var, rng in conv.reg_track_width.items():
+        if var not in conv.reg_track_local:
+            info.ranges.setdefault(var, rng)
+
+
+# --------------------------------------------------------------------
+# converter writing a Python class instead of an always block
+# --------------------------------------------------------------------
+class FsmConverterPy(fsm_converter_rtl.FsmConverterRTL):
+    option = "-pymodel"  # named in error messages
+    translator = vlog_expr.Translator  # of the Verilog code into Python
+
+    def __init__(self, args, sm_num=0, module=None):
+        super().__init__(args, sm_num)
+        self.module = module or ModuleInfo()
+        self.inputs = {}  # name: (python name, width) of the inputs read
+
+    # --- register of the block a name (maybe hierarchical) refers to
+    def _register(self, name):
+        if name.startswith(self.oname + "."):
+            name = name[len(self.oname) + 1:]
+        return name if name in self.widths else None
+
+    # --- code and width of a name read by the block, others than its
+    # --- registers and the parameters are inputs
+    def names(self, name):
+        var = self._register(name)
+        if var is not None:
+            return pyName(var), self.widths[var]
+        if "." in name:
+            raise vlog_expr.TranslateError(f"unknown reference {name}")
+        if name not in self.inputs:
+            rng = self.module.ranges.get(name)
+            width = vlog_expr.UNSIZED if rng is None else self._width(rng)
+            self.inputs[name] = (pyName(name), width)
+        return self.inputs[name]
+
+    # --- code and width of a name assigned by the block
+    def lvalues(self, name):
+        var = self._register(name)
+        if var is None:
+            raise vlog_expr.TranslateError(
+                f"cannot assign to {name}, not declared in SmBegin"
+            )
+        return pyName(var), self.widths[var]
+
+    def _width(self, rng):
+        try:
+            return self.module.width(rng)
+        except vlog_expr.TranslateError as e:
+            self._error(f"width of {rng}: {e}")
+
+    def _error(self, msg):
+        utils.error(f"SM{self.sm_num} {self.option}: {msg}")
+
+    def _translator(self):
+        tasks = {}
+        for name, (inputs, stms) in self.module.tasks.items():
+            inputs = [(n, self._width(rng)) for n, rng in inputs]
+            tasks[name] = vlog_expr.Task(name, inputs, stms)
+        return self.translator(
+            self.names, self.module.params, tasks, self.lvalues
+        )
+
+    def _cond(self, text):
+        try:
+            return self.tr.truthy(vlog_expr.parse(text))
+        except vlog_expr.TranslateError as e:
+            self._error(e)
+
+    def _statement(self, w, text):
+        try:
+            lines = self.tr.statement(text)
+        except vlog_expr.TranslateError as e:
+            self._error(e)
+        for line in lines:
+            w.line(line)
+
+    # dump the DAG as a Python class
+    def dump_dag_sm(self, p, root, ind, line_base, file_base):
+        tab = self.args.tab
+        curr = self.args.state_suffix
+        self.widths = {
+            var: self._width(self.reg_track_width[var])
+            for var in self.reg_track_init
+        }
+        self.tr = self._translator()
+
+        tks_by_code = {node.code: node for node in p.nodes if node.typ == "tk"}
+        self._compute_localpars(tks_by_code)
+        if self.stats:
+            self.stats.set("states", len(tks_by_code))
+        init_state_node = self.find_first_tk(p, root)
+        state = pyName(self.ostate)
+
+        # --- code of the states
+        body = utils.Dumper()
+        w = utils.CodeWriter(body, tab, 2 * tab)
+        for i, code in enumerate(sorted(tks_by_code.keys())):
+            node = tks_by_code[code]
+            el = "el" if i else ""
+            w.line(f"{el}if {state} == {self.rename_state[node]}:")
+            self._dump_block(w, node.succ(), node, True)
+
+        # --- class around them
+        regs = list(self.reg_track_init)
+        outs = [var for var in regs if var not in self.reg_track_local]
+        out = utils.Dumper()
+        out.dump()
+        out.dump()
+        out.dump()
+        out.dump(f"class {className(self.args, self.sm_num)}:")
+        out.dump(
+            f'{tab}"""SM{self.sm_num} of {file_base}:{line_base}, '
+            f'one step() per clock"""'
+        )
+        out.dump()
+        reset_cond = self._cond(self.reset_cond)
+        ena = self.args.ena + str(self.sm_num) if self.args.ena else None
+        ena_cond = self._cond(ena) if ena else None
+        out.dump(f"{tab}INPUTS = {pyTuple(self.inputs, ind=tab)}")
+        out.dump(f"{tab}OUTPUTS = {pyTuple(outs, ind=tab)}")
+        out.dump()
+        out.dump(f"{tab}def __init__(self):")
+        out.dump(f"{2 * tab}self.reset()")
+        out.dump()
+        out.dump(f"{tab}def reset(self):")
+        for var in regs:
+            out.dump(f"{2 * tab}self.{pyName(var)}{curr} = {self._init(var)}")
+        init = self.rename_state[init_state_node]
+        out.dump(f"{2 * tab}self.{state}{curr} = {init}")
+        out.dump()
+        out.dump(f"{tab}def outputs(self):")
+        out.dump(f"{2 * tab}return {{")
+        for var in outs:
+            out.dump(f'{3 * tab}"{var}": self.{pyName(var)}{curr},')
+        out.dump(f"{2 * tab}}}")
+        out.dump()
+        out.dump(f"{tab}def step(self, inputs):")
+        for name, (py, width) in self.inputs.items():
+            m = vlog_expr.mask(width)
+            out.dump(f'{2 * tab}{py} = inputs["{name}"] & {m:#x}')
+        out.dump(f"{2 * tab}if {reset_cond}:")
+        out.dump(f"{3 * tab}self.reset()")
+        out.dump(f"{3 * tab}return self.outputs()")
+        if ena_cond:
+            out.dump(f"{2 * tab}if not ({ena_cond}):")
+            out.dump(f"{3 * tab}return self.outputs()")
+        for var in regs:
+            out.dump(f"{2 * tab}{pyName(var)} = self.{pyName(var)}{curr}")
+        out.dump(f"{2 * tab}{state} = self.{state}{curr}")
+        out.dump(body.val().rstrip("\n"))
+        for var in regs:
+            out.dump(f"{2 * tab}self.{pyName(var)}{curr} = {pyName(var)}")
+        out.dump(f"{2 * tab}self.{state}{curr} = {state}")
+        out.dump(f"{2 * tab}return self.outputs()")
+        for name in self.tr.hooks:
+            out.dump()
+            out.dump(f"{tab}def {pyName(name)}(self, *args):")
+            out.dump(
+                f'{2 * tab}raise NotImplementedError("task {name} is not '
+                f'modeled, override {pyName(name)}()")'
+            )
+        return out.val()
+
+    # reset value of a register
+    def _init(self, var):
+        try:
+            init = re.sub(r"//.*", "", self.reg_track_init[var])
+            value = self.tr.const(init)
+        except vlog_expr.TranslateError as e:
+            self._error(f"reset value of {var}: {e}")
+        return value & vlog_expr.mask(self.widths[var])
+
+    # write the code from node nested one level, pass if there is none
+    def _dump_block(self, w, node, state_node, first=False):
+        if first:
+            self._visited = set()
+            self._frames = []
+        w.indent()
+        size = w.size
+        self.dump_subdag_py(w, node, state_node)
+        if w.size == size:
+            w.line("pass")
+        w.dedent()
+
+    # same walk as dump_subdag_sm (in "rel" mode, without -factorize)
+    def dump_subdag_py(self, w, node, state_node):
+        visited = self._visited
+        frame = []
+        self._frames.append(frame)
+        while node:
+            uid = node.uid
+            if uid in visited:
+                self._loop_error(node)
+            typ = node.typ
+            nx, ch1, ch2 = node.nxt, node.child[1], node.child[2]
+            if typ in fsm_converter_rtl.VISITED_TYPES:
+                frame.append(uid)
+                visited.add(uid)
+
+            if typ == "eif":
+                cond = node.code
+                n = ch2 if ch2 else nx
+                if utils.is_one(cond):
+                    self.dump_subdag_py(w, ch1, state_node)
+                elif utils.is_zero(cond):
+                    self.dump_subdag_py(w, n, state_node)
+                else:
+                    self._dump_if_else_py(w, cond, ch1, n, state_node)
+                node = None
+            elif typ == "if":
+                cond = node.code
+                if utils.is_one(cond):
+                    self.dump_subdag_py(w, ch1, state_node)
+                elif utils.is_zero(cond):
+                    self.dump_subdag_py(w, ch2, state_node)
+                else:
+                    self._dump_if_else_py(w, cond, ch1, ch2, state_node)
+                node = nx
+            elif typ == "sn":
+                self._statement(w, node.code)
+                node = node.succ()
+            elif typ == "tk":
+                if node != state_node:
+                    state = pyName(self.ostate)
+                    w.line(f"{state} = {self.rename_state[node]}")
+                node = None
+            elif typ == "fo":
+                init, cond, post = (node.code.split(";") + ["", ""])[:3]
+                if init.strip():
+                    self._statement(w, init)
+                w.line(f"while {self._cond(cond)}:")
+                w.indent()
+                size = w.size
+                self.dump_subdag_py(w, ch1, state_node)
+                if post.strip():
+                    self._statement(w, post)
+                if w.size == size:
+                    w.line("pass")
+                w.dedent()
+                node = nx
+            elif typ == "wh":
+                w.line(f"while {self._cond(node.code)}:")
+                self._dump_block(w, ch1, state_node)
+                node = nx
+            elif typ == "cs":
+                self._dump_case(w, node, state_node)
+                node = nx
+            elif typ == "cm":
+                node = node.succ()
+            else:
+                w.line(f"# Ignoring node={node} typ={typ}")
+                node = node.succ()
+        for uid in self._frames.pop():
+            visited.discard(uid)
+
+    def _dump_if_else_py(self, w, cond, ch_true, ch_false, state_node):
+        w.line(f"if {self._cond(cond)}:")
+        self._dump_block(w, ch_true, state_node)
+        if ch_false:
+            w.line("else:")
+            self._dump_block(w, ch_false, state_node)
+
+    # case items become an if/elif chain on a temporary
+    def _dump_case(self, w, node, state_node):
+        try:
+            sel = vlog_expr.parse(node.code)
+            tmp = self.tr.temp()
+            w.line(f"{tmp} = {self.tr.clean(sel)}")
+            sel_width = self.tr.width(sel)
+        except vlog_expr.TranslateError as e:
+            self._error(e)
+        item = node.child[1]
+        el = ""
+        while item:
+            label = item.code.rstrip(":")
+            if label == "default":
+                w.line("else:" if el else "if True:")
+            else:
+                w.line(f"{el}if {self._case_match(tmp, sel_width, label)}:")
+            self._dump_block(w, item.child[1], state_node)
+            el = "el"
+            item = item.nxt
+
+    def _case_match(self, tmp, sel_width, label):
+        conds = []
+        try:
+            for node in vlog_expr.ExprParser(label).items():
+                w = max(sel_width, self.tr.width(node))
+                conds.append(f"{tmp} == {self.tr.clean(node, w)}")
+        except vlog_expr.TranslateError as e:
+            self._error(e)
+        return " or ".join(conds)
+
+
+# --- name of the class modeling a block
+def className(args, sm_num):
+    name = f"{args.name}{sm_num}"
+    return name[:1].upper() + name[1:]
+
+
+# --- beginning and end of the Python module holding the models
+def header(args):
+    return (
+        f"# Python cycle models of the AlgoFSM blocks of {args.file}\n"
+        "# generated by AlgoFSM -pymodel. step() takes a dict with the value "
+        "of\n"
+        "# each of INPUTS and returns those of OUTPUTS after the clock edge"
+    )
+
+
+def footer(class_names):
+    return f"\n\n\nMODELS = {pyTuple(class_names, quote='')}\n"
+
+
+# --- tuple of names, one per line if long
+def pyTuple(names, quote='"', ind=""):
+    items = [f"{quote}{name}{quote}" for name in names]
+    if len(items) == 1:
+        return f"({items[0]},)"
+    txt = f"({', '.join(items)})"
+    if len(ind) + len(txt) < 64:
+        return txt
+    lines = "".join(f"{ind}    {item},\n" for item in items)
+    return f"(\n{lines}{ind})"
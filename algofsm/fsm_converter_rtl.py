@@ -5,21 +5,32 @@
 #
 # Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
 # ------------------------------------------------------------------------------
-from collections import defaultdict
+from collections import Counter
+from . import comb_depth
 from . import fsm_converter
 from . import dag_utils
+from . import perf_counters
+from . import state_encoding
+from . import state_min
+from . import state_region
 from . import utils
 from . import vlogparser
 
+# node types a path without `tick must not go through twice
+VISITED_TYPES = ("eif", "if", "fo", "wh", "sn", "cs", "csb")
+
 
 # Derived class takes care of transforming the code into a
 # synthesizable RTL version.
 class FsmConverterRTL(fsm_converter.FsmConverter):
-    def __init__(self, args):
-        super().__init__(args)
+    def __init__(self, args, sm_num=0):
+        super().__init__(args, sm_num)
         self.rename_state = {}
         self.parser = None
         self.root = None
+        self.join_flags = 0  # join flags declared, see dump_state
+        self.encoding = None  # StateEncoding of the state register
+        self.inserted_ticks = []  # (line, cycles) added by -max_depth
 
     def _expand_input(beh_in):
         # Expand the input to have an infinite loop around it
@@ -29,15 +40,18 @@ class FsmConverterRTL(fsm_converter.FsmConverter):
         inp += "end\n"
         return inp
 
-    # RTL output
-    def process_block(self, beh_in, ind, line_base, file_base=""):
+    # names and conditions used by code generation
+    def prepare(self):
         self.oprefix = f"{self.args.prefix}{self.sm_num}_"
         self.ostate = f"{self.args.state}{self.sm_num}"
-
-        # --- generate code ---
         self.tick, self.tick_no_rst = utils.get_ticks(self.args)
         self.reset_cond, self.not_reset_cond = utils.get_resets(self.args)
 
+    # RTL output
+    def process_block(self, beh_in, ind, line_base, file_base=""):
+        # --- generate code ---
+        self.prepare()
+
         # Start transformations and output generation
         inp = FsmConverterRTL._expand_input(beh_in)
 
@@ -49,7 +63,9 @@ class FsmConverterRTL(fsm_converter.FsmConverter):
 
         # parse the code and build a syntax tree
         self.parser = parser = vlogparser.VlogParser(inp, line_base, file_base)
-        self.root = root = parser.start_rule()
+        parser.check = self.args.check
+        self.root = root = self._run_pass("parse", parser.start_rule)
+        self._end_pass()
 
         # --- state machine (RTL) output
         if self.args.dbg > 0:
@@ -60,9 +76,17 @@ class FsmConverterRTL(fsm_converter.FsmConverter):
             parser.dump_dot(f"{self.sm_num}_00_before", root)
 
         # do some conversions at tree level
-        dag_utils.expand_tree_structs(
-            parser, root, root, ind, self.sm_num, self.args.dbg
+        self._run_pass(
+            "expand",
+            dag_utils.expand_tree_structs,
+            parser,
+            root,
+            root,
+            ind,
+            self.sm_num,
+            self.args.dbg,
         )
+        self._end_pass()
         if self.args.dbg > 0:
             parser.st_show_from_node(
                 f"{self.sm_num}_02_after_expand_struct", root
@@ -71,17 +95,45 @@ class FsmConverterRTL(fsm_converter.FsmConverter):
 
         # convert the syntax tree into a DAG which when read will generated
         # the right FSM
-        dag_utils.convert_to_dag(
-            parser, root, root, ind, self.sm_num, self.args.dbg
+        self._run_pass(
+            "to_dag",
+            dag_utils.convert_to_dag,
+            parser,
+            root,
+            root,
+            ind,
+            self.sm_num,
+            self.args.dbg,
         )
+        self._end_pass()
         if self.args.dbg > 0:
             parser.st_show_from_node(
                 f"{self.sm_num}_04_after_convert_to_dag", root
             )
             parser.dump_dot(f"{self.sm_num}_04_after_convert_to_dag", root)
 
+        # drop the states that can't be reached and the code only they run
+        self._run_pass("prune", self.prune_unreachable, parser, root)
+        self._end_pass()
+        if self.args.dbg > 0:
+            parser.st_show_from_node(
+                f"{self.sm_num}_04_after_prune_unreachable", root
+            )
+            parser.dump_dot(f"{self.sm_num}_04_after_prune_unreachable", root)
+
+        # split the states taking too many logic levels
+        if self.args.max_depth > 0:
+            self._run_pass("split", self.split_states, parser)
+            self._end_pass()
+            if self.args.dbg > 0:
+                parser.st_show_from_node(
+                    f"{self.sm_num}_05_after_split_states", root
+                )
+                parser.dump_dot(f"{self.sm_num}_05_after_split_states", root)
+
         # eliminate redundant states in the DAG (they produce identical code)
-        self.merge_states(parser, root, ind)
+        self._run_pass("merge", self.merge_states, parser, root, ind)
+        self._end_pass()
         if self.args.dbg > 0:
             parser.st_show_from_node(
                 f"{self.sm_num}_09_after_merge_states", root
@@ -89,49 +141,126 @@ class FsmConverterRTL(fsm_converter.FsmConverter):
             parser.dump_dot(f"{self.sm_num}_09_after_merge_states", root)
 
         # walk the DAG to produce RTL output
-        return self.dump_dag_sm(parser, root, ind, line_base, file_base)
+        return self._run_pass(
+            "dump", self.dump_dag_sm, parser, root, ind, line_base, file_base
+        )
+
+    # run a pass of the conversion, measured only when stats are enabled
+    def _run_pass(self, name, fn, *args):
+        if self.stats is None:
+            return fn(*args)
+        return self.stats.run_pass(name, self.parser, fn, *args)
+
+    # free the nodes removed by the last pass, then cross-check incrementally
+    # maintained parser data against a full recomputation, only when
+    # requested as it is slow
+    def _end_pass(self):
+        self.parser.compact()
+        if self.args.check:
+            self.parser.check_preds()
 
     # --------------------------------------------------------------------
     # DAG modification related routines
     # --------------------------------------------------------------------
-    def merge_states(self, p, root, ind):
+    def prune_unreachable(self, p, root):
+        states, statements = dag_utils.prune_unreachable(p, root)
+        if self.stats:
+            self.stats.set("dropped_states", len(states))
+            self.stats.set("dropped_statements", statements)
+        if not states and not statements:
+            return
+        dropped = []
+        if states:
+            lines = p.source_lines(p.tick_pos)
+            ticks = sorted({lines[int(node.code)] for node in states})
+            dropped.append(
+                f"{len(states)} state{'s' if len(states) > 1 else ''} "
+                f"(`tick at {utils.lines_text(ticks)})"
+            )
+        if statements:
+            dropped.append(
+                f"{statements} statement{'s' if statements > 1 else ''}"
+            )
+        utils.warning(
+            f"SM{self.sm_num}: dropped {' and '.join(dropped)} the FSM "
+            f"can't reach"
+        )
+
+    def split_states(self, p):
+        budget = self.args.max_depth
+        inserted, too_deep = comb_depth.splitStates(
+            p, comb_depth.costTable(self.args), budget
+        )
+        if self.stats:
+            self.stats.set("inserted_ticks", len(inserted))
+        self.inserted_ticks = sorted(Counter(p.source_lines(inserted)).items())
+        deepest = {}  # line: logic levels
+        lines = p.source_lines([pos for pos, _ in too_deep])
+        for line, (_, depth) in zip(lines, too_deep):
+            deepest[line] = max(deepest.get(line, 0), depth)
+        for line, depth in sorted(deepest.items()):
+            utils.warning(
+                f"SM{self.sm_num}: line {line} takes {depth} logic levels "
+                f"alone, more than -max_depth {budget}"
+            )
 
+    def merge_states(self, p, root, ind):
+        tk_nodes = [node for node in p.nodes if node.typ == "tk"]
+        sigs = state_min.StateSignatures(tk_nodes)
+        for tknode in tk_nodes:
+            try:
+                sigs.compute(tknode)
+            except state_min.LoopFound:
+                # let code generation report the loop without `tick
+                w = utils.CodeWriter(utils.Dumper(), self.args.tab, ind)
+                self.dump_state(w, tknode, "abs")
+                assert False, f"loop from {tknode} not detected"
+
+        # merge states generating identical code, first looking at the
+        # names of the successors ("abs"), then also considering self loops
+        # equal ("rel"). Only states reaching a merged one need their
+        # signature updated before looking for the next group to merge
         iter_cnt = 0
-        some_merged = True
-        while some_merged:
-            some_merged = False
-            tk_nodes = [node for node in p.nodes if node.typ == "tk"]
-
-            for mode in ("abs", "rel"):
-                tknodes_by_code = defaultdict(list)
-
-                # dump graph from each "tk" node
-                for tknode in tk_nodes:
-                    visited = set()
-                    codegen = self.dump_subdag_sm(
-                        tknode.succ(), ind + "      ", mode, tknode, visited
-                    )
-                    # keep track of how many tknodes generate same code
-                    tknodes_by_code[codegen].append(tknode)
-
-                # see which tknode's generated identical code
-                for codegen, tknodes in tknodes_by_code.items():
-                    if len(tknodes) > 1:
-                        some_merged = FsmConverterRTL.merge_ids(p, tknodes)
-                        break
-
-                if some_merged:
-                    if self.args.dbg > 1:
-                        p.st_show_from_node(
-                            f"{self.sm_num}_05_during_merging{iter_cnt}", root
-                        )
-                        p.dump_dot(
-                            f"{self.sm_num}_05_during_merging{iter_cnt}", root
-                        )
-                        iter_cnt += 1
-                    break
-            # end for mode
-        # end while some_merged
+        merge_iters = 0
+        merges = 0
+        while True:
+            tknodes = sigs.first_dup("abs") or sigs.first_dup("rel")
+            if tknodes is None:
+                break
+            merge_iters += 1
+            merges += len(tknodes) - 1
+            merged = tknodes[1:]
+            affected = set()
+            for node_b in merged:
+                affected |= sigs.reached_from[node_b]
+            affected.difference_update(merged)
+            for node in merged + list(affected):
+                sigs.forget(node)
+            FsmConverterRTL.merge_ids(p, tknodes)
+            for node in affected:
+                sigs.compute(node)
+            iter_cnt = self._dump_merging(p, root, iter_cnt)
+
+        # merge also states that are equivalent once their successors are
+        # (e.g. two identical cycles of states), which comparing the code
+        # of each state individually cannot find
+        tk_nodes = [node for node in p.nodes if node.typ == "tk"]
+        for tknodes in state_min.equivalent_states(tk_nodes):
+            merges += len(tknodes) - 1
+            FsmConverterRTL.merge_ids(p, tknodes)
+            iter_cnt = self._dump_merging(p, root, iter_cnt)
+        if self.stats:
+            self.stats.set("merge_iterations", merge_iters)
+            self.stats.set("merges", merges)
+
+    def _dump_merging(self, p, root, iter_cnt):
+        if self.args.dbg > 1:
+            p.st_show_from_node(
+                f"{self.sm_num}_05_during_merging{iter_cnt}", root
+            )
+            p.dump_dot(f"{self.sm_num}_05_during_merging{iter_cnt}", root)
+            iter_cnt += 1
+        return iter_cnt
 
     @staticmethod
     def merge_ids(p, nodes_to_merge):
@@ -191,26 +320,45 @@ class FsmConverterRTL(fsm_converter.FsmConverter):
                 st_name = f"{self.oprefix}{renamed}"
         return st_name
 
-    staticmethod
-
-    def _compute_state_bits(tks_by_code):
-        state_bits_m1 = 0
-        max_state = 2
-        for i, _ in enumerate(tks_by_code):
-            if i >= max_state:
-                max_state *= 2
-                state_bits_m1 += 1
-        return state_bits_m1
-
     # compute localparam state definition and rename_state dict
     def _compute_localpars(self, tks):
-        par_out = utils.Dumper()
+        par_out = []
         for i, code in enumerate(sorted(tks.keys())):
             tknode = tks[code]
             self.rename_state[tknode] = i
             st_name = self.state_name(tknode)
-            par_out.dump(f"localparam {st_name} = {i};")
-        return par_out.val()
+            value = self.encoding.param(i) if self.encoding else i
+            par_out.append(f"localparam {st_name} = {value};")
+        return par_out
+
+    # value of the state register going to the state of node
+    def state_value(self, node):
+        if self.encoding is None:
+            return self.state_name(node)
+        return self.encoding.value(self.state_name(node))
+
+    # transitions of this FSM in the -state_profile VCD if any, as
+    # {(from, to): count} with states numbered as in the binary encoding
+    def _state_profile(self, num_states):
+        transitions = self.args.state_transitions
+        if transitions is None:
+            return None
+        profile = transitions.get(self.sm_num)
+        state_r = self.ostate + self.args.state_suffix
+        if not profile:
+            utils.warning(
+                f"SM{self.sm_num}: no transition of {state_r} in "
+                f"{self.args.state_profile}, keeping the binary encoding"
+            )
+            return None
+        high = max(max(trans) for trans in profile)
+        if high >= num_states:
+            utils.error(
+                f"SM{self.sm_num} -state_profile: {state_r} takes the value "
+                f"{high} but there are {num_states} states. Profile a "
+                f"simulation of the design converted without -state_profile"
+            )
+        return profile
 
     # dump graph as an FSM
     def dump_dag_sm(self, p, root, ind, line_base, file_base):
@@ -225,18 +373,72 @@ class FsmConverterRTL(fsm_converter.FsmConverter):
 
         tks_by_code = {node.code: node for node in p.nodes if node.typ == "tk"}
 
-        state_bits_m1 = FsmConverterRTL._compute_state_bits(tks_by_code)
-        par_out = self._compute_localpars(tks_by_code)
-
         init_state_node = FsmConverterRTL.find_first_tk(p, root)
-        init_state = self.state_name(init_state_node)
+        self.encoding = encoding = state_encoding.StateEncoding(
+            self.args.encoding,
+            [tks_by_code[code] for code in sorted(tks_by_code)],
+            init_state_node,
+            self._state_profile(len(tks_by_code)),
+        )
+        state_bits_m1 = encoding.width - 1
+        if encoding.toggles:
+            before, after = encoding.toggles
+            utils.info(
+                f"SM{self.sm_num}: -state_profile codes toggle "
+                f"{after} state register bits instead of {before} "
+                f"({100 * (before - after) / before:.1f}% less) in the "
+                f"profiled run"
+            )
+        localpars = self._compute_localpars(tks_by_code)
+        perf = None
+        if self.args.perfcounters:
+            perf = perf_counters.PerfCounters(
+                self,
+                [tks_by_code[code] for code in sorted(tks_by_code)],
+                p.source_lines(p.tick_pos),
+            )
+        if self.stats:
+            self.stats.set("states", len(tks_by_code))
+            self.stats.set("state_width", state_bits_m1 + 1)
+
+        init_state = self.state_value(init_state_node)
+
+        # join flags are declared before the code of the states
+        regions = {
+            code: self.state_region(node) for code, node in tks_by_code.items()
+        }
+        self.join_flags = max(
+            [len(r.flag) for r in regions.values() if r is not None],
+            default=0,
+        )
 
         out = utils.Dumper()
 
         out.dump()
         out.dump(f"// AlgoFSM{self.sm_num} {{\n")
-        out.dump(f"// state constant definition")
-        out.dump(utils.indent(ind, par_out))
+        if self.inserted_ticks:
+            out.dump(
+                f"// -max_depth {self.args.max_depth}: cycles added before"
+            )
+            for line, cycles in self.inserted_ticks:
+                out.dump(f"//   line {line}: {cycles}")
+            out.dump()
+        if encoding.kind == "binary":
+            out.dump(f"// state constant definition")
+        elif encoding.kind == "onehot":
+            out.dump(f"// state constant definition (one-hot bit index)")
+        elif encoding.toggles:
+            out.dump(
+                f"// state constant definition (profile code, "
+                f"{encoding.toggles[1]} toggles instead of "
+                f"{encoding.toggles[0]})"
+            )
+        else:
+            out.dump(f"// state constant definition ({encoding.kind} code)")
+        for line in localpars:
+            out.dump(ind + line)
+        if perf:
+            perf.dump_decls(out, ind)
 
         # SINGLE BLOCK STYLE
         out.dump()
@@ -253,6 +455,8 @@ class FsmConverterRTL(fsm_converter.FsmConverter):
             + f"reg [{state_bits_m1}:0] {self.ostate}{curr}, "
             + f"{self.ostate};"
         )
+        for i in range(self.join_flags):
+            out.dump(ind + tab + f"reg {self.join_flag(i)};")
 
         out.dump()
         out.dump(ind + tab + f"if ({self.reset_cond}) begin")
@@ -260,25 +464,29 @@ class FsmConverterRTL(fsm_converter.FsmConverter):
             out.dump(utils.indent(ind + 2 * tab, self.ff_rst_in))
 
         out.dump(ind + 2 * tab + f"{self.ostate}{curr} <= {sd}{init_state};")
+        if perf:
+            perf.dump_reset(out, ind + 2 * tab)
         out.dump(ind + tab + "end")
         out.dump(ind + tab + f"else {ena_guard}begin")
         out.dump(ind + 2 * tab + "// set defaults for next state ")
         out.dump(utils.indent(ind + 2 * tab, self.ff_update_nxt))
         out.dump(ind + 2 * tab + f"{self.ostate} = {self.ostate}{curr};")
+        for i in range(self.join_flags):
+            out.dump(ind + 2 * tab + f"{self.join_flag(i)} = 0;")
         out.dump()
         out.dump(ind + 2 * tab + "// SmForever")
-        out.dump(ind + 2 * tab + f"case ({self.ostate}{curr})")
+        state_r = f"{self.ostate}{curr}"
+        out.dump(ind + 2 * tab + f"case ({encoding.case_expr(state_r)})")
 
         for code in sorted(tks_by_code.keys()):
-            visited = set()
             node = tks_by_code[code]
-            st_name = self.state_name(node)
-            out.dump(ind + 3 * tab + f"{st_name}: begin")
-            out.dump(
-                self.dump_subdag_sm(
-                    node.succ(), ind + 4 * tab, "rel", node, visited
-                )
-            )
+            item = encoding.case_item(self.state_name(node), state_r)
+            out.dump(ind + 3 * tab + f"{item}: begin")
+            out.dump()
+            w = utils.CodeWriter(out, tab, ind + 4 * tab)
+            self.dump_state(w, node, "rel", regions[code])
+            if perf:
+                perf.dump_count(w, node)
             out.dump_nonl(ind + 3 * tab + f"end")
 
         out.dump(ind + 2 * tab + "endcase")
@@ -293,163 +501,261 @@ class FsmConverterRTL(fsm_converter.FsmConverter):
         out.dump()
         out.dump(ind + "// rename local state registers dropping suffix")
         out.dump(utils.indent(ind, self.ff_rename_ffs))
+        if perf:
+            perf.dump_report(out, ind, file_base, line_base)
 
         out.dump()
         out.dump(f"// }} AlgoFSM{self.sm_num}\n")
         return out.val()
 
-    def dump_subdag_sm(self, node, ind, mode, state_node, visited_in):
-
-        stay_txt = "// stay in state"
-        visited = set(visited_in)  # make a value copy
+    # reconvergence analysis of the code of a state for -factorize
+    def state_region(self, state_node):
+        node = state_node.succ()
+        if not self.args.factorize or node is None:
+            return None
+        region = state_region.StateRegion(node)
+        if region.loop:
+            return None  # dump_subdag_sm reports it
+        return region
+
+    # write the code of the state of the given tk node. With a region the
+    # code reached by several paths is emitted once, see state_region
+    def dump_state(self, w, state_node, mode, region=None):
+        self._visited = set()  # nodes in the path being emitted
+        self._frames = []  # the ones added by each nested call
+        self._size_limit = self.args.max_state_size * 1024 * 1024
+        node = state_node.succ()
+        self.dump_subdag_sm(w, node, mode, state_node, region)
+        if region is not None:
+            self._dump_joins(w, None, mode, state_node, None, region)
+
+    def join_flag(self, i):
+        return f"{self.ostate}_join{i}"
+
+    # flag guarded code of the joins owned by an eif (None for the state)
+    def _dump_joins(self, w, owner, mode, state_node, stop, region):
+        for node in region.owned.get(owner, []):
+            flag = self.join_flag(region.flag[node.uid])
+            w.line(f"if ({flag}) begin")
+            w.indent()
+            self.dump_subdag_sm(
+                w, node, mode, state_node, region, stop, node
+            )
+            w.dedent()
+            w.line("end")
+
+    def _state_too_big(self, state_node):
+        utils.error(
+            f"SM{self.sm_num} code generated for state "
+            f"{self.state_name(state_node)} exceeds -max_state_size "
+            f"({self.args.max_state_size:g} MB). Try -factorize"
+        )
 
-        def flag_visited(node):
-            visited.add(node.uid)
+    def _loop_error(self, node):
+        # the visited set as each nested call used to copy it
+        visited = set()
+        for frame in self._frames:
+            visited = set(visited)
+            visited.update(frame)
+        visited_str = ", ".join([str(x) for x in visited])
+        self.parser.st_show_from_node(f"error", self.root)
+        self.parser.dump_dot(
+            f"error",
+            self.root,
+            msg="loop within " + visited_str,
+            hilight=list(visited),
+        )
+        utils.error(
+            f"SM{self.sm_num} There is a loop path without `tick "
+            f"within the set of nodes {visited_str}. Currently "
+            f"@{node.uid}. See error.dot/.dbg"
+        )
 
-        def build_if_else(cond, true_blk, false_blk):
-            out = ""
-            if (
-                false_blk is not None
-                and utils.is_only_stay(stay_txt, true_blk)
-            ):
-                out += ind + f"if ({utils.negate(cond)}) begin" + "\n"
-                out += false_blk
-                out += ind + "end\n"
+    # what dump_subdag_sm would write from node without writing it: "empty",
+    # only "stay" in the state, or some other "code"
+    def _preview(self, node, mode, state_node, region=None, stop=None):
+        seen = set()
+        while node and node is not stop:
+            if node.uid in self._visited or node.uid in seen:
+                return "code"  # dump_subdag_sm reports the loop
+            seen.add(node.uid)
+            if region and node.uid in region.flag:
+                return "code"
+            cond = node.code
+            if node.typ == "eif" and utils.is_one(cond):
+                node = node.child[1]
+            elif node.typ == "eif" and utils.is_zero(cond):
+                node = node.child[2] if node.child[2] else node.nxt
+            elif node.typ == "if" and utils.is_one(cond):
+                if self._preview(node.child[1], mode, state_node) != "empty":
+                    return "code"
+                node = node.nxt
+            elif node.typ == "if" and utils.is_zero(cond):
+                if self._preview(node.child[2], mode, state_node) != "empty":
+                    return "code"
+                node = node.nxt
+            elif node.typ == "cm" and node.code.strip() == "":
+                node = node.succ()
+            elif node.typ == "tk":
+                if mode == "rel" and node == state_node:
+                    return "stay"
+                return "code"
             else:
-                out += ind + f"if ({cond}) begin" + "\n"
-                out += true_blk
-                out += ind + "end\n"
-                if false_blk is not None:
-                    out += ind + "else begin\n"
-                    out += false_blk
-                    out += ind + "end\n"
-            return out
-
-        tab = self.args.tab
-        out = ""
-        while node:
-            if node.uid in visited:
-                visited_str = ", ".join([str(x) for x in visited])
-                self.parser.st_show_from_node(f"error", self.root)
-                self.parser.dump_dot(
-                    f"error",
-                    self.root,
-                    msg="loop within " + visited_str,
-                    hilight=list(visited),
-                )
-                utils.error(
-                    f"SM{self.sm_num} There is a loop path without `tick "
-                    f"within the set of nodes {visited_str}. Currently "
-                    f"@{node.uid}. See error.dot/.dbg"
-                )
-
+                return "code"
+        return "empty"
+
+    # write if/else of the code from ch_true and ch_false (if has_false),
+    # each until stop
+    def _dump_if_else(
+        self, w, cond, ch_true, ch_false, has_false, mode, state_node,
+        region, stop
+    ):
+        # reverse the condition when the true block only stays in state
+        stay = self._preview(ch_true, mode, state_node, region, stop)
+        if has_false and stay == "stay":
+            cond, ch_true, has_false = utils.negate(cond), ch_false, False
+        w.line(f"if ({cond}) begin")
+        w.indent()
+        self.dump_subdag_sm(w, ch_true, mode, state_node, region, stop)
+        w.dedent()
+        w.line("end")
+        if has_false:
+            w.line("else begin")
+            w.indent()
+            self.dump_subdag_sm(w, ch_false, mode, state_node, region, stop)
+            w.dedent()
+            w.line("end")
+
+    # write a block nested in a for/while/case
+    def _dump_nested(self, w, head, node, tail, mode, state_node):
+        w.line(head)
+        w.indent()
+        self.dump_subdag_sm(w, node, mode, state_node)
+        w.dedent()
+        w.line(tail)
+
+    # with region, code is written until reaching stop, and reaching a
+    # flagged join other than the one guarded just sets its flag
+    def dump_subdag_sm(
+        self, w, node, mode, state_node, region=None, stop=None, guarded=None
+    ):
+        visited = self._visited
+        frame = []  # nodes added to visited by this call
+        self._frames.append(frame)
+        limit = self._size_limit
+
+        while node and node is not stop:
+            if limit and w.size > limit:
+                self._state_too_big(state_node)
+            uid = node.uid
+            if region and node is not guarded and uid in region.flag:
+                # the code from here is emitted once, guarded by its flag
+                w.line(f"{self.join_flag(region.flag[uid])} = 1;")
+                break
+            if uid in visited:
+                self._loop_error(node)
+
+            typ = node.typ
             nx, ch1, ch2 = node.nxt, node.child[1], node.child[2]
+            if typ in VISITED_TYPES:
+                frame.append(uid)
+                visited.add(uid)
 
-            if node.typ == "eif":
-                flag_visited(node)
+            if typ == "eif":
                 cond = node.code
+                join = region.join.get(uid) if region else None
+                n = ch2 if ch2 else nx
                 if utils.is_one(cond):
-                    out += self.dump_subdag_sm(
-                        ch1, ind, mode, state_node, visited
+                    self.dump_subdag_sm(
+                        w, ch1, mode, state_node, region, stop
                     )
                 elif utils.is_zero(cond):
-                    n = ch2 if ch2 else nx
                     if n:
-                        out += self.dump_subdag_sm(
-                            n, ind, mode, state_node, visited
+                        self.dump_subdag_sm(
+                            w, n, mode, state_node, region, stop
                         )
+                elif join is not None:
+                    self._dump_join_if_else(
+                        w, node, cond, n, mode, state_node, region, join
+                    )
                 else:
-                    true_blk = self.dump_subdag_sm(
-                        ch1, ind + tab, mode, state_node, visited
+                    self._dump_if_else(
+                        w, cond, ch1, n, bool(n), mode, state_node, region,
+                        stop
                     )
-                    n = ch2 if ch2 else nx
-                    false_blk = None
-                    if n:
-                        false_blk = self.dump_subdag_sm(
-                            n, ind + tab, mode, state_node, visited
-                        )
-                    out += build_if_else(cond, true_blk, false_blk)
-
-                node = None
-            elif node.typ == "if":
-                flag_visited(node)
+                node = join
+            elif typ == "if":
                 cond = node.code
                 if utils.is_one(cond):
-                    out += self.dump_subdag_sm(
-                        ch1, ind, mode, state_node, visited
-                    )
+                    self.dump_subdag_sm(w, ch1, mode, state_node)
                 elif utils.is_zero(cond):
-                    out += self.dump_subdag_sm(
-                        ch2, ind, mode, state_node, visited
-                    )
+                    self.dump_subdag_sm(w, ch2, mode, state_node)
                 else:
-                    true_blk = self.dump_subdag_sm(
-                        ch1, ind + tab, mode, state_node, visited
+                    self._dump_if_else(
+                        w, cond, ch1, ch2, bool(ch2), mode, state_node,
+                        None, None
                     )
-                    false_blk = None
-                    if ch2:
-                        false_blk = self.dump_subdag_sm(
-                            ch2, ind + tab, mode, state_node, visited
-                        )
-                    out += build_if_else(cond, true_blk, false_blk)
                 node = nx
-            elif node.typ == "fo":
-                flag_visited(node)
-                cond = node.code
-                out += ind + f"for ({cond}) begin" + "\n"
-                out += self.dump_subdag_sm(
-                    ch1, ind + tab, mode, state_node, visited
-                )
-                out += ind + "end\n"
-                node = nx
-            elif node.typ == "wh":
-                flag_visited(node)
-                cond = node.code
-                out += ind + f"while ({cond}) begin" + "\n"
-                out += self.dump_subdag_sm(
-                    ch1, ind + tab, mode, state_node, visited
-                )
-                out += ind + "end\n"
-                node = nx
-            elif node.typ == "sn":
-                flag_visited(node)
-                out_code = node.code
-                out += ind + f"{out_code};\n"
-                node = node.succ()
-            elif node.typ == "cm":
-                out += ind + f"{node.code}"
+            elif typ == "sn":
+                w.line(f"{node.code};")
                 node = node.succ()
-            elif node.typ == "cs":
-                flag_visited(node)
-                cond = node.code
-                out += ind + f"case ({cond})" + "\n"
-                out += self.dump_subdag_sm(
-                    ch1, ind + tab, mode, state_node, visited
-                )
-                out += ind + "endcase\n"
-                node = nx
-            elif node.typ == "csb":
-                flag_visited(node)
-                expr = node.code
-                out += ind + f"{expr} begin" + "\n"
-                out += self.dump_subdag_sm(
-                    ch1, ind + tab, mode, state_node, visited
-                )
-                out += ind + "end\n"
-                node = nx
-            elif node.typ == "tk":
+            elif typ == "tk":
                 if mode == "rel" and node == state_node:
-                    out += ind + stay_txt + "\n"
+                    w.line("// stay in state")
                 else:
-                    state_name = self.state_name(node)
-                    out += ind + f"{self.ostate} = {state_name};\n"
+                    w.line(f"{self.ostate} = {self.state_value(node)};")
                 node = None
+            elif typ == "fo":
+                head = f"for ({node.code}) begin"
+                self._dump_nested(w, head, ch1, "end", mode, state_node)
+                node = nx
+            elif typ == "wh":
+                head = f"while ({node.code}) begin"
+                self._dump_nested(w, head, ch1, "end", mode, state_node)
+                node = nx
+            elif typ == "cs":
+                head = f"case ({node.code})"
+                self._dump_nested(w, head, ch1, "endcase", mode, state_node)
+                node = nx
+            elif typ == "csb":
+                head = f"{node.code} begin"
+                self._dump_nested(w, head, ch1, "end", mode, state_node)
+                node = nx
+            elif typ == "cm":
+                w.raw(f"{node.code}")
+                node = node.succ()
             else:
-                out += (
-                    ind
-                    + f"// Ignoring node={node} typ={node.typ} "
+                w.line(
+                    f"// Ignoring node={node} typ={typ} "
                     + f"code='{node.code}'"
-                    + "\n"
                 )
                 node = node.succ()
-        return out
+
+        if limit and w.size > limit:
+            self._state_too_big(state_node)
+        for uid in self._frames.pop():
+            visited.discard(uid)
+
+    # both branches of node continue with join: close the if/else before
+    # it, write the joins it owns and follow it sequentially
+    def _dump_join_if_else(
+        self, w, node, cond, n, mode, state_node, region, join
+    ):
+        ch1 = node.child[1]
+        empty_true = (
+            self._preview(ch1, mode, state_node, region, join) == "empty"
+        )
+        empty_false = (
+            self._preview(n, mode, state_node, region, join) == "empty"
+        )
+        if empty_true and not empty_false:
+            self._dump_if_else(
+                w, utils.negate(cond), n, None, False, mode, state_node,
+                region, join
+            )
+        elif not empty_true:
+            self._dump_if_else(
+                w, cond, ch1, n, not empty_false, mode, state_node, region,
+                join
+            )
+        self._dump_joins(w, node.uid, mode, state_node, join, region)
@@ -0,0 +1,324 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Static cycle counts of the FSM of a SM block (-latency)
+#
+# The analysis walks the DAG once its states are merged, counting the `tick
+# (clock cycles) on the paths. Every cycle of the DAG goes through the eif
+# of a source loop, so a path is kept acyclic by going over the loops it
+# does not need to enter, whose cycles are then given in terms of their
+# number of iterations: with N52 iterations of the loop at line 52, taking
+# 2 cycles each, a path through it takes 2*N52 cycles more. The paths
+# counted are:
+#
+# - for each loop, from the start of its body back to its condition, the
+#   cycles per iteration
+# - for each /// comment, from the start of SmForever to it, the latency of
+#   the point it marks, entering the loops holding it
+#
+# The lowest and highest counts of the paths are given. Loops without
+# `tick run within a state and take no cycles
+# ------------------------------------------------------------------------------
+import json
+from . import fsm_converter_rtl
+from . import utils
+from .state_region import region_succs
+
+FORMATS = ("text", "json")
+LOOP_KINDS = ("while", "do", "for")  # of the statements the parser records
+LOOP_TYPES = ("if", "fo", "wh", "do", "cs", "csb")  # within a state
+
+
+# successors of a node with the cycles it takes
+def succs(node):
+    if node.typ == "tk":
+        return [node.child[1]]
+    if node.typ == "eif":
+        return region_succs(node)
+    if node.typ in LOOP_TYPES:
+        return [node.nxt]
+    return [node.succ()]
+
+
+# node the loop with condition eif goes to when done, None if it can't end
+def loopExit(eif):
+    if utils.is_one(eif.code):
+        return None
+    return eif.child[2] or eif.nxt
+
+
+# --------------------------------------------------------------------
+# cycles of the paths of a DAG between two nodes, the lowest (lo), the
+# highest (hi) and the loops gone over (iterated)
+# --------------------------------------------------------------------
+class Cycles:
+    def __init__(self, lo=0, hi=0, iterated=frozenset()):
+        self.lo = lo
+        self.hi = hi
+        self.iterated = iterated
+
+    def then(self, cycles, loop=None):
+        iterated = self.iterated
+        if loop is not None:
+            iterated = iterated | {loop}
+        return Cycles(self.lo + cycles, self.hi + cycles, iterated)
+
+    def join(self, other):
+        return Cycles(
+            min(self.lo, other.lo),
+            max(self.hi, other.hi),
+            self.iterated | other.iterated,
+        )
+
+
+class Loop:
+    def __init__(self, eif, kind, line):
+        self.eif = eif
+        self.kind = kind  # while, for, do, forever
+        self.line = line
+        self.body = set()  # uids of the nodes of its iterations
+        self.wait = False  # only waits for its condition
+        self.cycles = None  # per iteration
+
+
+# --------------------------------------------------------------------
+# instead of Verilog, the output of a block is its report
+# --------------------------------------------------------------------
+class FsmConverterLatency(fsm_converter_rtl.FsmConverterRTL):
+    def dump_dag_sm(self, p, root, ind, line_base, file_base):
+        self.prepare()
+        lines = self._lines(p)
+        self._reachable(root)
+        self.loops = {}  # eif uid: Loop
+        self.heads = {}  # node uid: do loops whose body starts there
+        report = {"sm": self.sm_num, "file": file_base, "line": line_base}
+        live = {node.uid: node for node in p.nodes}
+        others = []  # loops within a state, merged or dropped
+        for uid, (kind, _) in p.positions.items():
+            if kind not in LOOP_KINDS or uid == root.uid:
+                continue
+            node = live.get(uid)
+            if node is None:  # dropped with the code the FSM can't reach
+                info = {"line": lines[uid], "kind": kind}
+                others.append(self._with_cycles(info, None))
+            elif node.typ != "eif":
+                others.append(self._loop_info(kind, lines[uid], node))
+            elif uid not in self.by_uid:
+                others.append(self._loop_info(kind, lines[uid], None))
+            else:
+                self.loops[uid] = Loop(node, kind, lines[uid])
+        # SmForever is the loop around the code added by _expand_input
+        self.loops[root.uid] = Loop(root, "forever", line_base)
+        for loop in self.loops.values():
+            self._find_body(loop)
+        for loop in sorted(self.loops.values(), key=lambda l: -len(l.body)):
+            if loop.kind == "do":
+                self.heads.setdefault(loop.eif.child[1].uid, []).append(loop)
+        for loop in self.loops.values():
+            loop.cycles = self._cycles(loop.eif.child[1], loop.eif)
+
+        report["loops"] = sorted(
+            [
+                self._loop_info(loop.kind, loop.line, loop.eif, loop)
+                for loop in self.loops.values()
+            ]
+            + others,
+            key=lambda info: info["line"],
+        )
+        # latencies are counted from the state SmForever starts at
+        start = root.child[1].child[1]
+        report["markers"] = []
+        for uid, (kind, pos) in p.positions.items():
+            if kind == "///":
+                node = self.by_uid.get(uid)
+                cycles = node and self._cycles(start, node)
+                text = p.parse_in[p.parse_in.rfind("\n", 0, pos) + 1 : pos]
+                info = {"line": lines[uid], "text": text.strip()[3:].strip()}
+                report["markers"].append(self._with_cycles(info, cycles))
+        report["markers"].sort(key=lambda info: info["line"])
+        if self.args.latency_format == "json":
+            return json.dumps(report, indent=1) + "\n"
+        return self._text(report)
+
+    # source line of each position recorded by the parser
+    @staticmethod
+    def _lines(p):
+        items = sorted(p.positions.items(), key=lambda item: item[1][1])
+        lines = p.source_lines([pos for _, (_, pos) in items])
+        return {uid: line for (uid, _), line in zip(items, lines)}
+
+    def _reachable(self, root):
+        self.by_uid = {}
+        todo = [root]
+        while todo:
+            node = todo.pop()
+            if node is None or node.uid in self.by_uid:
+                continue
+            self.by_uid[node.uid] = node
+            todo += succs(node)
+
+    # nodes on the paths from the start of the body of a loop back to its
+    # condition, nested loops included
+    def _find_body(self, loop):
+        eif = loop.eif
+        reached = {eif.uid: []}  # uid: predecessors within the body
+        todo = [(eif.child[1], eif)]
+        while todo:
+            node, pred = todo.pop()
+            if node is None:
+                continue
+            preds = reached.get(node.uid)
+            if preds is not None:
+                preds.append(pred)
+                continue
+            reached[node.uid] = [pred]
+            todo += [(n, node) for n in succs(node)]
+        todo = [eif]
+        while todo:
+            node = todo.pop()
+            for pred in reached[node.uid]:
+                if pred.uid not in loop.body and pred is not eif:
+                    loop.body.add(pred.uid)
+                    todo.append(pred)
+        loop.wait = loop.kind != "forever" and all(
+            self.by_uid[uid].typ in ("tk", "cm") for uid in loop.body
+        )
+
+    # steps a path at node can take towards target, as (next node, cycles,
+    # loop gone over)
+    def _steps(self, node, target):
+        for loop in self.heads.get(node.uid, []):
+            if loop.eif is not target and target.uid not in loop.body:
+                return [(loopExit(loop.eif), 0, loop)]
+        loop = self.loops.get(node.uid)
+        if loop is not None:
+            if target.uid not in loop.body:
+                if loop.kind == "do":  # left, it was gone over at its head
+                    return [(loopExit(node), 0, None)]
+                return [(loopExit(node), 0, loop)]
+            if loop.kind == "do":  # back to its start without target
+                return []
+            return [(node.child[1], 0, None)]
+        cycles = 1 if node.typ == "tk" else 0
+        return [(n, cycles, None) for n in succs(node)]
+
+    # Cycles of the paths from start to target, None if there are none. Paths
+    # going back to a node already in them go nowhere
+    def _cycles(self, start, target):
+        done = {}  # uid: Cycles, None if target can't be reached
+        steps = {}  # uid: steps of the nodes being walked
+        todo = [start]
+        while todo:
+            node = todo[-1]
+            if node is None or node.uid in done:
+                todo.pop()
+                continue
+            if node is target:
+                done[node.uid] = Cycles()
+                todo.pop()
+                continue
+            if node.uid not in steps:
+                steps[node.uid] = self._steps(node, target)
+                for n, _, _ in steps[node.uid]:
+                    if n is not None and n.uid not in steps:
+                        todo.append(n)
+                continue
+            cycles = None
+            for n, step, loop in steps.pop(node.uid):
+                rest = done.get(n.uid) if n is not None else None
+                if rest is not None:
+                    rest = rest.then(step, loop)
+                    cycles = rest if cycles is None else cycles.join(rest)
+            done[node.uid] = cycles
+            todo.pop()
+        return done.get(start.uid)
+
+    def _loop_info(self, kind, line, node, loop=None):
+        info = {"line": line, "kind": kind}
+        if node is not None:
+            info["cond"] = node.code.strip()
+        if loop is None:
+            if node is None:
+                info["merged"] = True  # its states are another loop's
+            else:
+                info["min"] = info["max"] = 0
+                info["iterated"] = []
+            return info
+        info["wait"] = loop.wait
+        return self._with_cycles(info, loop.cycles)
+
+    @staticmethod
+    def _with_cycles(info, cycles):
+        if cycles is None:
+            info["reached"] = False
+            return info
+        info["min"] = cycles.lo
+        info["max"] = cycles.hi
+        info["iterated"] = sorted(loop.line for loop in cycles.iterated)
+        return info
+
+    # --------------------------------------------------------------------
+    # text report
+    # --------------------------------------------------------------------
+    def _text(self, report):
+        out = utils.Dumper()
+        w = utils.CodeWriter(out, self.args.tab)
+        w.line(
+            f"SM{report['sm']} {report['file']}:{report['line']}: cycles "
+            f"per iteration of each loop. Nx is the number of iterations of "
+            f"the loop at line x, Cx its cycles per iteration"
+        )
+        w.indent()
+        by_line = {info["line"]: info for info in report["loops"]}
+        for info in report["loops"]:
+            what = info["kind"]
+            if info.get("wait"):
+                what = "wait"
+            if what == "forever":
+                what = "SmForever"
+            elif "cond" in info:
+                what += f" ({info['cond']})"
+            if info.get("merged"):
+                w.line(f"line {info['line']} {what}: shares its states")
+            elif info.get("reached") is False:
+                w.line(f"line {info['line']} {what}: not reached")
+            elif "wait" not in info:
+                w.line(f"line {info['line']} {what}: 0, within a state")
+            else:
+                cycles = _formula(info, by_line)
+                w.line(f"line {info['line']} {what}: {cycles}")
+        w.dedent()
+        if report["markers"]:
+            w.line(f"SM{report['sm']}: cycles from the start of SmForever")
+            w.indent()
+            for info in report["markers"]:
+                w.line(
+                    f"line {info['line']} /// {info['text']}: "
+                    f"{_formula(info, by_line)}"
+                )
+            w.dedent()
+        return out.val()
+
+
+# cycles of a path and of the loops it goes over as a formula
+def _formula(info, by_line):
+    if info.get("reached") is False:
+        return "not reached"
+    terms = []
+    lo, hi = info["min"], info["max"]
+    fixed = str(lo) if lo == hi else f"{lo}..{hi}"
+    for line in info["iterated"]:
+        loop = by_line[line]
+        if loop.get("reached") is False:
+            continue
+        if loop["min"] == loop["max"] and not loop["iterated"]:
+            per = str(loop["min"])
+        else:
+            per = f"C{line}"
+        terms.append(f"{per}*N{line}")
+    return " + ".join([fixed] + terms)
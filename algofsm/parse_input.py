@@ -5,11 +5,24 @@
 #
 # Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
 # ------------------------------------------------------------------------------
+import cProfile
+import io
+import json
+import locale
+import os
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum, auto
 from . import utils
+from . import block_cache
+from . import stats
 from . import fsm_converter
 from . import fsm_converter_rtl
+from . import fsm_converter_py
+from . import equiv
+from . import latency
+from . import vlog_prep
 
 
 class ParserState(Enum):
@@ -20,64 +33,415 @@ class ParserState(Enum):
     InSmEnd = auto()
 
 
+# --- Contents of one SmBegin/SmForever/SmEnd section
+class SmBlock:
+    def __init__(
+        self, sm_num, decl_in, inp, line_decl_base, line_forever_base
+    ):
+        self.sm_num = sm_num
+        self.decl_in = decl_in
+        self.inp = inp
+        self.line_decl_base = line_decl_base
+        self.line_forever_base = line_forever_base
+
+
+# the input is read in slices of whole lines of about this many bytes
+CHUNK_SIZE = 1 << 20
+
+
+# --- find from pos (a line start) the next line holding only the marker
+# --- word, returns the start and end (before the line end) of that line
+def findMarker(chunk, word, pos):
+    while True:
+        i = chunk.find(word, pos)
+        if i < 0:
+            return None
+        beg = chunk.rfind(b"\n", pos, i) + 1 or pos
+        end = chunk.find(b"\n", i)
+        if end < 0:
+            end = len(chunk)
+        if chunk[beg:end].strip(b" \t\f\v\r") == word:
+            return beg, end
+        pos = i + len(word)
+
+
+SM_DECL_RE = re.compile(r"(\s*)SmDecl:\s*(.*)")
+
+
+# --- read a binary file in slices that end at a line end
+def readChunks(fin):
+    while True:
+        chunk = fin.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        if not chunk.endswith(b"\n"):
+            chunk += fin.readline()
+        yield chunk
+
+
+# --- text as read by open() in text mode (universal newlines)
+def decode(data, encoding):
+    txt = data.decode(encoding)
+    return txt.replace("\r\n", "\n").replace("\r", "\n")
+
+
+# --- lines of a slice, keeping the line terminator
+def splitLines(data, encoding):
+    parts = decode(data, encoding).split("\n")
+    lines = [line + "\n" for line in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+
 # --- Top level parsing of the file
 # --- Identify several sections and grab their contents
-def parseInputFile(args):
-    with open(args.out, "w") as fout:
-        state = ParserState.Idle
-        line_no = 0
-        line_forever_base = 0
-        line_decl_base = 0
-        with open(args.file) as fin:
-            line = fin.readline()
-            while line:
-                lineStr = line.strip()
-                line_no += 1
-                if state == ParserState.Idle or state == ParserState.Done:
-                    if "SmBegin" == lineStr:
-                        state = ParserState.InSmBegin
-                        decl_in = ""
-                        inp = ""
-                        line_decl_base = line_no
-                    else:
-                        print(line, end="", file=fout)
-                elif state == ParserState.InSmBegin:
-                    if "SmForever" == lineStr:
-                        line_forever_base = line_no
-                        state = ParserState.InSmForever
-                    else:
-                        decl_in += line
-                elif state == ParserState.InSmForever:
-                    if "SmEnd" == lineStr:
-                        state = ParserState.InSmEnd
-                    else:
-                        # allow a flop defintion to be embedded within the
-                        # forever block the first portion of the match is
-                        # to grab indent level
-                        m = re.match(r"(\s*)SmDecl:\s*(.*)", line)
-                        if m:
-                            ind, rest = m.groups()
-                            decl_in += ind + rest + "\n"
-                        else:
-                            inp += line
-
-                if state == ParserState.InSmEnd:
-                    if args.behav:
-                        conv = fsm_converter.FsmConverter(args)
+# --- Yields text to pass through as it is (in slices of whole lines) and
+# --- SmBlock's to convert. The input is read in chunks searched for the
+# --- marker lines and only the SM sections are split in lines, so the
+# --- memory used does not depend on the size of the text outside them.
+# --- With passthrough=False only the SmBlock's are yielded. With -prep the
+# --- files the input depends on are added to deps if given
+def scanInputFile(args, passthrough=True, cache=None, deps=None):
+    if args.prep:
+        text, files = vlog_prep.preprocessFile(args, args.file, cache)
+        if deps is not None:
+            deps += files
+        yield from scanText(text, args.file, passthrough)
+        return
+    encoding = locale.getpreferredencoding(False)
+    with open(args.file, "rb") as fin:
+        yield from scanStream(fin, args.file, encoding, passthrough)
+
+
+# --- same as scanInputFile on a string holding the input
+def scanText(text, file, passthrough=True):
+    fin = io.BytesIO(text.encode("utf-8"))
+    yield from scanStream(fin, file, "utf-8", passthrough)
+
+
+def scanStream(fin, file, encoding, passthrough):
+    markers = {
+        ParserState.Idle: b"SmBegin",
+        ParserState.Done: b"SmBegin",
+        ParserState.InSmBegin: b"SmForever",
+        ParserState.InSmForever: b"SmEnd",
+    }
+    state = ParserState.Idle
+    line_no = 0
+    line_forever_base = 0
+    line_decl_base = 0
+    sm_num = 0
+    for chunk in readChunks(fin):
+        pos = 0
+        while pos < len(chunk):
+            m = findMarker(chunk, markers[state], pos)
+            end = m[0] if m else len(chunk)
+            if state in (ParserState.Idle, ParserState.Done):
+                if passthrough and end > pos:
+                    yield decode(chunk[pos:end], encoding)
+            elif state == ParserState.InSmBegin:
+                decl_lines += splitLines(chunk[pos:end], encoding)
+            else:
+                # allow a flop defintion to be embedded within the
+                # forever block the first portion of the match is
+                # to grab indent level
+                for line in splitLines(chunk[pos:end], encoding):
+                    md = SM_DECL_RE.match(line)
+                    if md:
+                        ind, rest = md.groups()
+                        decl_lines.append(ind + rest + "\n")
                     else:
-                        conv = fsm_converter_rtl.FsmConverterRTL(args)
-                    conv.extract_initial(decl_in, line_decl_base)
-                    out = conv.process_block(
-                        inp, "", line_forever_base, args.file
-                    )
-                    print(out, file=fout)
-                    state = ParserState.Done
+                        inp_lines.append(line)
+            line_no += chunk.count(b"\n", pos, end)
+            if m is None:
+                break
+            line_no += 1
+            pos = m[1] + 1
 
-                line = fin.readline()
+            if state in (ParserState.Idle, ParserState.Done):
+                state = ParserState.InSmBegin
+                decl_lines = []
+                inp_lines = []
+                line_decl_base = line_no
+            elif state == ParserState.InSmBegin:
+                line_forever_base = line_no
+                state = ParserState.InSmForever
+            else:
+                yield SmBlock(
+                    sm_num,
+                    "".join(decl_lines),
+                    "".join(inp_lines),
+                    line_decl_base,
+                    line_forever_base,
+                )
+                sm_num += 1
+                state = ParserState.Done
 
     if state == ParserState.Idle:
         utils.warning("SmBegin section not found")
     elif state == ParserState.InSmBegin:
-        utils.error("SmCombo/SmForever section not found")
+        utils.error(
+            "SmCombo/SmForever section not found",
+            file=file,
+            line=line_decl_base,
+        )
     elif state == ParserState.InSmForever:
-        utils.error("SmEnd not found")
+        utils.error("SmEnd not found", file=file, line=line_decl_base)
+
+
+# --- Convert one SmBlock, returns generated code, time taken and the
+# --- BlockStats if -stats was given and the warnings given, which
+# --- reportBlock shows. Errors without a location are given the one of the
+# --- block, after showing the warnings. module is the ModuleInfo used by
+# --- -pymodel and -equiv
+def convertBlock(args, blk, module=None):
+    start = time.perf_counter()
+    cpu = time.thread_time()
+    if args.latency:
+        conv = latency.FsmConverterLatency(args, blk.sm_num)
+    elif args.equiv:
+        conv = equiv.FsmConverterEquiv(args, blk.sm_num, module)
+    elif args.pymodel:
+        conv = fsm_converter_py.FsmConverterPy(args, blk.sm_num, module)
+    elif args.behav:
+        conv = fsm_converter.FsmConverter(args, blk.sm_num)
+    else:
+        conv = fsm_converter_rtl.FsmConverterRTL(args, blk.sm_num)
+    if args.stats:
+        conv.stats = stats.BlockStats(blk)
+    profiler = cProfile.Profile() if args.profile else None
+    try:
+        with utils.collect_warnings() as warnings:
+            try:
+                if profiler:
+                    profiler.enable()
+                conv.extract_initial(blk.decl_in, blk.line_decl_base)
+                out = conv.process_block(
+                    blk.inp, "", blk.line_forever_base, args.file
+                )
+            finally:
+                if profiler:
+                    profiler.disable()
+                    os.makedirs(args.profile, exist_ok=True)
+                    profiler.dump_stats(
+                        os.path.join(args.profile, f"SM{blk.sm_num}.pstats")
+                    )
+    except utils.AlgoFsmError as e:
+        for msg in warnings:
+            utils.warning(msg)
+        if e.line is None:
+            e.file, e.line = args.file, blk.line_decl_base
+        raise
+    secs = time.perf_counter() - start
+    if conv.stats:
+        conv.stats.set("wall", secs)
+        conv.stats.set("cpu", time.thread_time() - cpu)
+        conv.stats.set("out_bytes", len(out))
+    return out, secs, conv.stats, warnings
+
+
+# --- convert args.file into args.out. Returns the cache used if any
+def parseInputFile(args):
+    if args.deps and args.out == "/dev/stdout":
+        utils.error("-deps needs an output file given with -out")
+    cache = block_cache.openCache(args)
+    run_stats = stats.RunStats(args) if args.stats else None
+    deps = []
+    with open(args.out, "w") as fout:
+        if args.jobs > 1 and not (
+            args.pymodel or args.equiv or args.latency
+        ):
+            parseInputFileParallel(args, fout, cache, run_stats, deps)
+        else:
+            items = scanInputFile(args, cache=cache, deps=deps)
+            convertItems(args, items, fout, cache, run_stats)
+    if args.deps:
+        writeDeps(args, deps or [args.file])
+    if cache and args.cache_stats:
+        cache.report()
+    if run_stats:
+        run_stats.write(args.stats)
+    return cache
+
+
+# --- make rule listing the files the output depends on, next to the output
+# --- with a .d extension. An empty rule per included file avoids make
+# --- errors once one is removed
+def writeDeps(args, deps):
+    def escape(path):
+        return path.replace(" ", "\\ ")
+
+    target = os.path.splitext(args.out)[0] + ".d"
+    with open(target, "w") as f:
+        print(f"{escape(args.out)}: {' '.join(map(escape, deps))}", file=f)
+        for dep in deps[1:]:
+            print(f"\n{escape(dep)}:", file=f)
+
+
+# --- output passthrough text as it is and SmBlock's converted
+def convertItems(args, items, fout, cache=None, run_stats=None):
+    if args.pymodel or args.equiv:
+        writeModels(args, items, fout, run_stats)
+        return
+    if args.latency:
+        writeLatency(args, items, fout, run_stats)
+        return
+    for item in items:
+        if isinstance(item, SmBlock):
+            print(convertCached(args, cache, item, run_stats), file=fout)
+        else:
+            print(item, end="", file=fout)
+
+
+# --- output a Python module with the models of the SmBlock's (-pymodel),
+# --- or the report of checking them (-equiv). Those need what the module
+# --- holding each block declares, so all the input is read first, and the
+# --- cache is not used
+def writeModels(args, items, fout, run_stats=None):
+    text = []
+    blocks = []
+    offset = 0
+    for item in items:
+        if isinstance(item, SmBlock):
+            blocks.append((offset, item))
+        else:
+            text.append(item)
+            offset += len(item)
+    modules = fsm_converter_py.scanModules("".join(text))
+    for offset, blk in blocks:
+        fsm_converter_py.addRegisters(args, blk, modules, offset)
+    if args.pymodel:
+        print(fsm_converter_py.header(args), end="", file=fout)
+    names = []
+    for offset, blk in blocks:
+        module = fsm_converter_py.findModule(modules, offset)
+        converted = convertBlock(args, blk, module)
+        reportBlock(args, blk, converted, run_stats)
+        print(converted[0], end="", file=fout)
+        names.append(fsm_converter_py.className(args, blk.sm_num))
+    if args.pymodel:
+        print(fsm_converter_py.footer(names), end="", file=fout)
+
+
+# --- output the -latency report of the SmBlock's, as a JSON document
+# --- holding the report of each block with -latency_format json
+def writeLatency(args, items, fout, run_stats=None):
+    reports = []
+    for item in items:
+        if isinstance(item, SmBlock):
+            converted = convertBlock(args, item)
+            reportBlock(args, item, converted, run_stats)
+            reports.append(converted[0])
+    if args.latency_format == "json":
+        blocks = [json.loads(report) for report in reports]
+        json.dump({"file": args.file, "blocks": blocks}, fout, indent=1)
+        print(file=fout)
+    else:
+        print("".join(reports), end="", file=fout)
+
+
+# --- Convert one SmBlock reusing a previous conversion if in the cache
+def convertCached(args, cache, blk, run_stats=None):
+    if cache is None:
+        converted = convertBlock(args, blk)
+        reportBlock(args, blk, converted, run_stats)
+        return converted[0]
+    key = cache.key(args, blk)
+    entry = cache.get(key)
+    if entry is None:
+        converted = convertBlock(args, blk)
+        reportBlock(args, blk, converted, run_stats)
+        out = converted[0]
+        cache.put(key, out, converted[3])
+    elif args.cache_verify:
+        converted = convertBlock(args, blk)
+        out = verifyCached(args, cache, key, blk, entry, converted, run_stats)
+    else:
+        out = reportCached(blk, entry, run_stats)
+    return out
+
+
+# --- compare a cache hit against a fresh conversion of the block
+def verifyCached(args, cache, key, blk, entry, converted, run_stats=None):
+    reportBlock(args, blk, converted, run_stats)
+    out, _, _, warnings = converted
+    if (out, warnings) != tuple(entry):
+        utils.warning(
+            f"SM{blk.sm_num} from line {blk.line_decl_base}: cached output "
+            f"differs from a fresh conversion, replacing entry {key}"
+        )
+        cache.mismatches += 1
+        cache.put(key, out, warnings)
+    return out
+
+
+# --- a cache hit shows the warnings its conversion gave. Returns its code
+def reportCached(blk, entry, run_stats=None):
+    out, warnings = entry
+    for msg in warnings:
+        utils.warning(msg)
+    if run_stats:
+        run_stats.add_cached(blk, out)
+    return out
+
+
+# --- collect all the blocks first, convert them concurrently and output
+# --- them in their original order. The passthrough text is not kept, the
+# --- input is scanned a second time to output it (unless it is a pipe)
+def parseInputFileParallel(args, fout, cache, run_stats=None, deps=None):
+    # the input is scanned twice unless it has to be read (or
+    # preprocessed) once anyway
+    if os.path.isfile(args.file) and not args.prep:
+        items = None
+        blocks = list(scanInputFile(args, passthrough=False))
+    else:
+        items = list(scanInputFile(args, cache=cache, deps=deps))
+        blocks = [item for item in items if isinstance(item, SmBlock)]
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {}
+        cached = {}
+        for blk in blocks:
+            if cache:
+                key = cache.key(args, blk)
+                entry = cache.get(key)
+                cached[blk.sm_num] = (key, entry)
+                if entry is not None and not args.cache_verify:
+                    continue
+            futures[blk.sm_num] = pool.submit(convertBlock, args, blk)
+
+        if items is None:
+            items = scanInputFile(args)
+        for item in items:
+            if not isinstance(item, SmBlock):
+                print(item, end="", file=fout)
+                continue
+            key, entry = cached.get(item.sm_num, (None, None))
+            future = futures.get(item.sm_num)
+            if entry is not None and future:
+                converted = future.result()
+                out = verifyCached(
+                    args, cache, key, item, entry, converted, run_stats
+                )
+            elif entry is None:
+                converted = future.result()
+                reportBlock(args, item, converted, run_stats)
+                out = converted[0]
+                if cache:
+                    cache.put(key, out, converted[3])
+            else:
+                out = reportCached(item, entry, run_stats)
+            print(out, file=fout)
+
+
+def reportBlock(args, blk, converted, run_stats=None):
+    _, secs, blk_stats, warnings = converted
+    for msg in warnings:
+        utils.warning(msg)
+    if run_stats:
+        run_stats.add(blk_stats)
+    if args.dbg > 0:
+        utils.debug(
+            f"SM{blk.sm_num} from line {blk.line_decl_base} "
+            f"converted in {secs:.3f}s"
+        )
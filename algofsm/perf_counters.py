@@ -0,0 +1,154 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Performance counters of the FSM of a SM block (-perfcounters)
+#
+# A saturating counter per state counts the clock cycles spent in it and,
+# with -perfcounters_transitions, one per transition the times it is taken.
+# They are module level arrays indexed by state (transition) number, so
+# they can be read by hierarchical reference or wired to a port, cleared
+# on reset and counting only while the FSM is enabled. Everything is
+# written under `ifdef ALGOFSM_PERFCOUNTERS, so it is compiled out unless
+# defined. A comment maps each index to its states and the source lines of
+# their `tick, as does the summary written by the simulation only task
+# <name>N_perf_report
+# ------------------------------------------------------------------------------
+from . import state_encoding
+from . import utils
+
+DEFINE = "ALGOFSM_PERFCOUNTERS"
+
+
+# a Verilog string literal holding text
+def vlogString(text):
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class PerfCounters:
+    def __init__(self, conv, states, tick_lines):
+        args = conv.args
+        if args.perfcounters_width < 1:
+            utils.error("-perfcounters_width must be at least 1")
+        self.conv = conv
+        self.states = states  # tk nodes, in the order they are numbered
+        self.width = args.perfcounters_width
+        self.cycles = f"{conv.oname}_cycles"
+        self.trans = f"{conv.oname}_transitions"
+        self.index = f"{conv.oname}_i"
+        # a merged state stands for the `tick of all the states merged
+        self.lines = [
+            sorted({tick_lines[int(num)] for num in node.code.split("_")})
+            for node in states
+        ]
+        self.number = {node: i for i, node in enumerate(states)}
+        self.transitions = []  # (from, to) state numbers
+        self.taken = {}  # tk node: (transition number, to) of its state
+        if args.perfcounters_transitions:
+            for i, node in enumerate(states):
+                taken = self.taken[node] = []
+                for dst in state_encoding.transitions(node):
+                    taken.append((len(self.transitions), dst))
+                    self.transitions.append((i, self.number[dst]))
+
+    def _name(self, i):
+        return self.conv.state_name(self.states[i])
+
+    def _incr(self, counter):
+        sd = self.conv.args.sd
+        return f"if (~&{counter}) {counter} <= {sd}{counter} + 1;"
+
+    # module level declarations, with the map from index to source lines
+    def dump_decls(self, out, ind):
+        last = self.width - 1
+        out.dump()
+        out.dump(ind + f"`ifdef {DEFINE}")
+        out.dump(ind + f"// {self.width} bit performance counters, saturating")
+        out.dump(ind + f"// {self.cycles}[i]: cycles spent in state i")
+        for i, lines in enumerate(self.lines):
+            where = utils.lines_text(lines)
+            out.dump(ind + f"//   {i} {self._name(i)}: tick at {where}")
+        out.dump(
+            ind + f"reg [{last}:0] {self.cycles} [0:{len(self.states) - 1}];"
+        )
+        if self.transitions:
+            out.dump(ind + f"// {self.trans}[i]: times transition i is taken")
+            for t, (i, j) in enumerate(self.transitions):
+                out.dump(ind + f"//   {t} {self._name(i)} -> {self._name(j)}")
+            out.dump(
+                ind + f"reg [{last}:0] {self.trans} "
+                f"[0:{len(self.transitions) - 1}];"
+            )
+        out.dump(ind + f"integer {self.index};")
+        out.dump(ind + "`endif")
+
+    # clear the counters in the reset branch of the always block
+    def dump_reset(self, out, ind):
+        sd = self.conv.args.sd
+        i = self.index
+        out.dump(ind + f"`ifdef {DEFINE}")
+        for name, count in (
+            (self.cycles, len(self.states)),
+            (self.trans, len(self.transitions)),
+        ):
+            if count:
+                out.dump(ind + f"for ({i} = 0; {i} < {count}; {i} = {i} + 1)")
+                out.dump(ind + self.conv.args.tab + f"{name}[{i}] <= {sd}0;")
+        out.dump(ind + "`endif")
+
+    # count the cycle in the state of node and the transition it takes,
+    # once the code of the state has set the next state
+    def dump_count(self, w, node):
+        w.line(f"`ifdef {DEFINE}")
+        w.line(self._incr(f"{self.cycles}[{self.number[node]}]"))
+        taken = self.taken.get(node, [])
+        if len(taken) == 1:
+            w.line(self._incr(f"{self.trans}[{taken[0][0]}]"))
+        elif taken:
+            encoding = self.conv.encoding
+            state = self.conv.ostate
+            w.line(f"case ({encoding.case_expr(state)})")
+            w.indent()
+            for t, dst in taken:
+                item = encoding.case_item(self.conv.state_name(dst), state)
+                w.line(f"{item}: {self._incr(f'{self.trans}[{t}]')}")
+            w.dedent()
+            w.line("endcase")
+        w.line("`endif")
+
+    # task displaying the counters, e.g. called by a testbench as
+    # dut.algofsm0_perf_report at the end of the simulation
+    def dump_report(self, out, ind, file_base, line_base):
+        tab = self.conv.args.tab
+        sm = self.conv.sm_num
+        out.dump()
+        out.dump(ind + f"`ifdef {DEFINE}")
+        out.dump(ind + "`ifndef SYNTHESIS")
+        out.dump(ind + f"task {self.conv.oname}_perf_report;")
+        out.dump(ind + tab + "begin")
+        ind2 = ind + 2 * tab
+        where = f"{file_base}:{line_base}".replace("%", "%%")
+        title = f"AlgoFSM{sm} {where} cycles spent in each state"
+        out.dump(ind2 + f"$display({vlogString(title)});")
+        for i, lines in enumerate(self.lines):
+            where = utils.lines_text(lines)
+            text = f"    {self._name(i)} (tick at {where}): %0d"
+            out.dump(
+                ind2 + f"$display({vlogString(text)}, {self.cycles}[{i}]);"
+            )
+        if self.transitions:
+            title = f"AlgoFSM{sm} times each transition is taken"
+            out.dump(ind2 + f"$display({vlogString(title)});")
+            for t, (i, j) in enumerate(self.transitions):
+                text = f"    {self._name(i)} -> {self._name(j)}: %0d"
+                out.dump(
+                    ind2 + f"$display({vlogString(text)}, {self.trans}[{t}]);"
+                )
+        out.dump(ind + tab + "end")
+        out.dump(ind + "endtask")
+        out.dump(ind + "`endif")
+        out.dump(ind + "`endif")
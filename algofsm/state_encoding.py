@@ -0,0 +1,204 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Encoding of the state register of the generated FSM (-encoding)
+#
+# - binary: state i is i, in as few bits as possible
+# - onehot: a bit per state, decoded testing that bit (case (1'b1))
+# - gray: the states are numbered in the order a depth first walk of the
+#   transitions from the initial state reaches them and given the gray code
+#   of that number, so a transition to the first state reached from another
+#   changes a single bit
+# - johnson: same order, with the codes of a twisted ring counter of half
+#   as many bits as states
+# - auto: binary for a few states, gray for up to GRAY_MAX mostly sequential
+#   ones, one-hot for up to ONEHOT_MAX and gray beyond that
+# - profile: binary width codes assigned from the number of times each
+#   transition was taken in a simulation (-state_profile) so that the state
+#   register toggles as little as possible
+# ------------------------------------------------------------------------------
+from .state_region import region_succs
+
+ENCODINGS = ("binary", "onehot", "gray", "johnson", "auto")
+BINARY_MAX = 4  # states below which auto keeps binary
+GRAY_MAX = 16  # sequential states auto encodes as gray
+ONEHOT_MAX = 64  # states auto encodes as one-hot
+SEQUENTIAL_FANOUT = 1.5  # average fan-out of a mostly sequential FSM
+PROFILE_PASSES = 100  # bound of the improvement passes of profileCodes
+
+
+# states the code of a state goes to
+def transitions(state_node):
+    targets = []
+    seen = set()
+    todo = [state_node.succ()]
+    while todo:
+        node = todo.pop()
+        if node is None or node.uid in seen:
+            continue
+        seen.add(node.uid)
+        if node.typ == "tk":
+            targets.append(node)
+        else:
+            todo += reversed(region_succs(node))
+    return targets
+
+
+# average number of other states each state goes to
+def fanout(succs):
+    if not succs:
+        return 0
+    return sum(len(s) for s in succs.values()) / len(succs)
+
+
+# positions of the states in the order a depth first walk from init reaches
+# them, the unreachable ones last
+def walkOrder(states, init, succs):
+    order = []
+    seen = set()
+    todo = [init]
+    while todo:
+        node = todo.pop()
+        if node in seen:
+            continue
+        seen.add(node)
+        order.append(node)
+        todo += reversed(succs[node])
+    order += [node for node in states if node not in seen]
+    return {node: i for i, node in enumerate(order)}
+
+
+def grayCode(i):
+    return i ^ (i >> 1)
+
+
+def johnsonCode(i, width):
+    if i <= width:
+        return (1 << i) - 1
+    return ((1 << width) - 1) ^ ((1 << (i - width)) - 1)
+
+
+def autoEncoding(num_states, avg_fanout):
+    if num_states <= BINARY_MAX:
+        return "binary"
+    if num_states <= GRAY_MAX and avg_fanout < SEQUENTIAL_FANOUT:
+        return "gray"
+    if num_states <= ONEHOT_MAX:
+        return "onehot"
+    return "gray"
+
+
+# state register bits toggled taking each transition as many times as
+# given by weights {(from, to): count}, states as indexes into codes
+def toggles(codes, weights):
+    return sum(
+        n * bin(codes[a] ^ codes[b]).count("1")
+        for (a, b), n in weights.items()
+    )
+
+
+# codes of width bits for num_states states with the fewest toggles for the
+# given transition weights. Starting from the binary codes, a state is moved
+# to another code (swapping places with the state there if any) while that
+# lowers the toggles, so the result is never worse than binary
+def profileCodes(num_states, width, weights):
+    adj = [{} for _ in range(num_states)]
+    for (a, b), n in weights.items():
+        if a != b:
+            adj[a][b] = adj[a].get(b, 0) + n
+            adj[b][a] = adj[b].get(a, 0) + n
+    codes = list(range(num_states))
+    at = codes + [None] * ((1 << width) - num_states)  # state of each code
+
+    def cost(s, code):
+        return sum(
+            n * bin(code ^ codes[t]).count("1") for t, n in adj[s].items()
+        )
+
+    hot = sorted(
+        (s for s in range(num_states) if adj[s]),
+        key=lambda s: -sum(adj[s].values()),
+    )
+    for _ in range(PROFILE_PASSES):
+        improved = False
+        for s in hot:
+            for code in range(len(at)):
+                old = codes[s]
+                t = at[code]
+                if t == s:
+                    continue
+                delta = cost(s, code) - cost(s, old)
+                if t is not None:
+                    # the distance between s and t does not change
+                    n = adj[s].get(t, 0)
+                    dist = bin(code ^ old).count("1")
+                    delta += cost(t, old) - cost(t, code) + 2 * n * dist
+                if delta < 0:
+                    codes[s], at[code], at[old] = code, s, t
+                    if t is not None:
+                        codes[t] = old
+                    improved = True
+        if not improved:
+            break
+    return codes
+
+
+# --------------------------------------------------------------------
+# codes of the states (tk nodes, in the order they are numbered) and the
+# Verilog of the values, case items and case expression using them
+# --------------------------------------------------------------------
+class StateEncoding:
+    def __init__(self, kind, states, init, profile=None):
+        succs = {}
+        self.toggles = None  # binary and profile toggles with a profile
+        if kind != "binary":
+            for node in states:
+                succs[node] = [n for n in transitions(node) if n is not node]
+        if kind == "auto":
+            kind = autoEncoding(len(states), fanout(succs))
+        self.kind = kind
+        n = len(states)
+        if kind == "onehot":
+            self.width = n
+            self.codes = [1 << i for i in range(n)]
+        elif kind == "johnson":
+            self.width = max(1, (n + 1) // 2)
+            pos = walkOrder(states, init, succs)
+            self.codes = [johnsonCode(pos[s], self.width) for s in states]
+        else:
+            self.width = max(1, (n - 1).bit_length())
+            if kind == "gray":
+                pos = walkOrder(states, init, succs)
+                self.codes = [grayCode(pos[s]) for s in states]
+            else:
+                self.codes = list(range(n))
+            if kind == "binary" and profile:
+                self.kind = "profile"
+                self.codes = profileCodes(n, self.width, profile)
+                self.toggles = (
+                    toggles(list(range(n)), profile),
+                    toggles(self.codes, profile),
+                )
+
+    def param(self, i):
+        """value of the localparam of state i, its bit for one-hot"""
+        if self.kind == "binary" or self.kind == "onehot":
+            return str(i)
+        return f"{self.width}'b{self.codes[i]:0{self.width}b}"
+
+    def value(self, name):
+        """value of the state register for the state of a localparam"""
+        if self.kind == "onehot":
+            return f"{self.width}'d1 << {name}"
+        return name
+
+    def case_expr(self, state):
+        return "1'b1" if self.kind == "onehot" else state
+
+    def case_item(self, name, state):
+        return f"{state}[{name}]" if self.kind == "onehot" else name
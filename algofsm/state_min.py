@@ -0,0 +1,209 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# State minimization of the FSM DAG
+#
+# The code of each state (the sub-DAG hanging from a tk node) is summarized by
+# a structural signature: an interned integer that mirrors what
+# FsmConverterRTL.dump_subdag_sm would emit, so two states get the same
+# signature when they would generate the same code. Sub-DAGs are hash-consed,
+# hence computing a signature costs the size of the sub-DAG, not of the
+# (potentially much bigger) generated text.
+# ------------------------------------------------------------------------------
+import heapq
+from . import utils
+
+EMPTY = 0  # signature of an empty sequence of statements
+STAY = ("stay",)
+
+
+class Interner:
+    def __init__(self):
+        self.ids = {(): EMPTY}
+
+    def get(self, key):
+        sid = self.ids.get(key)
+        if sid is None:
+            sid = self.ids[key] = len(self.ids)
+        return sid
+
+
+class LoopFound(Exception):
+    pass
+
+
+# --------------------------------------------------------------------
+# walk a sub-DAG building its signature. leaf(node) gives the item
+# emitted for a tk node reached
+# --------------------------------------------------------------------
+class Signer:
+    def __init__(self, interner, leaf):
+        self.interner = interner
+        self.leaf = leaf
+        self.memo = {}
+        self.in_progress = set()
+
+    def cons(self, item, rest):
+        return self.interner.get(("seq", self.interner.get(item), rest))
+
+    def if_else(self, cond, true_sig, false_sig):
+        # dump_subdag_sm reverses the condition when the true block only
+        # stays in the state
+        stay_only = self.cons(STAY, EMPTY)
+        if false_sig is not None and true_sig == stay_only:
+            return ("if", utils.negate(cond), false_sig, None)
+        return ("if", cond, true_sig, false_sig)
+
+    def walk(self, node, k=EMPTY):
+        """signature of walking from node followed by continuation k"""
+        # sequences are followed iteratively, nesting recursively
+        chain = []
+        tail = None
+        while node is not None:
+            key = (node.uid, k)
+            tail = self.memo.get(key)
+            if tail is not None:
+                break
+            if node.uid in self.in_progress:
+                raise LoopFound()
+            self.in_progress.add(node.uid)
+            item, node, tail = self.step(node, k)
+            chain.append((key, item))
+            if tail is not None:
+                break
+        if tail is None:
+            tail = k
+        for key, item in reversed(chain):
+            if item is not None:
+                tail = self.cons(item, tail)
+            self.memo[key] = tail
+            self.in_progress.discard(key[0])
+        return tail
+
+    # return (item, next node to follow, tail) for one node, tail is
+    # not None when the walk ends at this node
+    def step(self, node, k):
+        nx, ch1, ch2 = node.nxt, node.child[1], node.child[2]
+        cond = node.code
+        walk = self.walk
+        if node.typ == "eif":
+            if utils.is_one(cond):
+                return None, None, walk(ch1, k)
+            n = ch2 if ch2 else nx
+            if utils.is_zero(cond):
+                return None, None, walk(n, k) if n else k
+            false_sig = walk(n) if n else None
+            item = self.if_else(cond, walk(ch1), false_sig)
+            return None, None, self.cons(item, k)
+        elif node.typ == "if":
+            if utils.is_one(cond):
+                return None, None, walk(ch1, walk(nx, k))
+            if utils.is_zero(cond):
+                return None, None, walk(ch2, walk(nx, k))
+            false_sig = walk(ch2) if ch2 else None
+            return self.if_else(cond, walk(ch1), false_sig), nx, None
+        elif node.typ in ("fo", "wh", "cs", "csb"):
+            return (node.typ, cond, walk(ch1)), nx, None
+        elif node.typ in ("sn", "cm"):
+            return (node.typ, cond), node.succ(), None
+        elif node.typ == "tk":
+            return None, None, self.cons(self.leaf(node), k)
+        return ("ignored", node.uid, node.typ, cond), node.succ(), None
+
+
+# --------------------------------------------------------------------
+# Signatures of each state in "abs" (successors named) and "rel" (self
+# loops shown as a stay) modes, kept up to date as states get merged
+# --------------------------------------------------------------------
+class StateSignatures:
+    def __init__(self, states):
+        self.interner = Interner()
+        self.pos = {s: i for i, s in enumerate(states)}
+        self.sig = {"abs": {}, "rel": {}}
+        self.groups = {"abs": {}, "rel": {}}
+        self.heaps = {"abs": [], "rel": []}
+        self.targets = {}  # tk nodes reached from each state
+        self.reached_from = {s: set() for s in states}
+
+    def compute(self, state):
+        targets = set()
+
+        def leaf_abs(node):
+            targets.add(node)
+            return ("goto", node.uid)
+
+        def leaf_rel(node):
+            return STAY if node is state else ("goto", node.uid)
+
+        sig_abs = Signer(self.interner, leaf_abs).walk(state.succ())
+        sig_rel = Signer(self.interner, leaf_rel).walk(state.succ())
+        for t in targets:
+            self.reached_from[t].add(state)
+        self.targets[state] = targets
+        self._group_add("abs", state, sig_abs)
+        self._group_add("rel", state, sig_rel)
+
+    def forget(self, state):
+        for mode in ("abs", "rel"):
+            sig = self.sig[mode].pop(state)
+            group = self.groups[mode][sig]
+            group.remove(state)
+            if not group:
+                del self.groups[mode][sig]
+            elif len(group) > 1:
+                heapq.heappush(self.heaps[mode], (self.pos[group[0]], sig))
+        for t in self.targets.pop(state):
+            self.reached_from[t].discard(state)
+
+    def _group_add(self, mode, state, sig):
+        self.sig[mode][state] = sig
+        group = self.groups[mode].setdefault(sig, [])
+        group.append(state)
+        group.sort(key=self.pos.get)
+        if len(group) > 1:
+            heapq.heappush(self.heaps[mode], (self.pos[group[0]], sig))
+
+    def first_dup(self, mode):
+        """group of states with identical code whose first state is the
+        earliest one, as a scan of the states in order would find"""
+        heap = self.heaps[mode]
+        groups = self.groups[mode]
+        while heap:
+            first_pos, sig = heap[0]
+            group = groups.get(sig)
+            if group and len(group) > 1 and self.pos[group[0]] == first_pos:
+                return list(group)
+            heapq.heappop(heap)
+        return None
+
+
+# --------------------------------------------------------------------
+# Moore partition refinement: states are equivalent when their code has
+# the same structure and the successors reached at each point are
+# equivalent. Returns the classes with more than one state
+# --------------------------------------------------------------------
+def equivalent_states(states):
+    interner = Interner()
+    cls = {s: 0 for s in states}
+    num_cls = 1
+    while True:
+        signer = Signer(interner, lambda node: ("goto", cls[node]))
+        new_ids = {}
+        new_cls = {}
+        for s in states:
+            key = (cls[s], signer.walk(s.succ()))
+            new_cls[s] = new_ids.setdefault(key, len(new_ids))
+        cls = new_cls
+        if len(new_ids) == num_cls:
+            break
+        num_cls = len(new_ids)
+
+    members = {}
+    for s in states:
+        members.setdefault(cls[s], []).append(s)
+    return [group for group in members.values() if len(group) > 1]
@@ -0,0 +1,129 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Transitions taken by the FSMs in a simulation, read from its VCD dump
+# (-state_profile) to assign state codes toggling the state register as
+# little as possible. The dump is read as a stream, only the last value of
+# each state register is kept, so its size does not matter
+# ------------------------------------------------------------------------------
+import re
+from . import utils
+
+# declaration sections skipped up to their $end
+SKIPPED = ("$comment", "$date", "$version", "$timescale")
+# the value changes are read in slices of whole lines of about this size
+CHUNK_SIZE = 1 << 20
+
+
+def tokens(f):
+    for line in f:
+        yield from line.split()
+
+
+# value of a VCD value change, None if it has x or z bits or is real
+def vcdValue(bits, kind="b"):
+    if kind not in "bB":
+        return None
+    try:
+        return int(bits, 2)
+    except ValueError:
+        return None
+
+
+# --------------------------------------------------------------------
+# number of times each transition of each FSM is taken in the VCD file
+# path, as {sm_num: {(from, to): count}} with the states as the values of
+# the state register. An FSM is found as the register state<N>suffix of a
+# scope name<N> (the always block of FSM N), the instances of a module
+# holding it add up. A VCD has a value change per variable and time step
+# at most, so each change of a state register is a transition
+# --------------------------------------------------------------------
+def readVcd(path, name, state, suffix):
+    scope_re = re.compile(re.escape(name) + r"(\d+)")
+    ids = {}  # id code of each state register: its FSM number
+    with open(path) as f:
+        it = tokens(f)
+        scopes = []
+        for tok in it:
+            if tok == "$scope":
+                next(it)
+                scopes.append(next(it))
+            elif tok == "$upscope":
+                scopes.pop()
+            elif tok == "$var":
+                _, _, code, var = next(it), next(it), next(it), next(it)
+                m = scope_re.fullmatch(scopes[-1]) if scopes else None
+                if m and var == f"{state}{m[1]}{suffix}":
+                    ids[code] = int(m[1])
+            elif tok in SKIPPED:
+                while next(it) != "$end":
+                    pass
+            elif tok == "$enddefinitions":
+                break
+
+        counts = {sm_num: {} for sm_num in ids.values()}
+        if not ids:
+            return counts
+        # the value changes of a register are found as its id code ending a
+        # line, as simulators write them. Each register is looked for on
+        # its own, which is much faster than all at once
+        ends = {code: re.compile(re.escape(code) + r"\r?\n") for code in ids}
+        last = {}  # value of each register
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            chunk += f.readline() + "\n"
+            for code, end_re in ends.items():
+                trans = counts[ids[code]]
+                for m in end_re.finditer(chunk):
+                    pos = m.start()
+                    head = chunk[chunk.rfind("\n", 0, pos) + 1 : pos]
+                    toks = head.split()
+                    if not toks:
+                        continue
+                    if head[-1] in " \t" and toks[-1][0] in "bBrR":
+                        val = vcdValue(toks[-1][1:], toks[-1][0])
+                    elif len(toks[-1]) == 1 and toks[-1] in "01xXzZ":
+                        val = vcdValue(toks[-1])
+                    else:
+                        continue  # the end of another id code
+                    prev = last.get(code)
+                    if prev is not None and val is not None and val != prev:
+                        trans[prev, val] = trans.get((prev, val), 0) + 1
+                    last[code] = val
+    return counts
+
+
+# read the profile given with -state_profile if any into
+# args.state_transitions
+def loadProfile(args):
+    if not args.state_profile:
+        return
+    if args.encoding != "binary":
+        utils.error(
+            f"-state_profile can't be combined with -encoding {args.encoding}"
+        )
+    try:
+        counts = readVcd(
+            args.state_profile, args.name, args.state, args.state_suffix
+        )
+    except OSError as e:
+        utils.error(
+            f"-state_profile: can't read {args.state_profile}: {e.strerror}"
+        )
+    except (StopIteration, IndexError):
+        utils.error(
+            f"-state_profile: {args.state_profile} is not a valid VCD file"
+        )
+    if not counts:
+        utils.warning(
+            f"-state_profile: no FSM state register found in "
+            f"{args.state_profile}"
+        )
+    args.state_transitions = counts
@@ -0,0 +1,189 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Reconvergence analysis of the code of a state, used by the factorized
+# emission of FsmConverterRTL.dump_subdag_sm
+#
+# The region of a state are the nodes reachable from its tk node without
+# crossing another tk. Nodes reached from several places in the region
+# (joins) would be emitted once per path reaching them, which grows
+# exponentially with chains of if/else. Instead:
+#
+# - if all paths from an eif go through a join J and all paths to J go
+#   through the eif, the if/else is closed before J and J follows it
+#   sequentially
+# - any other join gets a flag that the paths reaching it set. Its code is
+#   emitted once, guarded by the flag, at the end of the innermost such
+#   if/else containing it (or of the state)
+# ------------------------------------------------------------------------------
+from . import utils
+
+EXIT = None  # the region is left through a tk or the end of the code
+
+
+# successors of a node as emitted, EXIT for paths leaving the region
+def region_succs(node):
+    nx, ch1, ch2 = node.nxt, node.child[1], node.child[2]
+    if node.typ == "eif":
+        n = ch2 if ch2 else nx
+        if utils.is_one(node.code):
+            return [ch1]
+        if utils.is_zero(node.code):
+            return [n]
+        return [ch1, n]
+    if node.typ == "tk":
+        return [EXIT]
+    if node.typ in ("if", "fo", "wh", "cs", "csb"):
+        return [nx]
+    return [node.succ()]
+
+
+# nodes of the region entered at entry in topological order, the number of
+# edges reaching each of them (tk nodes included) and whether the region has
+# a loop, in which case the order is left empty
+def sort_region(entry):
+    # iterative DFS, as chains can be long
+    GREY, BLACK = 1, 2
+    color = {}
+    preds = {entry.uid: 0}
+    post = []
+    stack = [(entry, iter(region_succs(entry)))]
+    color[entry.uid] = GREY
+    while stack:
+        node, succs = stack[-1]
+        for s in succs:
+            if s is EXIT:
+                continue
+            preds[s.uid] = preds.get(s.uid, 0) + 1
+            if s.typ == "tk":
+                continue
+            c = color.get(s.uid)
+            if c == GREY:
+                return [], preds, True
+            if c is None:
+                color[s.uid] = GREY
+                stack.append((s, iter(region_succs(s))))
+                break
+        else:
+            stack.pop()
+            color[node.uid] = BLACK
+            post.append(node)
+    # tk nodes are leaves, they are only reached (never followed)
+    return list(reversed(post)), preds, False
+
+
+class StateRegion:
+    def __init__(self, entry):
+        self.entry = entry
+        self.order = []  # nodes in topological order
+        self.rank = {}  # uid -> position in order
+        self.preds = {}  # uid -> number of edges reaching it
+        self.loop = False
+        self._sort()
+        if self.loop:
+            return
+        self.idom = self._dominators()
+        self.ipdom = self._post_dominators()
+        # eif uid -> join node following it sequentially
+        self.join = {}
+        for node in self.order:
+            if node.typ == "eif" and len(region_succs(node)) == 2:
+                j = self.ipdom[node.uid]
+                if j is not EXIT and self._dominates(node, j):
+                    self.join[node.uid] = j
+        seq_joins = {j.uid for j in self.join.values()}
+        # uid -> flag number, and flagged nodes by owner eif uid (None for
+        # the state itself) in topological order
+        self.flag = {}
+        self.owned = {}
+        for node in self.order:
+            if (
+                self.preds[node.uid] > 1
+                and node.typ != "tk"
+                and node.uid not in seq_joins
+            ):
+                self.flag[node.uid] = len(self.flag)
+                owner = self._owner(node)
+                self.owned.setdefault(owner, []).append(node)
+
+    def _sort(self):
+        self.order, self.preds, self.loop = sort_region(self.entry)
+        self.rank = {node.uid: i for i, node in enumerate(self.order)}
+
+    # successors within the region, reaching a tk leaves it
+    def _succs(self, node):
+        return [
+            s if s is not EXIT and s.uid in self.rank else EXIT
+            for s in region_succs(node)
+        ]
+
+    def _dominators(self):
+        idom = {self.entry.uid: self.entry}
+        preds = {}
+        for node in self.order:
+            for s in self._succs(node):
+                if s is not EXIT:
+                    preds.setdefault(s.uid, []).append(node)
+        for node in self.order[1:]:
+            d = None
+            for p in preds[node.uid]:
+                d = p if d is None else self._intersect(idom, d, p)
+            idom[node.uid] = d
+        return idom
+
+    def _intersect(self, idom, a, b):
+        rank = self.rank
+        while a is not b:
+            while rank[a.uid] > rank[b.uid]:
+                a = idom[a.uid]
+            while rank[b.uid] > rank[a.uid]:
+                b = idom[b.uid]
+        return a
+
+    def _post_dominators(self):
+        ipdom = {}
+        end = len(self.order)
+
+        def rank(n):
+            return end if n is EXIT else self.rank[n.uid]
+
+        for node in reversed(self.order):
+            succs = self._succs(node)
+            d = succs[0]
+            for s in succs[1:]:
+                a, b = d, s
+                while a is not b:
+                    while rank(a) < rank(b):
+                        a = ipdom[a.uid]
+                    while rank(b) < rank(a):
+                        b = ipdom[b.uid]
+                d = a
+            ipdom[node.uid] = d
+        return ipdom
+
+    def _dominates(self, a, b):
+        rank_a = self.rank[a.uid]
+        while self.rank[b.uid] > rank_a:
+            b = self.idom[b.uid]
+        return b is a
+
+    def _post_dominates(self, a, b):
+        rank_a = self.rank[a.uid]
+        while b is not EXIT and self.rank[b.uid] < rank_a:
+            b = self.ipdom[b.uid]
+        return b is a
+
+    # innermost eif with a sequential join whose if/else contains node
+    def _owner(self, node):
+        a = node
+        while a is not self.entry:
+            a = self.idom[a.uid]
+            j = self.join.get(a.uid)
+            if j is not None and self._post_dominates(j, node):
+                return a.uid
+        return None
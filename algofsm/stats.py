@@ -0,0 +1,80 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Statistics of a conversion (-stats). Converters only measure when given a
+# BlockStats, otherwise the passes run as they are
+# ------------------------------------------------------------------------------
+import json
+import time
+
+
+def node_counts(nodes):
+    removed = sum(1 for n in nodes if n.typ.startswith("rm"))
+    return {"live": len(nodes) - removed, "rm": removed}
+
+
+# --------------------------------------------------------------------
+# measures of the conversion of one SM block
+# --------------------------------------------------------------------
+class BlockStats:
+    def __init__(self, blk):
+        self.data = {
+            "sm": blk.sm_num,
+            "line": blk.line_decl_base,
+            "cached": False,
+            "passes": [],
+        }
+
+    def set(self, name, val):
+        self.data[name] = val
+
+    def run_pass(self, name, parser, fn, *args):
+        """run fn(*args) as pass name, parser holds the nodes to count"""
+        before = node_counts(parser.nodes)
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        ret = fn(*args)
+        self.data["passes"].append(
+            {
+                "name": name,
+                "wall": time.perf_counter() - wall,
+                "cpu": time.thread_time() - cpu,
+                "nodes_before": before,
+                "nodes_after": node_counts(parser.nodes),
+            }
+        )
+        return ret
+
+
+# --------------------------------------------------------------------
+# measures of all the blocks of an input file
+# --------------------------------------------------------------------
+class RunStats:
+    def __init__(self, args):
+        self.file = args.file
+        self.start = time.perf_counter()
+        self.blocks = []
+
+    def add(self, blk_stats):
+        self.blocks.append(blk_stats.data)
+
+    def add_cached(self, blk, out):
+        blk_stats = BlockStats(blk)
+        blk_stats.set("cached", True)
+        blk_stats.set("out_bytes", len(out))
+        self.add(blk_stats)
+
+    def write(self, path):
+        data = {
+            "file": self.file,
+            "wall": time.perf_counter() - self.start,
+            "blocks": sorted(self.blocks, key=lambda b: b["sm"]),
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, indent=1)
+            print(file=f)
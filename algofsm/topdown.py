@@ -7,35 +7,142 @@
 # ------------------------------------------------------------------------------
 import re
 import sys
+import traceback
+from .utils import AlgoFsmError
 
 
 # ------------------------------------------------------------------------------
-# Handles parse tree nodes
+# Child links of a node. Assigning an entry keeps the reverse-edge index of
+# the nodes involved up to date
+# ------------------------------------------------------------------------------
+class ChildList(list):
+    __slots__ = ("owner",)
+
+    def __init__(self, owner, items):
+        super().__init__(items)
+        self.owner = owner
+        for i, c in enumerate(self):
+            if c is not None:
+                c.pred_add(owner, i)
+
+    def __setitem__(self, i, new):
+        old = self[i]
+        if old is not None:
+            old.pred_rm(self.owner, i)
+        super().__setitem__(i, new)
+        if new is not None:
+            new.pred_add(self.owner, i)
+        if i != 0:
+            self.owner.tick_invalidate()
+
+    def unlink_all(self):
+        for i, c in enumerate(self):
+            if c is not None:
+                c.pred_rm(self.owner, i)
+
+
+# ------------------------------------------------------------------------------
+# Handles parse tree nodes. Bodies can have a large number of them, so they
+# have no per instance __dict__ and share their typ strings
 # ------------------------------------------------------------------------------
 class Node:
-    cnt = 0
+    __slots__ = (
+        "preds",
+        "tick_in",
+        "tick_in_lst",
+        "_nxt",
+        "_child",
+        "_typ",
+        "code",
+        "visited",
+        "clone_id",
+        "uid",
+    )
     tab = "\t"
 
-    def __init__(self, typ, code="", nxt=None, child=None, clone_id=None):
+    def __init__(self, typ, uid, code="", nxt=None, child=None, clone_id=None):
         child = child or []
+        # reverse-edge index: (node, link) pairs pointing to this one, where
+        # link is the child index or "nx"
+        self.preds = {}
+        # whether this node (tick_in) or the list starting at it following
+        # nxt (tick_in_lst) contains a tick. None when not known
+        self.tick_in = None
+        self.tick_in_lst = None
+        self._nxt = None
+        self._child = ChildList(self, [])
         self.typ = typ
         self.code = code
         self.nxt = nxt
         self.child = child[:]
         self.visited = False
-        self.clone_id = clone_id or Node.cnt
-        self.uid = Node.cnt
-        Node.cnt += 1
-
-    @classmethod
-    def reset(cls):
-        cls.cnt = 0
+        self.clone_id = clone_id or uid
+        self.uid = uid
+
+    @property
+    def typ(self):
+        return self._typ
+
+    @typ.setter
+    def typ(self, typ):
+        self._typ = sys.intern(typ)
+        self.tick_invalidate()
+
+    @property
+    def nxt(self):
+        return self._nxt
+
+    @nxt.setter
+    def nxt(self, new):
+        old = self._nxt
+        if old is new:
+            return
+        if old is not None:
+            old.pred_rm(self, "nx")
+        self._nxt = new
+        if new is not None:
+            new.pred_add(self, "nx")
+        self.tick_invalidate(lst_only=True)
+
+    @property
+    def child(self):
+        return self._child
+
+    @child.setter
+    def child(self, lst):
+        self._child.unlink_all()
+        self._child = ChildList(self, lst)
+        self.tick_invalidate()
+
+    # forget cached tick containment of this node and of anything whose
+    # value was derived from it
+    def tick_invalidate(self, lst_only=False):
+        if not lst_only:
+            self.tick_in = None
+        todo = [self]
+        while todo:
+            n = todo.pop()
+            if n.tick_in_lst is None:
+                continue
+            n.tick_in_lst = None
+            for pred, link in n.preds:
+                if link == "nx":
+                    todo.append(pred)
+                elif link != 0:
+                    pred.tick_in = None
+                    todo.append(pred)
+
+    def pred_add(self, node, link):
+        self.preds[(node, link)] = True
+
+    def pred_rm(self, node, link):
+        del self.preds[(node, link)]
 
     def __str__(self):
         return f"id{self.uid}"
 
-    def clone(self):
-        return Node(self.typ, self.code, self.nxt, self.child, self.uid)
+    def clone(self, uid):
+        return Node(self.typ, uid, self.code, self.nxt, self.child, self.uid)
 
     def to_str(self):
         out = Node.tab + f"{self} typ: {repr(self.typ)}" + "\n"
@@ -71,11 +178,40 @@ class Token:
         self.is_pat = is_pat
         self.pat = pat if is_pat else "(" + pat + ")"
         self.is_skip = is_skip
-        self.loc_beg = ""
-        self.loc_end = ""
 
     def __str__(self):
-        return f"Token(pat={repr(self.pat)}, {self.loc_beg}, {self.loc_end})"
+        return f"Token(pat={repr(self.pat)})"
+
+
+# ------------------------------------------------------------------------------
+# Single regex matching any of the tokens of a token Enum
+# ------------------------------------------------------------------------------
+class Lexer:
+    cache = {}
+
+    def __init__(self, tokens):
+        # each token pattern becomes an alternative wrapped in a group named
+        # after the token. Alternatives are tried in declaration order, so
+        # the first one matching wins as it would when trying them in turn.
+        # group_of gives, per token, the index of the group holding the
+        # text to consume (the first group within the token pattern)
+        alts = []
+        self.group_of = {}
+        group = 1
+        for token_i in tokens:
+            pat = token_i.value.pat
+            alts.append(f"(?P<{token_i.name}>{pat})")
+            self.group_of[token_i.name] = group + 1
+            group += 1 + re.compile(pat).groups
+        self.pattern = re.compile("|".join(alts), re.S)
+
+    @classmethod
+    def get(cls, tokens):
+        """compile the lexer of a token Enum only once"""
+        lexer = cls.cache.get(tokens)
+        if lexer is None:
+            lexer = cls.cache[tokens] = Lexer(tokens)
+        return lexer
 
 
 # ------------------------------------------------------------------------------
@@ -86,17 +222,22 @@ class TopDown:
         self.parse_in = ""
         self.parse_in_len = 0
         self.parse_last_token = None
+        self.parse_last_loc_beg = ""
+        self.parse_last_loc_end = ""
         self.parse_consumed = 0
         self.parse_token_text = ""
         self.tokens = None
+        self.lexer = None
         self.nodes = []
         self.stk = []
         self.line_base = line_base
         self.file_base = file_base
-        Node.reset()
+        self.check = False  # cross-check incremental data when set
+        self.node_cnt = 0  # uids are given per parser
 
     def set_tokens(self, tokens):
         self.tokens = tokens
+        self.lexer = Lexer.get(tokens)
 
     def set_input(self, parse_in):
         self.parse_in = parse_in
@@ -111,7 +252,7 @@ class TopDown:
         ln = len(child)
         for i in range(3 - ln):
             child.append(None)
-        new = Node(typ, code, nxt, child)
+        new = Node(typ, self.new_uid(), code, nxt, child)
         self.nodes.append(new)
         return new
 
@@ -119,20 +260,39 @@ class TopDown:
     def node_rm(self, node):
         node.typ = "rm" + node.typ
 
+    # forget the nodes flagged as removed so that they can be freed. Their
+    # links are dropped first, as otherwise the nodes they point to would
+    # keep them in their predecessor index. Returns how many were dropped
+    def compact(self):
+        removed = [n for n in self.nodes if n.typ.startswith("rm")]
+        if not removed:
+            return 0
+        for n in removed:
+            n.nxt = None
+            n.child = []
+        if self.check:
+            for n in removed:
+                assert not n.preds, f"removed node {n} is still linked"
+        self.nodes = [n for n in self.nodes if not n.typ.startswith("rm")]
+        return len(removed)
+
     def node_clone(self, n):
-        new = n.clone()
+        new = n.clone(self.new_uid())
         self.nodes.append(new)
         return new
 
+    def new_uid(self):
+        self.node_cnt += 1
+        return self.node_cnt - 1
+
     def change_links_to(self, new_node, org_node):
         assert org_node is not None
         # anything pointing to org_node should point now to new_node
-        for n in self.nodes:
-            if n.nxt == org_node:
+        for n, link in list(org_node.preds):
+            if link == "nx":
                 n.nxt = new_node
-            for i, c in enumerate(n.child):
-                if c == org_node:
-                    n.child[i] = new_node
+            else:
+                n.child[link] = new_node
 
     # pre-insert a node before ref_node
     def node_preinsert(self, new_node, ref_node):
@@ -154,6 +314,25 @@ class TopDown:
             n = n.nxt
         return n
 
+    # recompute the reverse-edge index from scratch and compare against the
+    # incrementally maintained one
+    def check_preds(self):
+        expected = {n: {} for n in self.nodes}
+        for n in self.nodes:
+            for i, c in enumerate(n.child):
+                if c is not None:
+                    expected.setdefault(c, {})[(n, i)] = True
+            if n.nxt is not None:
+                expected.setdefault(n.nxt, {})[(n, "nx")] = True
+        for n, preds in expected.items():
+            if preds != n.preds:
+                missing = [f"{m}.{k}" for m, k in preds.keys() - n.preds]
+                extra = [f"{m}.{k}" for m, k in n.preds.keys() - preds]
+                assert False, (
+                    f"predecessor index of {n} is inconsistent, "
+                    f"missing: {missing} extra: {extra}"
+                )
+
     def reset_visited(self):
         for n in self.nodes:
             n.visited = False
@@ -165,27 +344,26 @@ class TopDown:
         return self.parse_consumed == self.parse_in_len
 
     def get_token(self):
-        def consume_pattern(pat):
-            m = re.match(pat, self.parse_in[self.parse_consumed:], re.S)
-            if m:
-                self.parse_token_text = m.group(1)
-                self.parse_consumed += len(m.group(1))
-                return True
-            return False
-
+        pattern = self.lexer.pattern
         loc_beg = self.parse_consumed
         tok = None
         while tok is None:
             if self.eof():
                 tok = self.tokens.TK_EOF  # end
             else:
-                for token_i in list(self.tokens):
-                    if consume_pattern(token_i.value.pat):
-                        if not token_i.value.is_skip:
-                            tok = token_i
-                        break
-        tok.loc_beg = self.file_base + ":" + str(loc_beg)
-        tok.loc_end = self.file_base + ":" + str(self.parse_consumed - 1)
+                # first alternative that matches wins, which keeps the
+                # priority given by the order of the tokens declaration
+                m = pattern.match(self.parse_in, self.parse_consumed)
+                token_i = self.tokens[m.lastgroup]
+                text = m.group(self.lexer.group_of[m.lastgroup])
+                self.parse_token_text = text
+                self.parse_consumed += len(text)
+                if not token_i.value.is_skip:
+                    tok = token_i
+        self.parse_last_loc_beg = self.file_base + ":" + str(loc_beg)
+        self.parse_last_loc_end = (
+            self.file_base + ":" + str(self.parse_consumed - 1)
+        )
         self.parse_last_token = tok
 
     def parse_get_char(self):
@@ -279,34 +457,25 @@ class TopDown:
     def stk_top(self, depth=1):
         return self.stk[-depth]
 
-    # print an error with some contextual info on input text
+    # raise an error with some contextual info on input text
     # and stack trace of the code
     def error(self, msg):
         lines = self.parse_in[: self.parse_consumed].split("\n")
         nlines = len(lines)
-        print(
-            f"ERROR: {self.file_base}:{self.line_base+nlines}: {msg}\n",
-            file=sys.stderr,
-        )
+        line = self.line_base + nlines
+        details = ["\n"]
         # give few previous lines of context
         i = nlines - 4
         if i < 0:
             i = 0
         curr_line = self.parse_in[self.parse_consumed:].split("\n")[0]
-        for line in lines[i:]:
-            print(
-                "%4d: %s" % (self.line_base + i + 1, line),
-                file=sys.stderr,
-                end="",
-            )
+        for text in lines[i:]:
+            details.append("%4d: %s" % (self.line_base + i + 1, text))
             if i == nlines - 1:
-                print(" <-- %s" % curr_line, file=sys.stderr, end="")
-            print("", file=sys.stderr)
+                details.append(" <-- %s" % curr_line)
+            details.append("\n")
             i += 1
         la = self.token_ahead()
-        print(f"\nBut got {la}" + "\n", file=sys.stderr)
-
-        import traceback
-
-        traceback.print_stack()
-        sys.exit(1)
+        details.append(f"\nBut got {la}" + "\n\n")
+        details += traceback.format_stack()
+        raise AlgoFsmError(msg, self.file_base, line, "".join(details))
@@ -7,35 +7,134 @@
 # ------------------------------------------------------------------------------
 import re
 import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
 
 
 # --------------------------------------------------------------------
-# build up a text line by line
+# build up a text line by line. Pieces written are joined in blocks as they
+# accumulate to keep them compact
 # --------------------------------------------------------------------
 class Dumper:
+    BLOCK = 1024  # pieces joined together
+
     def __init__(self):
-        self.out = []
+        self.out = []  # joined blocks
+        self.pieces = []
+        self.lines = 0
 
     def dump(self, *args):
-        self.out.append(" ".join(args))
+        if self.lines:
+            self.write("\n")
+        self.lines += 1
+        self.write(" ".join(args))
 
     def dump_nonl(self, *args):
-        self.out[-1] += " ".join(args)
+        self.write(" ".join(args))
+
+    def write(self, txt):
+        self.pieces.append(txt)
+        if len(self.pieces) >= self.BLOCK:
+            self.out.append("".join(self.pieces))
+            self.pieces.clear()
 
     def val(self):
-        return "\n".join(self.out)
+        self.out += self.pieces
+        self.pieces.clear()
+        return "".join(self.out)
+
+
+# --------------------------------------------------------------------
+# write lines of code into a sink (e.g. a Dumper) indenting them by level
+# --------------------------------------------------------------------
+class CodeWriter:
+    def __init__(self, sink, tab, ind=""):
+        self.write = sink.write
+        self.tab = tab
+        self.inds = [ind]  # indentation of each level
+        self.ind = ind
+        self.level = 0
+        self.size = 0  # characters written
+
+    def indent(self):
+        self.level += 1
+        if self.level == len(self.inds):
+            self.inds.append(self.ind + self.tab)
+        self.ind = self.inds[self.level]
+
+    def dedent(self):
+        self.level -= 1
+        self.ind = self.inds[self.level]
+
+    def raw(self, txt):
+        txt = self.ind + txt
+        self.size += len(txt)
+        self.write(txt)
+
+    def line(self, txt):
+        txt = self.ind + txt + "\n"
+        self.size += len(txt)
+        self.write(txt)
 
 
 # --------------------------------------------------------------------
 # unified way to give errors etc
 # --------------------------------------------------------------------
-def error(*args):
-    print("ERROR:", *args, file=sys.stderr)
-    sys.exit(1)
+class AlgoFsmError(Exception):
+    """error converting a design. file and line locate its cause when
+    known, details holds additional context to show after the message"""
+
+    def __init__(self, msg, file=None, line=None, details=""):
+        super().__init__(msg)
+        self.msg = msg
+        self.file = file
+        self.line = line
+        self.details = details
+
+    def __reduce__(self):
+        return (type(self), (self.msg, self.file, self.line, self.details))
+
+    def report(self, f=None):
+        f = f or sys.stderr
+        where = ""
+        if self.file and self.line is not None:
+            where = f"{self.file}:{self.line}: "
+        elif self.file:
+            where = f"{self.file}: "
+        print("ERROR:", where + self.msg, file=f)
+        if self.details:
+            print(self.details, end="", file=f)
+
+
+def error(*args, file=None, line=None):
+    raise AlgoFsmError(" ".join(str(arg) for arg in args), file, line)
+
+
+# warnings go to the list installed by collect_warnings in the current
+# context (thread or asyncio task) if any, to stderr otherwise
+_warnings = ContextVar("algofsm_warnings", default=None)
+
+
+@contextmanager
+def collect_warnings():
+    collected = []
+    token = _warnings.set(collected)
+    try:
+        yield collected
+    finally:
+        _warnings.reset(token)
 
 
 def warning(*args):
-    print("WARNING:", *args, file=sys.stderr)
+    collected = _warnings.get()
+    if collected is None:
+        print("WARNING:", *args, file=sys.stderr)
+    else:
+        collected.append(" ".join(str(arg) for arg in args))
+
+
+def info(*args):
+    print("INFO:", *args, file=sys.stderr)
 
 
 def debug(*args):
@@ -156,3 +255,10 @@ def get_base(path):
 def indent(ind, txt):
     txt = txt.rstrip()
     return "\n".join(ind + line for line in txt.split("\n"))
+
+
+# "line 5" or "lines 5, 9" for a list of line numbers
+def lines_text(lines):
+    if len(lines) == 1:
+        return f"line {lines[0]}"
+    return "lines " + ", ".join(str(line) for line in lines)
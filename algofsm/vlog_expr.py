@@ -0,0 +1,589 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Translation of the Verilog expressions and statements found in AlgoFSM
+# blocks into Python, used by the cycle models of -pymodel. Values are
+# unsigned integers, each kept within the width of what holds it. Widths
+# follow the Verilog rules for context determined operands, and masking is
+# only done where bits beyond the width of the context can change a result
+# (comparisons, right shifts, selects, assignments...)
+# ------------------------------------------------------------------------------
+import keyword
+import re
+
+TOKEN = re.compile(
+    r"\s*(?:(?P<num>(?:\d[\d_]*\s*)?'[sS]?[bBoOdDhH]\s*[0-9a-fA-FxXzZ?_]+"
+    r"|\d[\d_]*)"
+    r"|(?P<id>[A-Za-z_$][\w$]*(?:\.[A-Za-z_][\w$]*)*)"
+    r"|(?P<op>===|!==|<<<|>>>|\+:|-:|<<|>>|<=|>=|==|!=|&&|\|\||~&|~\||~\^"
+    r"|\^~|\*\*|[-+*/%<>!~&|^?:()\[\]{},=]))"
+)
+BASES = {"b": 2, "o": 8, "d": 10, "h": 16}
+UNSIZED = 32  # width of unsized literals and of unknown names
+
+# binary operators by increasing precedence
+BINARY = [
+    ("||",),
+    ("&&",),
+    ("|",),
+    ("^", "^~", "~^"),
+    ("&",),
+    ("==", "!=", "===", "!=="),
+    ("<", "<=", ">", ">="),
+    ("<<", ">>", "<<<", ">>>"),
+    ("+", "-"),
+    ("*", "/", "%"),
+    ("**",),
+]
+PRECEDENCE = {op: i for i, ops in enumerate(BINARY) for op in ops}
+UNARY = ("+", "-", "!", "~", "&", "~&", "|", "~|", "^", "~^", "^~")
+RELATIONS = ("==", "!=", "===", "!==", "<", "<=", ">", ">=")
+PY_OPS = {"===": "==", "!==": "!=", "<<<": "<<", ">>>": ">>", "/": "//"}
+
+
+def mask(width):
+    return (1 << width) - 1
+
+
+def pyName(name):
+    """a Python identifier for a Verilog one"""
+    name = name.replace("$", "_S")
+    if keyword.iskeyword(name) or name in ("self", "inputs", "int"):
+        name += "_"
+    return name
+
+
+def tokenize(text, what):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = TOKEN.match(text, pos)
+        if m is None:
+            raise TranslateError(f"unexpected '{text[pos:].strip()}' {what}")
+        pos = m.end()
+        kind = m.lastgroup
+        tokens.append((kind, m.group(kind)))
+    return tokens
+
+
+def literal(text):
+    """value and width (None if unsized) of a Verilog number, x and z
+    digits taken as 0"""
+    text = re.sub(r"[\s_]", "", text)
+    if "'" not in text:
+        return int(text), None
+    size, rest = text.split("'")
+    rest = rest.lstrip("sS")
+    digits = re.sub(r"[xXzZ?]", "0", rest[1:])
+    value = int(digits, BASES[rest[0].lower()])
+    if size == "":
+        return value, None
+    width = int(size)
+    return value & mask(width), width
+
+
+class TranslateError(Exception):
+    pass
+
+
+# ------------------------------------------------------------------------------
+# parser of expressions into tuples: ("num", value, width), ("id", name),
+# ("un", op, a), ("bin", op, a, b), ("cond", c, a, b), ("sel", a, msb, lsb)
+# with lsb None for a bit select, ("cat", parts), ("rep", count, parts) and
+# ("call", name, args)
+# ------------------------------------------------------------------------------
+class ExprParser:
+    def __init__(self, text, what=""):
+        self.what = what or f"in '{text.strip()}'"
+        self.tokens = tokenize(text, self.what)
+        self.pos = 0
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos][1]
+        return None
+
+    def take(self):
+        if self.pos >= len(self.tokens):
+            raise TranslateError(f"unexpected end {self.what}")
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def expect(self, op):
+        kind, text = self.take()
+        if kind != "op" or text != op:
+            raise TranslateError(
+                f"expected '{op}', got '{text}' {self.what}"
+            )
+
+    def at_end(self):
+        return self.pos == len(self.tokens)
+
+    def end(self):
+        if not self.at_end():
+            raise TranslateError(f"unexpected '{self.peek()}' {self.what}")
+
+    def parse_all(self):
+        node = self.expr()
+        self.end()
+        return node
+
+    def items(self):
+        """comma separated expressions"""
+        nodes = [self.expr()]
+        while self.peek() == ",":
+            self.take()
+            nodes.append(self.expr())
+        self.end()
+        return nodes
+
+    def expr(self):
+        cond = self.binary(0)
+        if self.peek() == "?":
+            self.take()
+            a = self.expr()
+            self.expect(":")
+            b = self.expr()
+            return ("cond", cond, a, b)
+        return cond
+
+    def binary(self, level):
+        if level == len(BINARY):
+            return self.unary()
+        a = self.binary(level + 1)
+        while not self.at_end() and self.tokens[self.pos][0] == "op":
+            op = self.peek()
+            if PRECEDENCE.get(op) != level:
+                break
+            self.take()
+            b = self.binary(level + 1)
+            a = ("bin", op, a, b)
+        return a
+
+    def unary(self):
+        kind, text = self.tokens[self.pos] if not self.at_end() else ("", "")
+        if kind == "op" and text in UNARY:
+            self.take()
+            return ("un", text, self.unary())
+        return self.primary()
+
+    def primary(self):
+        kind, text = self.take()
+        if kind == "num":
+            return ("num",) + literal(text)
+        if kind == "id":
+            if self.peek() == "(":
+                return ("call", text, self.arguments())
+            node = ("id", text)
+            while self.peek() == "[":
+                node = self.select(node)
+            return node
+        if text == "(":
+            node = self.expr()
+            self.expect(")")
+            return node
+        if text == "{":
+            return self.concat()
+        raise TranslateError(f"unexpected '{text}' {self.what}")
+
+    def arguments(self):
+        self.expect("(")
+        args = []
+        if self.peek() == ")":
+            self.take()
+            return args
+        while True:
+            args.append(self.expr())
+            kind, text = self.take()
+            if text == ")":
+                return args
+            if text != ",":
+                raise TranslateError(f"unexpected '{text}' {self.what}")
+
+    def select(self, node):
+        self.expect("[")
+        msb = self.expr()
+        lsb = None
+        if self.peek() in ("+:", "-:"):
+            raise TranslateError(
+                f"indexed part selects not supported {self.what}"
+            )
+        if self.peek() == ":":
+            self.take()
+            lsb = self.expr()
+        self.expect("]")
+        return ("sel", node, msb, lsb)
+
+    def concat(self):
+        first = self.expr()
+        if self.peek() == "{":
+            self.take()
+            parts = self.concat()[1]
+            self.expect("}")
+            return ("rep", first, parts)
+        parts = [first]
+        while self.peek() == ",":
+            self.take()
+            parts.append(self.expr())
+        self.expect("}")
+        return ("cat", parts)
+
+
+# ------------------------------------------------------------------------------
+# code generation. names(name) gives the Python code reading a Verilog name
+# and its width, lvalues(name) the same for one assigned, consts the value
+# of the parameters
+# ------------------------------------------------------------------------------
+class Translator:
+    def __init__(self, names, consts=None, tasks=None, lvalues=None):
+        self.names = names
+        self.lvalues = lvalues or names  # same for the names assigned
+        self.consts = {} if consts is None else consts
+        self.tasks = tasks or {}  # name: Task, inlined where called
+        self.tmp = 0  # temporaries used by statements
+        self.hooks = []  # tasks called that are not inlined
+
+    # --- constant value of an expression (parameters, widths...)
+    def const(self, node, what=""):
+        if isinstance(node, str):
+            node = parse(node, what)
+        if node[0] == "num":
+            return node[1]
+        if node[0] == "id" and node[1] in self.consts:
+            return self.consts[node[1]]
+
+        def names(name):
+            raise TranslateError(f"'{name}' is not constant")
+
+        return eval(Translator(names, self.consts).clean(node))
+
+    def width(self, node):
+        """self determined width"""
+        typ = node[0]
+        if typ == "num":
+            return node[2] or UNSIZED
+        if typ == "id":
+            if node[1] in self.consts:
+                return UNSIZED
+            return self.names(node[1])[1]
+        if typ == "un":
+            if node[1] in ("+", "-", "~"):
+                return self.width(node[2])
+            return 1
+        if typ == "bin":
+            op = node[1]
+            if op in RELATIONS or op in ("&&", "||"):
+                return 1
+            if op in ("<<", ">>", "<<<", ">>>", "**"):
+                return self.width(node[2])
+            return max(self.width(node[2]), self.width(node[3]))
+        if typ == "cond":
+            return max(self.width(node[2]), self.width(node[3]))
+        if typ == "sel":
+            if node[3] is None:
+                return 1
+            return self.const(node[2]) - self.const(node[3]) + 1
+        if typ == "cat":
+            return sum(self.width(n) for n in node[1])
+        if typ == "rep":
+            return self.const(node[1]) * sum(self.width(n) for n in node[2])
+        return UNSIZED
+
+    def clean(self, node, width=None):
+        """code computing node with no bits beyond width (its own width if
+        not given, the width of the context otherwise)"""
+        w = max(width or 0, self.width(node))
+        code, bits = self.value(node, w)
+        if bits is None or bits > w:
+            return f"({code} & {mask(w):#x})"
+        return code
+
+    def truthy(self, node):
+        """code of a Python condition true when node is not zero"""
+        typ, op = node[0], node[1] if node[0] in ("un", "bin") else None
+        if typ == "bin" and op in RELATIONS:
+            w = max(self.width(node[2]), self.width(node[3]))
+            a, b = self.clean(node[2], w), self.clean(node[3], w)
+            return f"{a} {PY_OPS.get(op, op)} {b}"
+        if typ == "bin" and op in ("&&", "||"):
+            a, b = self.truthy(node[2]), self.truthy(node[3])
+            return self._logic(op, a, b)
+        if typ == "un" and op == "!":
+            return self._not(self.truthy(node[2]))
+        return self._nonzero(self.clean(node))
+
+    def value(self, node, w):
+        """code computing node in a context of w bits and the number of bits
+        its result can take, None when it could be negative. Results are
+        masked to the width of the context where more bits matter"""
+        typ = node[0]
+        if typ == "num":
+            return str(node[1]), node[1].bit_length()
+        if typ == "id":
+            if node[1] in self.consts:
+                value = self.consts[node[1]]
+                return str(value), value.bit_length()
+            code, width = self.names(node[1])
+            return code, width
+        if typ == "un":
+            return self._unary(node, w)
+        if typ == "bin":
+            return self._binary(node, w)
+        if typ == "cond":
+            a, ba = self.value(node[2], w)
+            b, bb = self.value(node[3], w)
+            bits = None if None in (ba, bb) else max(ba, bb)
+            return self._select(self.truthy(node[1]), a, b), bits
+        if typ == "sel":
+            base = self.clean(node[1])
+            if node[3] is None:
+                index = self.clean(node[2])
+                return f"(({base} >> {index}) & 1)", 1
+            msb, lsb = self.const(node[2]), self.const(node[3])
+            bits = msb - lsb + 1
+            if lsb == 0:
+                return f"({base} & {mask(bits):#x})", bits
+            return f"(({base} >> {lsb}) & {mask(bits):#x})", bits
+        if typ in ("cat", "rep"):
+            return self._concat(node), self.width(node)
+        if typ == "call":
+            raise TranslateError(f"function call {node[1]} not supported")
+        raise TranslateError(f"cannot translate '{unparse(node)}'")
+
+    def _unary(self, node, w):
+        op, a = node[1], node[2]
+        if op == "+":
+            return self.value(a, w)
+        if op == "-":
+            code, _ = self.value(a, w)
+            return f"(-{code})", None
+        if op == "~":
+            return f"({self.clean(a, w)} ^ {mask(w):#x})", w
+        if op == "!":
+            return self._int(self._not(self.truthy(a))), 1
+        m = mask(self.width(a))
+        code = self.clean(a)
+        if op in ("&", "~&"):
+            rel = "==" if op == "&" else "!="
+            return self._int(f"{code} {rel} {m:#x}"), 1
+        if op in ("|", "~|"):
+            rel = "!=" if op == "|" else "=="
+            return self._int(f"{code} {rel} 0"), 1
+        parity = self._parity(code)
+        if op == "^":
+            return parity, 1
+        return f"({parity} ^ 1)", 1
+
+    def _binary(self, node, w):
+        op, a, b = node[1], node[2], node[3]
+        if op in RELATIONS or op in ("&&", "||"):
+            return self._int(self.truthy(node)), 1
+        if op in (">>", ">>>"):
+            code, bits = self.value(a, w)
+            if bits is None or bits > w:
+                code, bits = f"({code} & {mask(w):#x})", w
+            return f"({code} >> {self.clean(b)})", bits
+        if op in ("/", "%"):
+            ca, cb = self.clean(a, w), self.clean(b, w)
+            return f"({ca} {PY_OPS.get(op, op)} {cb})", w
+        if op in ("^~", "~^"):
+            ca, cb = self.clean(a, w), self.clean(b, w)
+            return f"({ca} ^ {cb} ^ {mask(w):#x})", w
+        ca, ba = self.value(a, w)
+        if op in ("<<", "<<<", "**"):
+            cb = self.clean(b)
+            if op == "**":
+                return f"({ca} ** {cb})", None
+            bits = None
+            if ba is not None and b[0] == "num":
+                bits = ba + b[1]
+            return f"({ca} << {cb})", bits
+        cb, bb = self.value(b, w)
+        code = f"({ca} {op} {cb})"
+        if op == "&" and (ba, bb) != (None, None):
+            return code, min(x for x in (ba, bb) if x is not None)
+        if None in (ba, bb):
+            return code, None
+        if op == "+":
+            return code, max(ba, bb) + 1
+        if op == "*":
+            return code, ba + bb
+        if op == "-":
+            return code, None
+        return code, max(ba, bb)
+
+    # --- Python code of the operations on conditions, overriden to translate
+    # --- for other kinds of values
+    def _int(self, cond):
+        return f"int({cond})"
+
+    def _not(self, cond):
+        return f"not ({cond})"
+
+    def _logic(self, op, a, b):
+        return f"({a}) {'and' if op == '&&' else 'or'} ({b})"
+
+    def _nonzero(self, code):
+        return code
+
+    def _select(self, cond, a, b):
+        return f"({a} if {cond} else {b})"
+
+    def _parity(self, code):
+        return f"(bin({code}).count('1') & 1)"
+
+    def _concat(self, node):
+        if node[0] == "rep":
+            part = self._concat(("cat", node[2]))
+            w = sum(self.width(n) for n in node[2])
+            count = self.const(node[1])
+            if count == 1:
+                return part
+            return f"({part} * {sum(1 << (w * i) for i in range(count)):#x})"
+        terms = []
+        shift = 0
+        for part in reversed(node[1]):
+            code = self.clean(part)
+            terms.append(f"({code} << {shift})" if shift else code)
+            shift += self.width(part)
+        if len(terms) == 1:
+            return terms[0]
+        return "(" + " | ".join(reversed(terms)) + ")"
+
+    # --- statements: assignments and task calls, system tasks are ignored.
+    # --- returns the lines of Python code
+    def statement(self, text):
+        if text.lstrip().startswith("$"):
+            return [f"pass  # {text.strip()}"]
+        p = ExprParser(text, f"in statement '{text.strip()}'")
+        kind, name = p.tokens[0] if p.tokens else ("", "")
+        if kind == "id" and p.tokens[1:2] in ([], [("op", "(")]):
+            p.take()
+            args = p.arguments() if p.peek() == "(" else []
+            p.end()
+            return self.call(name, args)
+        lhs = p.primary()
+        p.expect("=")
+        rhs = p.expr()
+        p.end()
+        return self.assign(lhs, rhs)
+
+    def lvalue(self, node):
+        """Python name and width of an assigned variable"""
+        if node[0] != "id":
+            raise TranslateError(f"cannot assign to '{unparse(node)}'")
+        return self.lvalues(node[1])
+
+    def assign(self, lhs, rhs):
+        if lhs[0] == "cat":
+            w = self.width(lhs)
+            tmp = self.temp()
+            lines = [f"{tmp} = {self._masked(rhs, w)}"]
+            shift = 0
+            for part in reversed(lhs[1]):
+                pw = self.width(part)
+                src = f"({tmp} >> {shift})" if shift else tmp
+                lines += self._assign_code(part, f"{src} & {mask(pw):#x}")
+                shift += pw
+            return lines
+        return self._assign_code(lhs, self._masked(rhs, self.width(lhs)))
+
+    def _assign_code(self, lhs, code):
+        if lhs[0] == "sel":
+            var, width = self.lvalue(lhs[1])
+            if lhs[3] is None:
+                index = self.clean(lhs[2])
+                return [
+                    f"{var} = ({var} & ~(1 << {index}) & {mask(width):#x}) "
+                    f"| (({code}) << {index})"
+                ]
+            msb, lsb = self.const(lhs[2]), self.const(lhs[3])
+            keep = mask(width) & ~(mask(msb - lsb + 1) << lsb)
+            value = f"(({code}) << {lsb})" if lsb else f"({code})"
+            return [f"{var} = ({var} & {keep:#x}) | {value}"]
+        var, _ = self.lvalue(lhs)
+        return [f"{var} = {code}"]
+
+    def _masked(self, node, width):
+        w = max(width, self.width(node))
+        code, bits = self.value(node, w)
+        if bits is None or bits > width:
+            return f"{code} & {mask(width):#x}"
+        return code
+
+    def temp(self):
+        self.tmp += 1
+        return f"_t{self.tmp}"
+
+    # --- a task call is replaced by the statements of the task, with its
+    # --- inputs bound to temporaries. Unknown tasks call a method of the
+    # --- model that does nothing unless overriden
+    def call(self, name, args):
+        task = self.tasks.get(name)
+        if task is None:
+            if name not in self.hooks:
+                self.hooks.append(name)
+            codes = ", ".join(self.clean(a) for a in args)
+            return [f"self.{pyName(name)}({codes})"]
+        if len(args) != len(task.inputs):
+            raise TranslateError(
+                f"task {name} expects {len(task.inputs)} arguments"
+            )
+        lines = []
+        bound = {}
+        for (arg_name, width), arg in zip(task.inputs, args):
+            tmp = self.temp()
+            lines.append(f"{tmp} = {self._masked(arg, width)}")
+            bound[arg_name] = (tmp, width)
+
+        def names(n):
+            if n in bound:
+                return bound[n]
+            return self.names(n)
+
+        inner = type(self)(names, self.consts, self.tasks, self.lvalues)
+        inner.tmp = self.tmp
+        inner.hooks = self.hooks
+        for stm in task.body:
+            lines += inner.statement(stm)
+        self.tmp = inner.tmp
+        return lines
+
+
+# a Verilog task whose calls are inlined, inputs is [(name, width)] and
+# body the text of its statements
+class Task:
+    def __init__(self, name, inputs, body):
+        self.name = name
+        self.inputs = inputs
+        self.body = body
+
+
+def parse(text, what=""):
+    return ExprParser(text, what).parse_all()
+
+
+def unparse(node):
+    typ = node[0]
+    if typ == "num":
+        return str(node[1])
+    if typ in ("id", "call"):
+        return node[1]
+    if typ == "un":
+        return f"{node[1]}{unparse(node[2])}"
+    if typ == "bin":
+        return f"({unparse(node[2])} {node[1]} {unparse(node[3])})"
+    if typ == "cond":
+        return " ? ".join(unparse(n) for n in node[1:])
+    if typ == "sel":
+        bounds = [unparse(n) for n in node[2:] if n is not None]
+        return f"{unparse(node[1])}[{':'.join(bounds)}]"
+    parts = node[1] if typ == "cat" else node[2]
+    return "{" + ", ".join(unparse(n) for n in parts) + "}"
@@ -0,0 +1,384 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Built-in Verilog preprocessor (-prep), doing in process what vlog_prep.sh
+# does running iverilog -E: `define (with arguments and default values),
+# `undef, `ifdef, `ifndef, `elsif, `else, `endif and `include, plus -D and
+# -I. `tick is left as it is unless defined, as are the compiler directives
+# handled later by the tools (`timescale etc.)
+#
+# As iverilog -E, comments are kept and the lines holding preprocessor
+# directives or excluded by a condition are left empty, so that the line
+# numbers of the output are those of the input
+# ------------------------------------------------------------------------------
+import os
+import re
+from . import utils
+from . import block_cache
+
+# compiler directives passed through as they are when not defined
+KEEP = {
+    "tick",
+    "timescale",
+    "default_nettype",
+    "resetall",
+    "celldefine",
+    "endcelldefine",
+    "unconnected_drive",
+    "nounconnected_drive",
+    "line",
+    "pragma",
+    "begin_keywords",
+    "end_keywords",
+}
+MAX_INCLUDE_DEPTH = 64
+
+SPECIAL = re.compile(r'[`/"\n]')
+IDENT = re.compile(r"[A-Za-z_][A-Za-z0-9_$]*")
+BLANKS = re.compile(r"[ \t\r]*")
+STRING = re.compile(r'"(?:\\.|[^"\\\n])*"?', re.S)
+# tokens of a macro body: `" (stays a quote around substituted text),
+# strings, based numbers (whose digits could look like identifiers) and
+# identifiers, those preceded by ` being macro names
+BODY_TOKEN = re.compile(
+    r'`"|"(?:\\.|[^"\\])*"|\'[sS]?[bBoOdDhH][0-9a-fA-FxXzZ?_]+'
+    r"|`?[A-Za-z_][A-Za-z0-9_$]*"
+)
+BODY_COMMENT = re.compile(r'"(?:\\.|[^"\\])*"|//[^\n]*|/\*.*?\*/', re.S)
+OPEN = "([{"
+CLOSE = ")]}"
+
+
+class Macro:
+    def __init__(self, name, params, body):
+        self.name = name
+        self.params = params  # [(name, default or None)], None if no args
+        self.body = body
+
+    def expand(self, args):
+        """body with the parameters replaced by the arguments given"""
+        if self.params is None:
+            return self.body
+        vals = {}
+        for i, (param, default) in enumerate(self.params):
+            arg = args[i] if i < len(args) else None
+            if not arg and default is not None:
+                arg = default
+            if arg is None:
+                return None
+            vals[param] = arg
+
+        def subst(m):
+            tok = m.group()
+            return vals.get(tok, tok)
+
+        body = BODY_TOKEN.sub(subst, self.body)
+        return body.replace("``", "").replace('`"', '"')
+
+
+# --------------------------------------------------------------------
+# text being scanned: a file, an included one or a macro expansion
+# --------------------------------------------------------------------
+class Source:
+    def __init__(self, text, file, line=1, expanding=()):
+        self.text = text
+        self.file = file
+        self.line = line
+        self.pos = 0
+        self.expanding = expanding  # names of the macros being expanded
+        # one [active, taken, in_else] per open `ifdef, active if the text
+        # is kept, taken if an alternative has been chosen already
+        self.conds = []
+
+    @property
+    def active(self):
+        return not self.conds or self.conds[-1][0]
+
+
+class VlogPreprocessor:
+    def __init__(self, defines=None, include_dirs=None):
+        self.macros = {}
+        for define in defines or []:
+            name, eq, val = define.partition("=")
+            self.macros[name] = Macro(name, None, val if eq else "1")
+        self.include_dirs = list(include_dirs or [])
+        self.included = []  # files included, in order
+        self.search = self.include_dirs
+        self.depth = 0
+
+    def process_file(self, path):
+        with open(path) as f:
+            return self.process(f.read(), path)
+
+    def process(self, text, file="<input>"):
+        """preprocess the text of file. Includes are looked up in the -I
+        directories, then in the current one and the one holding file"""
+        self.search = self.include_dirs + [".", os.path.dirname(file) or "."]
+        out = []
+        self._scan_file(Source(text, file), out)
+        return "".join(out)
+
+    def _error(self, src, msg):
+        utils.error(msg, file=src.file, line=src.line)
+
+    def _scan_file(self, src, out):
+        self._scan(src, out)
+        if src.conds:
+            self._error(src, "`ifdef/`ifndef without `endif")
+
+    def _scan(self, src, out):
+        text = src.text
+        n = len(text)
+        while src.pos < n:
+            m = SPECIAL.search(text, src.pos)
+            end = m.start() if m else n
+            if end > src.pos and src.active:
+                out.append(text[src.pos : end])
+            src.pos = end
+            if m is None:
+                break
+            c = m.group()
+            if c == "\n":
+                out.append("\n")
+                src.line += 1
+                src.pos += 1
+            elif c == "/":
+                self._comment(src, out)
+            elif c == '"':
+                m = STRING.match(text, src.pos)
+                self._emit(src, out, m.group())
+                src.pos = m.end()
+            else:
+                self._directive(src, out)
+
+    # keep text when active, only its line breaks otherwise
+    def _emit(self, src, out, txt):
+        nl = txt.count("\n")
+        out.append(txt if src.active else "\n" * nl)
+        src.line += nl
+
+    def _comment(self, src, out):
+        text, pos = src.text, src.pos
+        nxt = text[pos + 1 : pos + 2]
+        if nxt == "/":
+            end = text.find("\n", pos)
+            end = len(text) if end < 0 else end
+        elif nxt == "*":
+            end = text.find("*/", pos + 2)
+            if end < 0:
+                self._error(src, "unterminated /* comment")
+            end += 2
+        else:
+            end = pos + 1
+        self._emit(src, out, text[pos:end])
+        src.pos = end
+
+    # --------------------------------------------------------------------
+    # directives and macro uses, src.pos is at the `
+    # --------------------------------------------------------------------
+    def _directive(self, src, out):
+        m = IDENT.match(src.text, src.pos + 1)
+        if m is None:
+            if src.active:
+                out.append("`")
+            src.pos += 1
+            return
+        name = m.group()
+        src.pos = m.end()
+        if name in ("ifdef", "ifndef", "elsif", "else", "endif"):
+            self._conditional(src, name)
+        elif not src.active:
+            return
+        elif name == "define":
+            self._define(src, out)
+        elif name == "undef":
+            self.macros.pop(self._name(src, name), None)
+        elif name == "undefineall":
+            self.macros = {}
+        elif name == "include":
+            self._include(src, out)
+        elif name in self.macros:
+            self._expand(src, out, self.macros[name])
+        elif name == "__FILE__":
+            out.append(f'"{src.file}"')
+        elif name == "__LINE__":
+            out.append(str(src.line))
+        elif name in KEEP:
+            out.append("`" + name)
+        else:
+            self._error(src, f"macro `{name} is not defined")
+
+    # name following a directive
+    def _name(self, src, directive):
+        src.pos = BLANKS.match(src.text, src.pos).end()
+        m = IDENT.match(src.text, src.pos)
+        if m is None:
+            self._error(src, f"`{directive}: expecting a macro name")
+        src.pos = m.end()
+        return m.group()
+
+    def _conditional(self, src, directive):
+        conds = src.conds
+        if directive in ("ifdef", "ifndef"):
+            defined = self._name(src, directive) in self.macros
+            val = defined == (directive == "ifdef")
+            conds.append([src.active and val, val, False])
+            return
+        if not conds or conds[-1][2] and directive != "endif":
+            self._error(src, f"`{directive} without `ifdef/`ifndef")
+        cond = conds.pop()
+        if directive == "elsif":
+            val = self._name(src, directive) in self.macros
+            val = val and not cond[1]
+            conds.append([src.active and val, cond[1] or val, False])
+        elif directive == "else":
+            conds.append([src.active and not cond[1], True, True])
+
+    def _define(self, src, out):
+        text = src.text
+        name = self._name(src, "define")
+        params = None
+        if text.startswith("(", src.pos):
+            params = []
+            for param in self._arguments(src, name):
+                pname, eq, default = param.partition("=")
+                pname = pname.strip()
+                if not IDENT.fullmatch(pname):
+                    self._error(src, f"`define {name}: bad argument {param}")
+                params.append((pname, default.strip() if eq else None))
+        # the body goes up to the end of the line, \ continues it in the
+        # next one
+        lines = []
+        while True:
+            end = text.find("\n", src.pos)
+            end = len(text) if end < 0 else end
+            line = text[src.pos : end].rstrip(" \t\r")
+            src.pos = end
+            if not line.endswith("\\") or end == len(text):
+                lines.append(line)
+                break
+            lines.append(line[:-1])
+            out.append("\n")
+            src.line += 1
+            src.pos += 1
+        body = "\n".join(lines)
+        body = BODY_COMMENT.sub(
+            lambda m: "" if m.group()[0] == "/" else m.group(), body
+        )
+        self.macros[name] = Macro(name, params, body.strip())
+
+    def _include(self, src, out):
+        text = src.text
+        src.pos = BLANKS.match(text, src.pos).end()
+        close = {'"': '"', "<": ">"}.get(text[src.pos : src.pos + 1])
+        end = text.find(close, src.pos + 1) if close else -1
+        if end < 0 or "\n" in text[src.pos : end]:
+            self._error(src, '`include: expecting "file" or <file>')
+        name = text[src.pos + 1 : end]
+        src.pos = end + 1
+        path = self._find_include(name)
+        if path is None:
+            self._error(src, f"`include: {name} not found")
+        if self.depth == MAX_INCLUDE_DEPTH:
+            self._error(src, f"`include: {name} nested too deep")
+        self.included.append(path)
+        with open(path) as f:
+            inc = Source(f.read(), path)
+        self.depth += 1
+        self._scan_file(inc, out)
+        self.depth -= 1
+
+    def _find_include(self, name):
+        if os.path.isabs(name):
+            return name if os.path.isfile(name) else None
+        for d in self.search:
+            path = os.path.join(d, name)
+            if os.path.isfile(path):
+                return os.path.normpath(path)
+        return None
+
+    def _expand(self, src, out, macro):
+        if macro.name in src.expanding:
+            self._error(src, f"macro `{macro.name} expands to itself")
+        args = []
+        if macro.params is not None:
+            src.pos = BLANKS.match(src.text, src.pos).end()
+            if not src.text.startswith("(", src.pos):
+                self._error(src, f"macro `{macro.name} expects arguments")
+            args = self._arguments(src, macro.name)
+            if len(args) > len(macro.params):
+                self._error(src, f"too many arguments for `{macro.name}")
+            # arguments are expanded before being substituted, so they can
+            # use the macro itself
+            args = [self._expand_text(src, arg) for arg in args]
+        body = macro.expand(args)
+        if body is None:
+            self._error(src, f"missing arguments for `{macro.name}")
+        # the expansion is scanned again for the macros it uses
+        expanding = src.expanding + (macro.name,)
+        self._scan_file(Source(body, src.file, src.line, expanding), out)
+
+    def _expand_text(self, src, text):
+        out = []
+        self._scan_file(Source(text, src.file, src.line, src.expanding), out)
+        return "".join(out)
+
+    # comma separated list in parenthesis at src.pos, commas within nested
+    # parenthesis, brackets, braces or strings do not separate arguments
+    def _arguments(self, src, name):
+        text = src.text
+        args = []
+        depth = 0
+        start = pos = src.pos + 1
+        while pos < len(text):
+            c = text[pos]
+            if c == '"':
+                pos = STRING.match(text, pos).end()
+                continue
+            if c == "\n":
+                src.line += 1
+            elif c in OPEN:
+                depth += 1
+            elif c in CLOSE:
+                if depth == 0:
+                    args.append(text[start:pos].strip())
+                    src.pos = pos + 1
+                    return args
+                depth -= 1
+            elif c == "," and depth == 0:
+                args.append(text[start:pos].strip())
+                start = pos + 1
+            pos += 1
+        self._error(src, f"unterminated argument list of `{name}")
+
+
+# --------------------------------------------------------------------
+# preprocess the input as given by the -prep, -D and -I options. Both
+# return the preprocessed text and the files it depends on, the input
+# file and those it includes. A BlockCache given keeps the preprocessed
+# text until the input or any of the files it includes change
+# --------------------------------------------------------------------
+def preprocessText(args, text, file, cache=None):
+    key = None
+    if cache:
+        key = block_cache.prepKey(args, file, text)
+        hit = cache.get_prep(key)
+        if hit:
+            out, included = hit
+            return out, [file] + included
+    prep = VlogPreprocessor(args.D, args.I)
+    out = prep.process(text, file)
+    included = list(dict.fromkeys(prep.included))
+    if cache:
+        cache.put_prep(key, out, included)
+    return out, [file] + included
+
+
+def preprocessFile(args, file, cache=None):
+    with open(file) as f:
+        return preprocessText(args, f.read(), file, cache)
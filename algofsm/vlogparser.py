@@ -21,7 +21,7 @@ class VlogTokens(Enum):
     TK_SLCOMMENT = td.Token(
         r"(\/\/(.*?)\n)", is_pat=True, is_skip=True
     )  # skip comments //
-    TK_WS = td.Token(r"(\s+)(.*)", is_pat=True, is_skip=True)  # skip whitespace
+    TK_WS = td.Token(r"(\s+)", is_pat=True, is_skip=True)  # skip whitespace
     TK_WHILE = td.Token(r"while\b")
     TK_IF = td.Token(r"if\b")
     TK_ELSE = td.Token(r"else\b")
@@ -44,6 +44,10 @@ class VlogParser(td.TopDown):
         self.set_tokens(VlogTokens)
         self.set_input(inp)
         self.tick_num = 0
+        # uid: (keyword, offset in the input) of statements (sn, if, loops)
+        # and /// comments
+        self.positions = {}
+        self.tick_pos = []  # offset in the input of each `tick, by number
 
     def start_rule(self):
 
@@ -73,6 +77,7 @@ class VlogParser(td.TopDown):
 
         def rule_if():
             if token_match(self.tokens.TK_IF):
+                pos = self.parse_consumed
                 must(rule_pexpr(), "if: Expecting parenthesis expression")
                 must(rule_sentence(), "if: Expecting sentence/blk")
                 if self.token_ahead() != self.tokens.TK_ELSE:
@@ -85,28 +90,33 @@ class VlogParser(td.TopDown):
                     n = self.node_add(
                         "if", cond.code, None, [None, bodyt, bodyf]
                     )
+                self.positions[n.uid] = ("if", pos)
                 self.node_rm(cond)
                 return self.stk_push(n)
             return False
 
         def rule_while():
             if token_match(self.tokens.TK_WHILE):
+                pos = self.parse_consumed
                 must(rule_pexpr(), "while: Expecting parenthesis expression")
                 must(rule_sentence(), "while: Expecting sentence/blk")
                 cond, body = self.stk_pop(2)
                 n = self.node_add("wh", cond.code, None, [None, body])
+                self.positions[n.uid] = ("while", pos)
                 self.node_rm(cond)
                 return self.stk_push(n)
             return False
 
         def rule_do_while():
             if token_match(self.tokens.TK_DO):
+                pos = self.parse_consumed
                 must(rule_sentence(), "while: Expecting sentence/blk")
                 token_match(self.tokens.TK_WHILE)
                 must(rule_pexpr(), "while: Expecting parenthesis expression")
                 must(token_match(self.tokens.TK_SEMICOLON), "Expected ;")
                 body, cond = self.stk_pop(2)
                 n = self.node_add("do", cond.code, None, [None, body])
+                self.positions[n.uid] = ("do", pos)
                 self.node_rm(cond)
                 return self.stk_push(n)
             return False
@@ -119,6 +129,7 @@ class VlogParser(td.TopDown):
 
         def rule_tick():
             if token_match(self.tokens.TK_TICK):
+                self.tick_pos.append(self.parse_consumed)
                 self.stk_push(self.node_add("tk", str(self.tick_num)))
                 self.tick_num += 1
                 return must(
@@ -128,10 +139,12 @@ class VlogParser(td.TopDown):
 
         def rule_for():
             if token_match(self.tokens.TK_FOR):
+                pos = self.parse_consumed
                 must(rule_pexpr(), "for: Expecting parenthesis expression")
                 must(rule_sentence(), "for: Expecting sentence/blk")
                 cond, body = self.stk_pop(2)
                 n = self.node_add("fo", cond.code, None, [None, body])
+                self.positions[n.uid] = ("for", pos)
                 self.node_rm(cond)
                 return self.stk_push(n)
             return False
@@ -192,14 +205,19 @@ class VlogParser(td.TopDown):
 
         def rule_prcomment():
             if token_match(self.tokens.TK_PRSLCOMMENT):
-                return self.stk_push(
-                    self.node_add("cm", self.parse_token_text)
-                )
+                n = self.node_add("cm", self.parse_token_text)
+                # the comment ends with its line
+                self.positions[n.uid] = ("///", self.parse_consumed - 1)
+                return self.stk_push(n)
             return False
 
         def rule_sn():
             if token_match(self.tokens.TK_SN):
-                self.stk_push(self.node_add("sn", self.parse_token_text))
+                text = self.parse_token_text
+                n = self.node_add("sn", text)
+                pos = self.parse_consumed - len(text)
+                self.positions[n.uid] = ("sn", pos)
+                self.stk_push(n)
                 if utils.is_nonblocking_assign(self.parse_token_text):
                     utils.error(
                         "non-blocking assignments not allowed "
@@ -223,11 +241,25 @@ class VlogParser(td.TopDown):
     # ------------------------------------------------------------------------------
     # ------------------------------------------------------------------------------
 
+    # source lines of offsets in the input. The input starts with the 2
+    # lines added by _expand_input
+    def source_lines(self, offsets):
+        lines = [None] * len(offsets)
+        newlines = 0
+        last = 0
+        for i in sorted(range(len(offsets)), key=offsets.__getitem__):
+            pos = offsets[i]
+            newlines += self.parse_in.count("\n", last, pos)
+            last = pos
+            lines[i] = self.line_base + newlines - 1
+        return lines
+
     # find out which nodes link to 'dst' node, returning a hash
     # with the modes as keys and they type of link as value (bt/bf/nx)
     def links_to(self, dst):
         to = {}
-        for n in self.nodes:
+        # only nodes in the predecessor index of dst need to be checked
+        for n, _ in dst.preds:
             t = []
             if n.child[1] == dst:
                 t.append("bt")
@@ -239,11 +271,52 @@ class VlogParser(td.TopDown):
                 to[n] = list(t)
         return to
 
-    # see if subtree hanging from node 'n' has a typ=="tk" node
+    # see if subtree hanging from node 'n' has a typ=="tk" node. The result
+    # is kept on the node until a change in the tree invalidates it
     def has_tick(self, n):
+        if n is None:
+            return False
+        tick_in = n.tick_in
+        if tick_in is None:
+            if n.typ == "tk":  # base case, we found a "tk" node
+                tick_in = True
+            elif n.typ == "wh" or n.typ == "do" or n.typ == "fo":
+                tick_in = self.has_tick_lst(n.child[1])
+            elif n.typ == "if":
+                tick_in = self.has_tick_lst(n.child[1]) or self.has_tick_lst(
+                    n.child[2]
+                )
+            elif n.typ == "sn" or n.typ == "cm" or n.typ[:2] == "rm":
+                tick_in = False
+            else:
+                assert False, f"typ {n.typ} not handled in has_tick"
+            n.tick_in = tick_in
+        if self.check:
+            assert tick_in == self.has_tick_uncached(n), f"has_tick of {n}"
+        return tick_in
+
+    # see if any node in the list starting at 'n' has a tick
+    def has_tick_lst(self, n):
+        walked = []
+        tick_in_lst = False
+        while n:
+            if n.tick_in_lst is not None:
+                tick_in_lst = n.tick_in_lst
+                break
+            walked.append(n)
+            if self.has_tick(n):
+                tick_in_lst = True
+                break
+            n = n.nxt
+        for n in walked:
+            n.tick_in_lst = tick_in_lst
+        return tick_in_lst
+
+    # reference definition of has_tick, walks the whole subtree
+    def has_tick_uncached(self, n):
         def has_tick_lst(n):
             while n:
-                if self.has_tick(n):
+                if self.has_tick_uncached(n):
                     return True
                 n = n.nxt
             return False
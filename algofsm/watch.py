@@ -0,0 +1,127 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Keep converting input files as they change. Files are polled and only the
+# SM blocks that changed since the previous conversion are converted again,
+# the rest of the output is reassembled from what was generated before
+# ------------------------------------------------------------------------------
+import copy
+import hashlib
+import os
+import time
+from . import utils
+from . import block_cache
+from . import parse_input
+
+# options whose generated code names lines of the input, which changes when
+# lines are added or removed above a block
+LINE_ARGS = ["behav", "latency", "perfcounters", "max_depth"]
+
+
+def watchKey(args, blk):
+    """hash of what the code generated for blk depends on. Unlike the cache
+    key it leaves out the lines of the block when the code doesn't name
+    them, so that editing above a block doesn't convert it again"""
+    fields = [
+        blk.sm_num,
+        blk.decl_in,
+        blk.inp,
+        [getattr(args, name) for name in block_cache.KEY_ARGS],
+    ]
+    if any(getattr(args, name) for name in LINE_ARGS):
+        fields += [blk.line_decl_base, blk.line_forever_base]
+    return hashlib.sha256(repr(fields).encode()).hexdigest()
+
+
+# (modification time, size) of a file, None if it is missing
+def fileStamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class WatchedFile:
+    def __init__(self, args, file, out):
+        self.args = copy.copy(args)
+        self.args.file = file
+        self.args.out = out
+        self.args.jobs = 1
+        self.deps = [file]  # the input and the files it includes with -prep
+        self.stamps = None
+        self.outs = {}  # generated code per block key of the last conversion
+
+    def poll(self):
+        """convert again if the input or a file it includes changed, returns
+        True if converted"""
+        stamps = [fileStamp(path) for path in self.deps]
+        if stamps[0] is None or stamps == self.stamps:
+            return False
+        self.stamps = stamps
+        start = time.perf_counter()
+        try:
+            changed, total = self.convert()
+        except utils.AlgoFsmError as e:
+            e.report()
+            utils.warning(
+                f"{self.args.file}: conversion failed, waiting for changes"
+            )
+            return False
+        msecs = 1000 * (time.perf_counter() - start)
+        utils.info(
+            f"{self.args.file}: {changed}/{total} SM blocks changed, "
+            f"{self.args.out} updated in {msecs:.1f} ms"
+        )
+        return True
+
+    def convert(self):
+        deps = []
+        items = list(parse_input.scanInputFile(self.args, deps=deps))
+        deps = deps or [self.args.file]
+        if deps != self.deps:  # includes added or removed
+            self.deps = deps
+            self.stamps = [fileStamp(path) for path in deps]
+        outs = {}
+        changed = 0
+        for item in items:
+            if isinstance(item, parse_input.SmBlock):
+                key = watchKey(self.args, item)
+                out = self.outs.get(key)
+                if out is None:
+                    converted = parse_input.convertBlock(self.args, item)
+                    parse_input.reportBlock(self.args, item, converted)
+                    out = converted[0]
+                    changed += 1
+                outs[key] = out
+        # splice the generated code of each block with the passthrough text
+        with open(self.args.out, "w") as fout:
+            for item in items:
+                if isinstance(item, parse_input.SmBlock):
+                    key = watchKey(self.args, item)
+                    print(outs[key], file=fout)
+                else:
+                    print(item, end="", file=fout)
+        self.outs = outs
+        return changed, len(outs)
+
+
+def watch(args, pairs):
+    files = []
+    for file, out in pairs:
+        if file in ("-", "/dev/stdin"):
+            utils.error("-watch needs input files, stdin cannot be watched")
+        files.append(WatchedFile(args, file, out))
+    utils.info(f"watching {len(files)} file(s), press Ctrl-C to stop")
+    try:
+        while True:
+            for f in files:
+                f.poll()
+            time.sleep(args.watch_interval)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,72 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Compare converting N design files with one algo_fsm.py invocation each
+# against a single batch invocation
+# ------------------------------------------------------------------------------
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+ALGOFSM = os.path.join(ROOT, "algo_fsm.py")
+DESIGNS = ["for1", "for2", "for3", "for4", "tpg1", "tpg2", "tpg3", "matmul3"]
+
+
+def make_inputs(tmp, num_files):
+    pairs = []
+    for i in range(num_files):
+        design = DESIGNS[i % len(DESIGNS)]
+        src = os.path.join(tmp, f"in{i}.v")
+        shutil.copy(os.path.join(ROOT, "tests", design, "design.v"), src)
+        pairs.append((src, os.path.join(tmp, f"out{i}.v")))
+    return pairs
+
+
+def run_separate(pairs):
+    for src, dst in pairs:
+        subprocess.run([sys.executable, ALGOFSM, src, "-out", dst], check=True)
+
+
+def run_batch(tmp, pairs, jobs):
+    manifest = os.path.join(tmp, "manifest")
+    with open(manifest, "w") as f:
+        for src, dst in pairs:
+            print(src, dst, file=f)
+    subprocess.run(
+        [sys.executable, ALGOFSM, "-batch", manifest, "-jobs", str(jobs)],
+        check=True,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    print(f"{'files':>8} {'separate':>9} {'batch':>8} {'batch -j4':>9}")
+    for num_files in (25, 100):
+        with tempfile.TemporaryDirectory() as tmp:
+            pairs = make_inputs(tmp, num_files)
+            separate = timed(run_separate, pairs)
+            outs = {dst: open(dst).read() for _, dst in pairs}
+            batch = timed(run_batch, tmp, pairs, 1)
+            batch_j4 = timed(run_batch, tmp, pairs, 4)
+            for dst, txt in outs.items():
+                assert open(dst).read() == txt, f"{dst} differs"
+        print(f"{num_files:8} {separate:9.3f} {batch:8.3f} {batch_j4:9.3f}")
+
+
+if __name__ == "__main__":
+    main()
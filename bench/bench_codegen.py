@@ -0,0 +1,41 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Time and peak memory of the code generation (dump_dag_sm) of large FSMs:
+# many states, and states with long code (paths through a chain of if/else
+# emitted separately)
+# ------------------------------------------------------------------------------
+import sys
+sys.path.append(".")
+sys.path.append("..")
+from bench.scaling.gen import DesignParams, gen_design
+from bench.scaling.stages import run_stages
+from bench.bench_if_chain import gen_chain
+
+DESIGNS = {
+    "many states": gen_design(DesignParams(ticks=2000, fanout=4, decls=16)),
+    "long states": gen_chain(11),
+}
+
+
+def main():
+    print(
+        f"{'design':>12} {'states':>7} {'out KB':>8} {'secs':>7} "
+        f"{'peak KB':>8}"
+    )
+    for name, text in DESIGNS.items():
+        secs = min(run_stages(text)[0].secs["dump"] for _ in range(3))
+        run, sizes = run_stages(text, trace_memory=True)
+        print(
+            f"{name:>12} {sizes['states']:7} {sizes['out_bytes'] / 1024:8.0f}"
+            f" {secs:7.3f} {run.peak_kb['dump']:8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
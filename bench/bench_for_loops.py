@@ -0,0 +1,52 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Time the tree/DAG transformations on bodies made of many `for` loops. Each
+# for loop pre-inserts its init node, which rewires every link pointing to it
+# ------------------------------------------------------------------------------
+import sys
+import time
+sys.path.append(".")
+sys.path.append("..")
+from algofsm import vlogparser
+from algofsm import dag_utils
+from algofsm import fsm_converter_rtl
+
+
+def gen_body(num_loops):
+    lines = []
+    for i in range(num_loops):
+        lines.append(f"for (i = 0; i != {i % 5 + 1}; i = i + 1) begin")
+        lines.append(f"    x = x + {i};")
+        lines.append("    `tick;")
+        lines.append("end")
+    return "\n".join(lines) + "\n"
+
+
+def run(num_loops):
+    inp = fsm_converter_rtl.FsmConverterRTL._expand_input(gen_body(num_loops))
+    t0 = time.perf_counter()
+    p = vlogparser.VlogParser(inp, 0, "bench")
+    root = p.start_rule()
+    t1 = time.perf_counter()
+    dag_utils.expand_tree_structs(p, root, root, "", 0, 0)
+    t2 = time.perf_counter()
+    dag_utils.convert_to_dag(p, root, root, "", 0, 0)
+    t3 = time.perf_counter()
+    return t1 - t0, t2 - t1, t3 - t2
+
+
+def main():
+    print(f"{'loops':>8} {'parse':>8} {'expand':>8} {'to_dag':>8}")
+    for num_loops in (500, 1000, 2000, 4000):
+        parse, expand, to_dag = run(num_loops)
+        print(f"{num_loops:8} {parse:8.3f} {expand:8.3f} {to_dag:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Size of the code generated for a chain of if/else that may tick on one
+# side and otherwise reconverge. Each one doubles the paths through the
+# state, the code of a state grows exponentially with the chain depth by
+# default and linearly with -factorize (as there is a state per tick, the
+# whole output grows quadratically)
+# ------------------------------------------------------------------------------
+import re
+import sys
+import time
+sys.path.append(".")
+sys.path.append("..")
+from algofsm import api
+from algofsm import utils
+
+
+def gen_chain(depth):
+    lines = [
+        "module chain(input clk, input rst_n, input [31:0] c, d);",
+        "SmBegin",
+        "reg [15:0] a = 0;",
+        "SmForever",
+    ]
+    for k in range(depth):
+        lines.append(f"if (c[{k % 32}]) begin")
+        lines.append(f"    a = a + {k};")
+        lines.append(f"    if (d[{k % 32}]) `tick;")
+        lines.append("end")
+        lines.append("else begin")
+        lines.append(f"    a = a - {k};")
+        lines.append("end")
+    lines += ["a = 0;", "`tick;", "SmEnd", "endmodule"]
+    return "\n".join(lines) + "\n"
+
+
+# bytes of the code of the largest state
+def largest_state(out):
+    sizes = [len(code) for code in re.split(r"\n\s*\w+: begin\n", out)]
+    return max(sizes[1:])
+
+
+def run(depth, factorize):
+    options = {"factorize": factorize, "max_state_size": 4}
+    t0 = time.perf_counter()
+    try:
+        out = api.convert(gen_chain(depth), options).output
+    except utils.AlgoFsmError:
+        return "> 4MB", "", time.perf_counter() - t0
+    return len(out), largest_state(out), time.perf_counter() - t0
+
+
+def main():
+    print(
+        f"{'':6} {'default':^28} {'factorize':^28}\n"
+        + f"{'depth':>6}"
+        + f" {'bytes':>10} {'state':>9} {'secs':>7}" * 2
+    )
+    for depth in (4, 8, 12, 16, 20, 40, 80):
+        cols = [f"{depth:6}"]
+        for factorize in (False, True):
+            size, state, secs = run(depth, factorize)
+            cols.append(f"{size:>10} {state:>9} {secs:7.3f}")
+        print(" ".join(cols))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Lex synthetic SmForever bodies of increasing size, time per statement should
+# stay flat if lexing is linear on the input length
+# ------------------------------------------------------------------------------
+import sys
+import time
+sys.path.append(".")
+sys.path.append("..")
+from algofsm import vlogparser
+
+
+def gen_body(num_stms):
+    lines = []
+    for i in range(num_stms):
+        if i % 10 == 0:
+            lines.append("`tick;")
+        elif i % 10 == 5:
+            lines.append(f"if (x{i % 7} != {i % 3}) begin // cond")
+            lines.append(f"    y = y + x{i % 7};")
+            lines.append("end")
+        else:
+            lines.append(f"x{i % 7} = x{(i + 1) % 7} + {i};")
+    return "\n".join(lines) + "\n"
+
+
+def lex_all(inp):
+    p = vlogparser.VlogParser(inp, 0, "bench")
+    eof = p.tokens.TK_EOF
+    cnt = 0
+    while True:
+        p.get_token()
+        tok = p.parse_last_token
+        if tok == eof:
+            return cnt
+        cnt += 1
+
+
+def main():
+    print(f"{'stms':>8} {'tokens':>8} {'secs':>8} {'us/stm':>8}")
+    for num_stms in (1000, 10000, 100000):
+        inp = gen_body(num_stms)
+        t0 = time.perf_counter()
+        cnt = lex_all(inp)
+        secs = time.perf_counter() - t0
+        print(
+            f"{num_stms:8} {cnt:8} {secs:8.3f} "
+            f"{1e6 * secs / num_stms:8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Time state merging on FSMs with thousands of states where half of them are
+# redundant (both branches of each if tick into identical code)
+# ------------------------------------------------------------------------------
+import sys
+import time
+sys.path.append(".")
+sys.path.append("..")
+import algo_fsm
+from algofsm import dag_utils
+from algofsm import fsm_converter_rtl
+from algofsm import vlogparser
+
+
+def gen_body(num_blocks):
+    lines = []
+    for i in range(num_blocks):
+        lines.append(f"if (c{i % 3}) begin")
+        lines.append(f"    x = {i};")
+        lines.append("    `tick;")
+        lines.append("end else begin")
+        lines.append(f"    x = {i};")
+        lines.append("    `tick;")
+        lines.append("end")
+        lines.append(f"y = y + {i};")
+    return "\n".join(lines) + "\n"
+
+
+def get_args():
+    return algo_fsm.mainCmdParser([])
+
+
+def run(num_blocks):
+    conv = fsm_converter_rtl.FsmConverterRTL(get_args())
+    inp = fsm_converter_rtl.FsmConverterRTL._expand_input(gen_body(num_blocks))
+    conv.parser = p = vlogparser.VlogParser(inp, 0, "bench")
+    conv.root = root = p.start_rule()
+    conv.oprefix = "SM0_"
+    conv.ostate = "state0"
+    dag_utils.expand_tree_structs(p, root, root, "", 0, 0)
+    dag_utils.convert_to_dag(p, root, root, "", 0, 0)
+    before = sum(1 for n in p.nodes if n.typ == "tk")
+    t0 = time.perf_counter()
+    conv.merge_states(p, root, "")
+    secs = time.perf_counter() - t0
+    after = sum(1 for n in p.nodes if n.typ == "tk")
+    return before, after, secs
+
+
+def main():
+    print(f"{'states':>8} {'after':>8} {'secs':>8}")
+    for num_blocks in (250, 500, 1000, 2000):
+        before, after, secs = run(num_blocks)
+        print(f"{before:8} {after:8} {secs:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
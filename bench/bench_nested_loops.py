@@ -0,0 +1,51 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Time the tree/DAG transformations on deeply nested for loops with a tick in
+# the innermost body only. Every level asks whether its subtree has a tick
+# ------------------------------------------------------------------------------
+import sys
+import time
+sys.path.append(".")
+sys.path.append("..")
+from algofsm import vlogparser
+from algofsm import dag_utils
+from algofsm import fsm_converter_rtl
+
+
+def gen_body(depth, stms_per_level=20):
+    lines = []
+    for d in range(depth):
+        lines.append(f"for (i{d} = 0; i{d} != 3; i{d} = i{d} + 1) begin")
+        lines += [f"x{d} = x{d} + {k};" for k in range(stms_per_level)]
+    lines.append("`tick;")
+    lines += ["end"] * depth
+    return "\n".join(lines) + "\n"
+
+
+def run(depth):
+    inp = fsm_converter_rtl.FsmConverterRTL._expand_input(gen_body(depth))
+    p = vlogparser.VlogParser(inp, 0, "bench")
+    root = p.start_rule()
+    t0 = time.perf_counter()
+    dag_utils.expand_tree_structs(p, root, root, "", 0, 0)
+    t1 = time.perf_counter()
+    dag_utils.convert_to_dag(p, root, root, "", 0, 0)
+    t2 = time.perf_counter()
+    return t1 - t0, t2 - t1
+
+
+def main():
+    print(f"{'depth':>8} {'expand':>8} {'to_dag':>8}")
+    for depth in (10, 25, 50, 100):
+        expand, to_dag = run(depth)
+        print(f"{depth:8} {expand:8.3f} {to_dag:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Memory held by the nodes of the DAG of large bodies once states are
+# merged, per node kept by the parser and per live node
+# ------------------------------------------------------------------------------
+import sys
+import tracemalloc
+sys.path.append(".")
+sys.path.append("..")
+from algofsm import dag_utils
+from algofsm import fsm_converter_rtl
+from algofsm import vlogparser
+from bench.bench_merge_states import gen_body, get_args
+
+
+def run(num_blocks):
+    conv = fsm_converter_rtl.FsmConverterRTL(get_args())
+    inp = fsm_converter_rtl.FsmConverterRTL._expand_input(gen_body(num_blocks))
+    conv.oprefix = "SM0_"
+    conv.ostate = "state0"
+    tracemalloc.start()
+    try:
+        conv.parser = p = vlogparser.VlogParser(inp, 0, "bench")
+        conv.root = root = p.start_rule()
+        p.compact()
+        dag_utils.expand_tree_structs(p, root, root, "", 0, 0)
+        p.compact()
+        dag_utils.convert_to_dag(p, root, root, "", 0, 0)
+        p.compact()
+        conv.merge_states(p, root, "")
+        p.compact()
+        held = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    live = sum(1 for n in p.nodes if not n.typ.startswith("rm"))
+    return p.node_cnt, live, held
+
+
+def main():
+    print(
+        f"{'created':>8} {'live':>8} {'held KB':>8} {'B/created':>10} "
+        f"{'B/live':>8}"
+    )
+    for num_blocks in (1000, 4000, 16000):
+        created, live, held = run(num_blocks)
+        print(
+            f"{created:8} {live:8} {held / 1024:8.0f} {held / created:10.0f} "
+            f"{held / live:8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Time and peak memory of the top level scan of a big file with a few SM
+# blocks surrounded by lots of passthrough text, against the line by line
+# scan it replaced. Each measure runs in its own process
+# ------------------------------------------------------------------------------
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import algo_fsm
+from algofsm import parse_input
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+# previous scanner: readline, a print per line and string concatenation
+def scan_lines(args, fout):
+    state = "idle"
+    with open(args.file) as fin:
+        for line in fin:
+            lineStr = line.strip()
+            if state == "idle":
+                if lineStr == "SmBegin":
+                    state, decl_in, inp = "begin", "", ""
+                else:
+                    print(line, end="", file=fout)
+            elif state == "begin":
+                if lineStr == "SmForever":
+                    state = "forever"
+                else:
+                    decl_in += line
+            elif lineStr == "SmEnd":
+                state = "idle"
+            else:
+                m = re.match(r"(\s*)SmDecl:\s*(.*)", line)
+                if m:
+                    decl_in += m.group(1) + m.group(2) + "\n"
+                else:
+                    inp += line
+
+
+def scan_chunks(args, fout):
+    for item in parse_input.scanInputFile(args):
+        if not isinstance(item, parse_input.SmBlock):
+            print(item, end="", file=fout)
+
+
+def run(mode, file):
+    args = algo_fsm.mainCmdParser([file])
+    start = time.perf_counter()
+    with open(os.devnull, "w") as fout:
+        {"lines": scan_lines, "chunks": scan_chunks}[mode](args, fout)
+    secs = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{secs} {peak_mb}")
+
+
+def make_input(path, mbytes):
+    with open(os.path.join(ROOT, "tests", "matmul3", "design.v")) as f:
+        design = f.read()
+    filler = "// passthrough text " + "x" * 59 + "\n"
+    # written in pieces, the peak memory of this process is inherited by
+    # the processes measured
+    piece = filler * ((1 << 20) // len(filler))
+    with open(path, "w") as f:
+        for _ in range(4):
+            for _ in range(mbytes // 4):
+                f.write(piece)
+            f.write(design)
+
+
+def measure(mode, path):
+    res = subprocess.run(
+        [sys.executable, __file__, mode, path],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return [float(x) for x in res.stdout.split()]
+
+
+def main():
+    print(f"{'MB':>5} {'lines s':>8} {'MB':>6} {'chunks s':>8} {'MB':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mbytes in (16, 64, 256):
+            path = os.path.join(tmp, "in.v")
+            make_input(path, mbytes)
+            t0, m0 = measure("lines", path)
+            t1, m1 = measure("chunks", path)
+            print(f"{mbytes:5} {t0:8.3f} {m0:6.1f} {t1:8.3f} {m1:6.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        run(*sys.argv[1:])
+    else:
+        main()
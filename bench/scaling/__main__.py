@@ -0,0 +1,221 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Scalability benchmark. From the repository root:
+#
+#   python3 -m bench.scaling [-quick] [-json FILE] [-baseline FILE]
+#
+# For each series one parameter of the synthetic design grows while the
+# others stay fixed. Time (median of -repeat runs, with the garbage collector
+# off) and peak memory of each stage are recorded per point and the growth of
+# the time of each stage is fitted to a complexity curve. With -baseline,
+# exits with 1 if a stage got slower than the threshold given on most points
+# of a series, or grows faster with the size
+# ------------------------------------------------------------------------------
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+from .gen import DesignParams, gen_design
+from .stages import STAGES, run_stages
+from .fit import TINY, fit
+
+# name: (parameter changed, its values, quick values, other parameters)
+SERIES = {
+    "ticks": ("ticks", [32, 64, 128, 256, 512], [32, 64, 128], {}),
+    "depth": ("depth", [2, 4, 8, 16, 32], [2, 4, 8], {"ticks": 2}),
+    "fanout": ("fanout", [4, 8, 16, 32, 64], [4, 8, 16], {"ticks": 1}),
+    "decls": ("decls", [64, 128, 256, 512, 1024], [64, 128, 256], {}),
+    "for_nest": (
+        "depth",
+        [1, 2, 3, 4, 5],
+        [1, 2, 3],
+        {"ticks": 8, "loop_mix": 0.0},
+    ),
+}
+
+
+def measure(params, repeat):
+    text = gen_design(params)
+    secs = {name: [] for name in STAGES}
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            run, sizes = run_stages(text)
+        finally:
+            gc.enable()
+        for name in STAGES:
+            secs[name].append(run.secs[name])
+    run, _ = run_stages(text, trace_memory=True)
+    stages = {
+        name: {
+            "secs": statistics.median(secs[name]),
+            "peak_kb": run.peak_kb[name],
+        }
+        for name in STAGES
+    }
+    return {**sizes, "stages": stages}
+
+
+def run_series(name, quick, repeat):
+    param, values, quick_values, fixed = SERIES[name]
+    base = DesignParams(**fixed)
+    points = []
+    for n in quick_values if quick else values:
+        point = {"n": n, **measure(base.replace(**{param: n}), repeat)}
+        points.append(point)
+        print(
+            f"{name:>8} {param}={n:<5} nodes={point['nodes']:<7} "
+            + " ".join(
+                f"{s}={point['stages'][s]['secs']:.4f}" for s in STAGES
+            ),
+            file=sys.stderr,
+        )
+    ns = [point["n"] for point in points]
+    fits = {
+        s: fit(ns, [point["stages"][s]["secs"] for point in points])
+        for s in STAGES
+    }
+    return {"param": param, "points": points, "fit": fits}
+
+
+def point_secs(series, stage, ns):
+    return {
+        point["n"]: point["stages"][stage]["secs"]
+        for point in series["points"]
+        if point["n"] in ns
+    }
+
+
+# compare against a baseline, returns a list of regressions found. A stage
+# is slower by the median of its slowdown over the points of the series, so
+# a point measured during a hiccup of the machine does not make it fail
+def compare(results, baseline, threshold, exp_slack, min_secs):
+    regressions = []
+    for name, series in results["series"].items():
+        base = baseline["series"].get(name)
+        if base is None:
+            continue
+        ns = {p["n"] for p in series["points"]}
+        ns &= {p["n"] for p in base["points"]}
+        for stage in STAGES:
+            new = point_secs(series, stage, ns)
+            old = point_secs(base, stage, ns)
+            if max(sum(new.values()), sum(old.values())) < min_secs:
+                continue
+            slowdown = statistics.median(
+                new[n] / max(old[n], TINY) for n in ns
+            )
+            if slowdown > 1 + threshold:
+                regressions.append(
+                    f"{name}/{stage}: {sum(new.values()):.4f}s vs "
+                    f"{sum(old.values()):.4f}s in baseline (median "
+                    f"+{100 * (slowdown - 1):.0f}% per point)"
+                )
+            new_exp = series["fit"][stage]["exponent"]
+            old_exp = base["fit"][stage]["exponent"]
+            if len(ns) > 2 and new_exp > old_exp + exp_slack:
+                regressions.append(
+                    f"{name}/{stage}: grows as n^{new_exp:.2f}, "
+                    f"n^{old_exp:.2f} in baseline"
+                )
+    return regressions
+
+
+def print_fits(results):
+    print(f"{'series':>8} {'stage':>7} {'exponent':>8}  class")
+    for name, series in results["series"].items():
+        for stage, f in series["fit"].items():
+            print(
+                f"{name:>8} {stage:>7} {f['exponent']:8.2f}  {f['class']}"
+            )
+
+
+def main(argv=None):
+    cmdParser = argparse.ArgumentParser(
+        prog="python3 -m bench.scaling",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    cmdParser.add_argument(
+        "-series",
+        type=str,
+        default=",".join(SERIES),
+        help="comma separated series to run",
+    )
+    cmdParser.add_argument(
+        "-quick", action="store_true", help="run only the smaller sizes"
+    )
+    cmdParser.add_argument(
+        "-repeat",
+        type=int,
+        default=7,
+        help="runs per point, the median is kept",
+    )
+    cmdParser.add_argument(
+        "-json", type=str, default="", help="file where to save results"
+    )
+    cmdParser.add_argument(
+        "-baseline", type=str, default="", help="results to compare against"
+    )
+    cmdParser.add_argument(
+        "-threshold",
+        type=float,
+        default=0.25,
+        help="relative slowdown of a stage considered a regression",
+    )
+    cmdParser.add_argument(
+        "-exp_slack",
+        type=float,
+        default=0.5,
+        help="increase of the fitted exponent considered a regression",
+    )
+    cmdParser.add_argument(
+        "-min_secs",
+        type=float,
+        default=0.02,
+        help=(
+            "stages taking less than this over the points of a series are "
+            "not compared, their time being mostly noise"
+        ),
+    )
+    args = cmdParser.parse_args(argv)
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "series": {
+            name: run_series(name, args.quick, args.repeat)
+            for name in args.series.split(",")
+        },
+    }
+    print_fits(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(
+            results, baseline, args.threshold, args.exp_slack, args.min_secs
+        )
+        for msg in regressions:
+            print(f"REGRESSION: {msg}")
+        if regressions:
+            return 1
+        print("no regressions against", args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Empirical complexity of a stage from its time at several sizes
+# ------------------------------------------------------------------------------
+import math
+
+TINY = 1e-7  # seconds, below this a measure is noise
+
+CLASSES = {
+    "O(1)": lambda n: 1.0,
+    "O(log n)": lambda n: math.log(n + 1),
+    "O(n)": lambda n: n,
+    "O(n log n)": lambda n: n * math.log(n + 1),
+    "O(n^2)": lambda n: n * n,
+    "O(n^3)": lambda n: n * n * n,
+}
+
+
+def fit_power(ns, ts):
+    """least squares fit of t = coef * n^exp in log-log space, returns
+    (exp, coef)"""
+    xs = [math.log(n) for n in ns]
+    ys = [math.log(max(t, TINY)) for t in ts]
+    cnt = len(xs)
+    mx = sum(xs) / cnt
+    my = sum(ys) / cnt
+    sxx = sum((x - mx) ** 2 for x in xs)
+    if sxx == 0:
+        return 0.0, math.exp(my)
+    exp = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sxx
+    return exp, math.exp(my - exp * mx)
+
+
+def best_class(ns, ts):
+    """complexity class whose curve, scaled to fit, has the least relative
+    error against the measures"""
+    best = None
+    for name, f in CLASSES.items():
+        fs = [f(n) for n in ns]
+        coef = sum(t * v for t, v in zip(ts, fs)) / sum(v * v for v in fs)
+        err = sum(
+            ((t - coef * v) / max(t, TINY)) ** 2 for t, v in zip(ts, fs)
+        )
+        if best is None or err < best[1]:
+            best = (name, err)
+    return best[0]
+
+
+def fit(ns, ts):
+    exp, coef = fit_power(ns, ts)
+    return {"exponent": exp, "coef": coef, "class": best_class(ns, ts)}
@@ -0,0 +1,118 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Synthetic SmBegin/SmForever/SmEnd designs
+#
+# The body is a sequence of segments. Each segment is a nest of `depth`
+# loops (for or do-while, do-while with probability loop_mix) whose
+# innermost body is an if/else if chain of `fanout` branches, each one
+# ending in a `tick. There are as many segments as needed to get `ticks`
+# ticks (plus the ones needed after inner for loops). `decls` variables are
+# declared and used by the statements
+# ------------------------------------------------------------------------------
+import random
+
+
+class DesignParams:
+    def __init__(
+        self, ticks=16, depth=1, fanout=2, loop_mix=0.5, decls=4, seed=0
+    ):
+        self.ticks = ticks
+        self.depth = depth
+        self.fanout = fanout
+        self.loop_mix = loop_mix
+        self.decls = decls
+        self.seed = seed
+
+    def replace(self, **kwargs):
+        params = DesignParams(**vars(self))
+        for name, val in kwargs.items():
+            setattr(params, name, val)
+        return params
+
+
+class DesignGen:
+    def __init__(self, params):
+        self.params = params
+        self.rnd = random.Random(params.seed)
+        self.lines = []
+
+    def emit(self, level, text):
+        self.lines.append("    " * level + text)
+
+    def var(self):
+        return f"v{self.rnd.randrange(self.params.decls)}"
+
+    def stm(self, level):
+        v = self.var()
+        self.emit(level, f"{v} = {v} + {self.var()};")
+
+    def branches(self, level):
+        fanout = self.params.fanout
+        if fanout <= 1:
+            self.stm(level)
+            self.emit(level, "`tick;")
+            return
+        for k in range(fanout):
+            if k == 0:
+                head = "if (sel == 0) begin"
+            elif k < fanout - 1:
+                head = f"else if (sel == {k}) begin"
+            else:
+                head = "else begin"
+            self.emit(level, head)
+            self.stm(level + 1)
+            self.emit(level + 1, "`tick;")
+            self.emit(level, "end")
+
+    # a for loop may not run its body, so a loop holding one needs a tick
+    # after it to never go around without a tick. Returns the loop kind
+    def loop_nest(self, level, depth, seg):
+        if depth == 0:
+            self.branches(level)
+            return "if"
+        i = f"i{depth - 1}"
+        trips = seg % 5 + 2
+        if self.rnd.random() < self.params.loop_mix:
+            kind = "do"
+            self.emit(level, f"{i} = 0;")
+            self.emit(level, "do begin")
+        else:
+            kind = "for"
+            self.emit(
+                level, f"for ({i} = 0; {i} != {trips}; {i} = {i} + 1) begin"
+            )
+        self.stm(level + 1)
+        if self.loop_nest(level + 1, depth - 1, seg) == "for":
+            self.emit(level + 1, "`tick;")
+        if kind == "do":
+            self.emit(level + 1, f"{i} = {i} + 1;")
+            self.emit(level, f"end while ({i} != {trips});")
+        else:
+            self.emit(level, "end")
+        return kind
+
+    def text(self):
+        p = self.params
+        self.emit(0, "module synth(input clk, input rst_n, input [7:0] sel);")
+        self.emit(0, "SmBegin")
+        for d in range(p.depth):
+            self.emit(1, f"reg [7:0] i{d} = 0;")
+        for k in range(p.decls):
+            self.emit(1, f"reg [15:0] v{k} = {k};")
+        self.emit(0, "SmForever")
+        segments = max(1, p.ticks // max(1, p.fanout))
+        for seg in range(segments):
+            self.loop_nest(1, p.depth, seg)
+        self.emit(0, "SmEnd")
+        self.emit(0, "endmodule")
+        return "\n".join(self.lines) + "\n"
+
+
+def gen_design(params):
+    return DesignGen(params).text()
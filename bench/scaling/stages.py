@@ -0,0 +1,78 @@
+# ------------------------------------------------------------------------------
+# Apache 2.0. See LICENSE file on root folder.
+#
+# Copyright (c) 2022-Present Miguel A. Guerrero
+#
+# Please send bugs and suggestions to: miguel.a.guerrero@gmail.com
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Run the conversion of an SM block stage by stage, as
+# FsmConverterRTL.process_block does, measuring each stage
+# ------------------------------------------------------------------------------
+import time
+import tracemalloc
+from algofsm import cli
+from algofsm import dag_utils
+from algofsm import parse_input
+from algofsm import vlogparser
+from algofsm import fsm_converter_rtl
+
+STAGES = ("decls", "parse", "expand", "to_dag", "merge", "dump")
+
+
+class StageRun:
+    def __init__(self, trace_memory):
+        self.trace_memory = trace_memory
+        self.secs = {}
+        self.peak_kb = {}
+
+    def stage(self, name, fn, *args):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        ret = fn(*args)
+        self.secs[name] = time.perf_counter() - start
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.peak_kb[name] = (peak - base) / 1024
+        return ret
+
+
+def parse(inp, line_base, file_base):
+    p = vlogparser.VlogParser(inp, line_base, file_base)
+    return p, p.start_rule()
+
+
+# convert the first SM block of text. Returns the StageRun with the
+# measures, the number of nodes and states and the output size
+def run_stages(text, trace_memory=False):
+    blk = next(parse_input.scanText(text, "synth", passthrough=False))
+    conv = fsm_converter_rtl.FsmConverterRTL(cli.mainCmdParser([]), 0)
+    conv.prepare()
+    run = StageRun(trace_memory)
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        run.stage("decls", conv.extract_initial, blk.decl_in, 0)
+        inp = fsm_converter_rtl.FsmConverterRTL._expand_input(blk.inp)
+        p, root = run.stage("parse", parse, inp, blk.line_forever_base, "")
+        p.compact()
+        conv.parser, conv.root = p, root
+        expand = dag_utils.expand_tree_structs
+        run.stage("expand", expand, p, root, root, "", 0, 0)
+        p.compact()
+        run.stage("to_dag", dag_utils.convert_to_dag, p, root, root, "", 0, 0)
+        p.compact()
+        run.stage("merge", conv.merge_states, p, root, "")
+        p.compact()
+        out = run.stage("dump", conv.dump_dag_sm, p, root, "", 0, "")
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    sizes = {
+        "nodes": len(p.nodes),
+        "states": len(conv.rename_state),
+        "out_bytes": len(out),
+    }
+    return run, sizes
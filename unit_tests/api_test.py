@@ -0,0 +1,87 @@
+import io
+import os
+import subprocess
+import unittest
+import sys
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append("..")
+import algofsm
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DESIGNS = ["matmul3", "for1", "tpg2", "spi-s"]
+
+
+def design_file(design):
+    return os.path.join(ROOT, "tests", design, "design.v")
+
+
+def read_design(design):
+    with open(design_file(design)) as f:
+        return f.read()
+
+
+def run_cli(design, *opts):
+    return subprocess.run(
+        [
+            sys.executable,
+            os.path.join(ROOT, "algo_fsm.py"),
+            design_file(design),
+            *opts,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+class Testing(unittest.TestCase):
+    def test_same_as_cli(self):
+        res = algofsm.convert(read_design("matmul3"))
+        self.assertEqual(res.output, run_cli("matmul3"))
+        self.assertEqual(res.blocks, 2)
+        self.assertEqual(res.warnings, [])
+        res = algofsm.convert(
+            read_design("matmul3"), {"behav": True}, design_file("matmul3")
+        )
+        self.assertEqual(res.output, run_cli("matmul3", "-behav"))
+
+    def test_threads(self):
+        texts = [read_design(d) for d in DESIGNS]
+        serial = [algofsm.convert(t).output for t in texts]
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            outs = pool.map(lambda t: algofsm.convert(t).output, texts * 4)
+            outs = list(outs)
+        self.assertEqual(outs, serial * 4)
+
+    def test_error_location(self):
+        text = "module a;\nSmBegin\nreg x;\nSmForever\nx = 1;\nSmEnd\n"
+        with self.assertRaises(algofsm.AlgoFsmError) as cm:
+            algofsm.convert(text, file="a.v")
+        self.assertEqual((cm.exception.file, cm.exception.line), ("a.v", 2))
+        with self.assertRaises(algofsm.AlgoFsmError) as cm:
+            algofsm.convert("a\nb\nSmBegin\nreg x=0;\n", file="b.v")
+        self.assertIn("SmForever section not found", cm.exception.msg)
+        self.assertEqual(cm.exception.line, 3)
+        f = io.StringIO()
+        cm.exception.report(f)
+        self.assertTrue(f.getvalue().startswith("ERROR: b.v:3: SmCombo"))
+
+    def test_syntax_error(self):
+        text = "SmBegin\nreg x=0;\nSmForever\nif (x begin\nend\nSmEnd\n"
+        with self.assertRaises(algofsm.AlgoFsmError) as cm:
+            algofsm.convert(text, file="c.v")
+        self.assertEqual(cm.exception.file, "c.v")
+        self.assertIn("<--", cm.exception.details)
+
+    def test_warnings(self):
+        res = algofsm.convert("module a;\nendmodule\n")
+        self.assertEqual(res.output, "module a;\nendmodule\n")
+        self.assertEqual(res.warnings, ["SmBegin section not found"])
+
+    def test_unknown_option(self):
+        with self.assertRaises(ValueError):
+            algofsm.convert("", {"jobs": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+import sys
+sys.path.append("..")
+import algo_fsm
+import algofsm.batch as batch
+
+TESTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../tests")
+
+
+class Testing(unittest.TestCase):
+    def test_batch_same_as_separate(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            designs = ["matmul3", "for1", "matmul3"]
+            pairs = [
+                (os.path.join(TESTS, d, "design.v"), os.path.join(tmp, f"{i}"))
+                for i, d in enumerate(designs)
+            ]
+            manifest = os.path.join(tmp, "manifest")
+            with open(manifest, "w") as f:
+                print("# comment", file=f)
+                for src, dst in pairs[1:]:
+                    print(src, dst, file=f)
+            args = algo_fsm.mainCmdParser(
+                ["-pair", *pairs[0], "-batch", manifest]
+            )
+            self.assertEqual(batch.getPairs(args), pairs)
+            results = batch.convertBatch(args, pairs)
+            self.assertTrue(all(res.ok for res in results))
+            with open(pairs[0][1]) as f0, open(pairs[2][1]) as f2:
+                # numbering restarts for each file
+                self.assertEqual(f0.read(), f2.read())
+
+    def test_failure_reported(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "in.v")
+            with open(src, "w") as f:
+                print("SmBegin\nreg a=0;\nSmForever\na = 1;\n", file=f)
+            args = algo_fsm.mainCmdParser(["-pair", src, src + ".out"])
+            results = batch.convertBatch(args, batch.getPairs(args))
+            self.assertFalse(results[0].ok)
+            self.assertIn("SmEnd not found", results[0].msgs)
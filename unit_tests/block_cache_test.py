@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+import unittest
+import sys
+sys.path.append("..")
+import algo_fsm
+import algofsm.block_cache as block_cache
+import algofsm.parse_input as parse_input
+import algofsm.utils as utils
+
+TESTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../tests")
+
+
+class Testing(unittest.TestCase):
+    def convert(self, tmp, *opts):
+        out = os.path.join(tmp, "out.v")
+        args = algo_fsm.mainCmdParser(
+            [os.path.join(TESTS, "matmul3/design.v"), "-out", out, *opts]
+        )
+        parse_input.parseInputFile(args)
+        with open(out) as f:
+            return f.read()
+
+    def test_hit_matches_fresh(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            fresh = self.convert(tmp)
+            cache_dir = os.path.join(tmp, "cache")
+            self.assertEqual(self.convert(tmp, "-cache", cache_dir), fresh)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            self.assertEqual(self.convert(tmp, "-cache", cache_dir), fresh)
+            self.assertEqual(
+                self.convert(tmp, "-cache", cache_dir, "-cache_verify"),
+                fresh,
+            )
+            # a different option gets its own entries
+            self.convert(tmp, "-cache", cache_dir, "-prefix", "ST")
+            self.assertEqual(len(os.listdir(cache_dir)), 4)
+
+    def test_lru_eviction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = block_cache.BlockCache(tmp, 90)
+            cache.put("a", "x" * 10)
+            cache.put("b", "y" * 10)
+            os.utime(os.path.join(tmp, "a.json"), (0, 0))
+            self.assertEqual(cache.get("b"), ("y" * 10, []))
+            cache.put("c", "z" * 10, ["w"])
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual(cache.get("b"), ("y" * 10, []))
+            self.assertEqual(cache.get("c"), ("z" * 10, ["w"]))
+            self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_hit_warns(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_dir = os.path.join(tmp, "cache")
+            self.convert(tmp, "-cache", cache_dir)
+            names = sorted(os.listdir(cache_dir))
+            for name in names:  # as if each conversion warned its name
+                path = os.path.join(cache_dir, name)
+                with open(path) as f:
+                    entry = json.load(f)
+                with open(path, "w") as f:
+                    json.dump(dict(entry, warnings=[name]), f)
+            for jobs in ("1", "2"):
+                with utils.collect_warnings() as warnings:
+                    self.convert(tmp, "-cache", cache_dir, "-jobs", jobs)
+                self.assertEqual(sorted(warnings), names)
+    def test_prep_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            header = os.path.join(tmp, "defs.vh")
+            with open(header, "w") as f:
+                f.write("`define N 4\n")
+            design = os.path.join(tmp, "design.v")
+            with open(design, "w") as f:
+                f.write('`include "defs.vh"\nwire [`N:0] w;\n')
+            out = os.path.join(tmp, "out.v")
+            opts = [design, "-out", out, "-prep", "-deps"]
+            opts += ["-cache", os.path.join(tmp, "cache")]
+            args = algo_fsm.mainCmdParser(opts)
+            cache = parse_input.parseInputFile(args)
+            self.assertEqual((cache.prep_hits, cache.prep_misses), (0, 1))
+            cache = parse_input.parseInputFile(args)
+            self.assertEqual((cache.prep_hits, cache.prep_misses), (1, 0))
+            with open(os.path.join(tmp, "out.d")) as f:
+                self.assertEqual(
+                    f.read(), f"{out}: {design} {header}\n\n{header}:\n"
+                )
+            # a change in the included file is seen
+            with open(header, "w") as f:
+                f.write("`define N 8\n")
+            cache = parse_input.parseInputFile(args)
+            self.assertEqual((cache.prep_hits, cache.prep_misses), (0, 1))
+            with open(out) as f:
+                self.assertIn("wire [8:0] w;", f.read())
@@ -0,0 +1,46 @@
+import contextlib
+import io
+import unittest
+import sys
+sys.path.append("..")
+import algo_fsm
+
+# options of the first release: value given, attribute set and its value
+HISTORIC = {
+    "-out": (["o.v"], "out", "o.v"),
+    "-behav": ([], "behav", True),
+    "-clk": (["ck"], "clk", "ck"),
+    "-rst": (["rs"], "rst", "rs"),
+    "-ena": (["en"], "ena", "en"),
+    "-sd": (["2"], "sd", "#2 "),
+    "-prefix": (["P"], "prefix", "P"),
+    "-state": (["st"], "state", "st"),
+    "-name": (["nm"], "name", "nm"),
+    "-indent": (["2"], "indent", 2),
+    "-state_suffix": (["_q"], "state_suffix", "_q"),
+    "-dbg": (["2"], "dbg", 2),
+}
+
+
+class Testing(unittest.TestCase):
+    def test_historic_abbrev(self):
+        # every prefix that was unique among the first options still
+        # selects the same one
+        for opt, (value, attr, expected) in HISTORIC.items():
+            for end in range(2, len(opt) + 1):
+                abbrev = opt[:end]
+                same = [o for o in HISTORIC if o.startswith(abbrev)]
+                if abbrev != opt and same != [opt]:
+                    continue
+                args = algo_fsm.mainCmdParser([abbrev] + value)
+                self.assertEqual(getattr(args, attr), expected, abbrev)
+
+    def test_abbrev(self):
+        self.assertTrue(algo_fsm.mainCmdParser(["-che"]).check)
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                algo_fsm.mainCmdParser(["-st", "x"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import sys
+sys.path.append("..")
+import algofsm
+from algofsm import cli
+from algofsm import comb_depth
+from algofsm.vlog_expr import parse
+
+TEXT = """module m(input clk, input rst_n, input go, input [7:0] x, y);
+SmBegin
+   reg [15:0] a = 0;
+   reg [15:0] b = 0;
+   reg [15:0] c = 0;
+SmForever
+   while (~go) `tick;
+   a = x * y;
+   b = a * x;
+   c = b + a;
+   if (c > a)
+      a = 0;
+   `tick;
+SmEnd
+endmodule
+"""
+
+
+def convert(text, **options):
+    return algofsm.convert(text, options, "t.v")
+
+
+class Testing(unittest.TestCase):
+    def test_expr(self):
+        est = comb_depth.DepthEstimator(comb_depth.COSTS)
+        path = comb_depth.Path({"a": 5})
+        self.assertEqual(est.expr(parse("a + b * c"), path), 16)
+        self.assertEqual(est.expr(parse("(a << 2) & b"), path), 6)
+        self.assertEqual(est.expr(parse("b[c] ? a : 0"), path), 6)
+        done = est.statement("b = a + 1", est.cond("c == 0", path))
+        self.assertEqual(done.depths["b"], 9)
+        self.assertEqual(done.added(path), 9)
+
+    def test_split(self):
+        res = convert(TEXT, max_depth=20)
+        self.assertIn(
+            "// -max_depth 20: cycles added before\n"
+            "//   line 9: 1\n"
+            "//   line 11: 1\n",
+            res.output,
+        )
+        self.assertIn("localparam SM0_3 = 3;", res.output)
+        self.assertEqual(res.warnings, [])
+        # the code of each state as written fits within the budget
+        res = convert(TEXT, max_depth=20, depth_cost=["*=2"])
+        self.assertNotIn("cycles added", res.output)
+        self.assertNotIn("max_depth", convert(TEXT).output)
+
+    def test_too_deep(self):
+        res = convert(TEXT, max_depth=10)
+        self.assertEqual(
+            res.warnings,
+            [
+                "SM0: line 8 takes 12 logic levels alone, more than "
+                "-max_depth 10",
+                "SM0: line 9 takes 12 logic levels alone, more than "
+                "-max_depth 10",
+            ],
+        )
+        with self.assertRaises(algofsm.AlgoFsmError):
+            convert(TEXT, max_depth=10, depth_cost=["@=1"])
+
+    def test_options(self):
+        args = cli.mainCmdParser(["d.v", "-o", "o.v", "-depth_cost", "*=6"])
+        self.assertEqual((args.out, args.depth_cost), ("o.v", ["*=6"]))
+
+    def test_latency(self):
+        out = convert(TEXT, max_depth=20, latency=True).output
+        self.assertIn("line 6 SmForever: 4 + 1*N7", out)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import re
+import unittest
+import sys
+sys.path.append("..")
+import algofsm
+from algofsm import state_encoding
+
+# a ring of 8 states
+RING = (
+    "module m(input clk, input rst_n);\n"
+    "SmBegin\n"
+    "   reg [2:0] a = 0;\n"
+    "SmForever\n"
+    + "".join(f"    a = {i};\n    `tick;\n" for i in range(7))
+    + "SmEnd\nendmodule\n"
+)
+
+
+def convert(text, **options):
+    return algofsm.convert(text, options, "t.v").output
+
+
+def transitions(out):
+    codes = dict(re.findall(r"localparam (SM0_\d+) = \d+'b(\d+);", out))
+    trans = []
+    for item in re.split(r"\n\s*(?=SM0_\d+: begin)", out)[1:]:
+        src = item.split(":")[0]
+        for dst in re.findall(r"state0 = (SM0_\d+);", item):
+            trans.append((codes[src], codes[dst]))
+    return trans
+
+
+class Testing(unittest.TestCase):
+    def test_codes(self):
+        self.assertEqual(
+            [state_encoding.grayCode(i) for i in range(8)],
+            [0, 1, 3, 2, 6, 7, 5, 4],
+        )
+        self.assertEqual(
+            [f"{state_encoding.johnsonCode(i, 4):04b}" for i in range(8)],
+            ["0000", "0001", "0011", "0111",
+             "1111", "1110", "1100", "1000"],
+        )
+
+    def test_auto(self):
+        for num_states, avg_fanout, kind in (
+            (3, 1, "binary"),
+            (10, 1.2, "gray"),
+            (10, 2, "onehot"),
+            (100, 1, "gray"),
+        ):
+            self.assertEqual(
+                state_encoding.autoEncoding(num_states, avg_fanout), kind
+            )
+
+    def test_single_bit_transitions(self):
+        for kind, width in (("gray", 3), ("johnson", 4)):
+            out = convert(RING, encoding=kind)
+            self.assertIn(f"reg [{width - 1}:0] state0_r", out)
+            trans = transitions(out)
+            self.assertEqual(len(trans), 8)
+            for src, dst in trans:
+                diff = sum(a != b for a, b in zip(src, dst))
+                self.assertEqual(diff, 1, (kind, src, dst))
+
+    def test_onehot(self):
+        out = convert(RING, encoding="onehot")
+        self.assertIn("reg [7:0] state0_r", out)
+        self.assertIn("state0_r <= 8'd1 << SM0_0;", out)
+        self.assertIn("case (1'b1)", out)
+        self.assertIn("state0_r[SM0_0]: begin", out)
+        self.assertIn("state0 = 8'd1 << SM0_1;", out)
+
+    def test_binary_default(self):
+        self.assertEqual(convert(RING), convert(RING, encoding="binary"))
+
+
+if __name__ == "__main__":
+    unittest.main()
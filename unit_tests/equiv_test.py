@@ -0,0 +1,124 @@
+import os
+import random
+import unittest
+import sys
+sys.path.append("..")
+import algofsm
+from algofsm import equiv
+from algofsm import vlog_expr
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+DO_WHILE = """
+module m(input clk, input rst_n, input [3:0] n);
+SmBegin
+   reg [7:0] acc = 0;
+   reg [3:0] i = 0;
+SmForever
+    i = 0;
+    do begin
+        acc = acc + 1;
+        i = i + 1;
+    end while (i != n);
+    `tick;
+SmEnd
+endmodule
+"""
+
+TASK = """
+module m(input clk, input rst_n);
+task show;
+    if (1) $display("x");
+endtask
+SmBegin
+   reg [7:0] x = 0;
+SmForever
+    show;
+    `tick;
+SmEnd
+endmodule
+"""
+
+
+def check(text, file="t.v", **options):
+    options = dict(equiv=True, equiv_lanes=64, equiv_cycles=200, **options)
+    return algofsm.convert(text, options, file).output
+
+
+def checkDesign(design, **options):
+    file = os.path.join(ROOT, "tests", design, "design.v")
+    with open(file) as f:
+        text = f.read()
+    return check(text, file, prep=True, **options)
+
+
+@unittest.skipIf(equiv.np is None, "needs NumPy")
+class Testing(unittest.TestCase):
+    def test_translate(self):
+        np = equiv.np
+        regs = {"x": 8, "y": 12, "go": 1}
+        rnd = random.Random(1)
+        lanes = [
+            dict(x=rnd.randrange(256), y=rnd.randrange(4096), go=g)
+            for g in (0, 1)
+            for _ in range(8)
+        ]
+        env = {
+            name: np.array([lane[name] for lane in lanes], np.uint64)
+            for name in regs
+        }
+        tr = vlog_expr.Translator(lambda n: (n, regs[n]), {"PW": 8})
+        vtr = equiv.VectorTranslator(lambda n: (n, regs[n]), {"PW": 8})
+        for expr in (
+            "x + 8'h20",
+            "x - 'hf1",
+            "go ? x - 1 : y",
+            "&x[7:4] && |y || !go",
+            "^y ~^ x[PW-1]",
+            "{2{go, 1'b0}} == 4'b1010",
+            "(x << 4) >> y[1:0]",
+            "-x",
+        ):
+            node = vlog_expr.parse(expr)
+            got = eval(vtr.clean(node), equiv.vectorGlobals(), dict(env))
+            expected = [eval(tr.clean(node), dict(lane)) for lane in lanes]
+            got = np.broadcast_to(got, len(lanes)).tolist()
+            self.assertEqual(got, expected, expr)
+
+    def test_designs(self):
+        for design in ("for1", "tpg3", "motor", "test_seq2"):
+            report = checkDesign(design)
+            self.assertRegex(
+                report,
+                rf"^SM0 .*{design}/design.v:\d+: equivalent over 64 lanes "
+                r"x 200 cycles \(\d+ registers, \d+ states\). "
+                r"Instance-cycles/s: code \S+, FSM \S+\n$",
+            )
+        report = checkDesign("matmul1", ena="sm_ena", factorize=True)
+        self.assertEqual(report.count("equivalent"), 2)
+
+    def test_divergence(self):
+        # a do/while without `tick is left out of the RTL
+        with self.assertRaises(algofsm.AlgoFsmError) as cm:
+            check(DO_WHILE)
+        msg = str(cm.exception)
+        self.assertRegex(
+            msg,
+            r"^SM0 -equiv: lane \d+ differs at cycle 1 \(seed 1\) stepping "
+            r"from `tick 0 in the code, state SM0_0 in the FSM with n=0x\w+: "
+            r"acc is 0x\w+ in the code, 0x1 in the FSM",
+        )
+
+    def test_errors(self):
+        for text, msg in (
+            (TASK, "SM0 -equiv: task show can't be modeled"),
+            (DO_WHILE.replace("[7:0] acc", "[79:0] acc"),
+             "SM0 -equiv: acc is wider than 64 bits"),
+        ):
+            with self.assertRaises(algofsm.AlgoFsmError) as cm:
+                check(text)
+            self.assertIn(msg, str(cm.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
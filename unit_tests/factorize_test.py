@@ -0,0 +1,63 @@
+import os
+import re
+import unittest
+import sys
+sys.path.append("..")
+import algofsm
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def read_design(design):
+    with open(os.path.join(ROOT, "tests", design, "design.v")) as f:
+        return f.read()
+
+
+# chain of if/else that may tick on one side, otherwise reconverging
+def chain(depth):
+    lines = ["SmBegin", "reg [15:0] a = 0;", "SmForever"]
+    for k in range(depth):
+        lines.append(f"if (c[{k}]) begin a = a + {k}; if (d[{k}]) `tick;")
+        lines.append("end")
+        lines.append(f"else a = a - {k};")
+    lines += ["a = 0;", "`tick;", "SmEnd"]
+    return "\n".join(lines) + "\n"
+
+
+def first_state(out):
+    return re.split(r"\n\s*\w+: begin\n", out)[1]
+
+
+class Testing(unittest.TestCase):
+    def test_size_limit(self):
+        with self.assertRaises(algofsm.AlgoFsmError) as cm:
+            algofsm.convert(chain(16), {"max_state_size": 0.5})
+        msg = str(cm.exception)
+        self.assertIn("state SM0_0 exceeds -max_state_size", msg)
+        opts = {"max_state_size": 0.5, "factorize": True}
+        out = algofsm.convert(chain(16), opts).output
+        self.assertIn("reg state0_join0;", out)
+        self.assertIn("state0_join0 = 0;", out)
+
+    def test_linear(self):
+        opts = {"factorize": True}
+        small = first_state(algofsm.convert(chain(10), opts).output)
+        big = first_state(algofsm.convert(chain(20), opts).output)
+        self.assertLess(len(big), 2.5 * len(small))
+        # the tail after the chain is emitted once
+        self.assertEqual(big.count("a = 0;"), 1)
+
+    def test_designs(self):
+        text = read_design("matmul3")
+        out = algofsm.convert(text).output
+        self.assertEqual(algofsm.convert(text, {"factorize": True}).output, out)
+        # reconverging paths within a state, shared code closes the if/else
+        text = read_design("for2")
+        out = algofsm.convert(text).output
+        fact = algofsm.convert(text, {"factorize": True}).output
+        self.assertLess(fact.count("cnt = cnt+1;"), out.count("cnt = cnt+1;"))
+        self.assertNotIn("_join", fact)
+
+
+if __name__ == "__main__":
+    unittest.main()
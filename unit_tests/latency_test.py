@@ -0,0 +1,92 @@
+import json
+import unittest
+import sys
+sys.path.append("..")
+import algofsm
+
+TEXT = """module m(input clk, input rst_n, input go, input [3:0] n);
+SmBegin
+   reg [3:0] i = 0;
+   reg done = 0;
+SmForever
+   while (~go) `tick;
+   /// started
+   if (n[0]) begin
+      `tick;
+      `tick;
+   end
+   else
+      `tick;
+   for (i = 0; i < n; i = i + 1) begin
+      `tick;
+   end
+   while (i != 0) i = i - 1;
+   done = 1;
+   `tick;
+   /// finished
+   done = 0;
+SmEnd
+endmodule
+"""
+
+NESTED = """module m(input clk, input rst_n, input [3:0] n);
+SmBegin
+   reg [3:0] i = 0;
+   reg [3:0] j = 0;
+SmForever
+   for (i = 0; i < n; i = i + 1) begin
+      j = 0;
+      do begin
+         `tick;
+         j = j + 1;
+      end while (j != n);
+      `tick;
+   end
+SmEnd
+endmodule
+"""
+
+
+def latency(text, **options):
+    options["latency"] = True
+    return algofsm.convert(text, options, "t.v").output
+
+
+class Testing(unittest.TestCase):
+    def test_text(self):
+        out = latency(TEXT)
+        for line in (
+            "line 5 SmForever: 3..4 + 1*N6 + 1*N14",
+            "line 6 wait (~go): 1",
+            "line 14 for (i < n): 1",
+            "line 17 while (i != 0): 0, within a state",
+            "line 7 /// started: 0 + 1*N6",
+            "line 20 /// finished: 2..3 + 1*N6 + 1*N14",
+        ):
+            self.assertIn(line, out)
+
+    def test_json(self):
+        report = json.loads(latency(TEXT, latency_format="json"))
+        self.assertEqual(report["file"], "t.v")
+        (block,) = report["blocks"]
+        loops = {info["line"]: info for info in block["loops"]}
+        self.assertEqual(
+            (loops[5]["min"], loops[5]["max"], loops[5]["iterated"]),
+            (3, 4, [6, 14]),
+        )
+        self.assertTrue(loops[6]["wait"])
+        self.assertEqual(loops[14]["cond"], "i < n")
+        markers = [(m["line"], m["text"], m["min"], m["max"])
+                   for m in block["markers"]]
+        self.assertEqual(markers, [(7, "started", 0, 0),
+                                   (20, "finished", 2, 3)])
+
+    def test_nested(self):
+        out = latency(NESTED)
+        self.assertIn("line 5 SmForever: 1 + C6*N6\n", out)
+        self.assertIn("line 6 for (i < n): 1 + 1*N8\n", out)
+        self.assertIn("line 8 do (j != n): 1\n", out)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+import sys
+sys.path.append("..")
+import algofsm.vlogparser as vlogparser
+
+
+def lex(inp):
+    p = vlogparser.VlogParser(inp, 0, "test")
+    out = []
+    while True:
+        p.get_token()
+        tok = p.parse_last_token
+        out.append((tok.name, p.parse_token_text))
+        if tok == p.tokens.TK_EOF:
+            return out
+
+
+class Testing(unittest.TestCase):
+    def test_keywords_before_sentence(self):
+        toks = [name for name, _ in lex("while (x) `tick;")]
+        self.assertEqual(
+            toks,
+            ["TK_WHILE", "TK_OPEN_PAR", "TK_SN", "TK_SEMICOLON", "TK_EOF"],
+        )
+
+    def test_keyword_needs_word_boundary(self):
+        self.assertEqual(lex("ifx = 1;")[0], ("TK_SN", "ifx = 1"))
+
+    def test_skip_comments_and_ws(self):
+        toks = lex("  // skipped\n/// kept\n  a = 1;")
+        self.assertEqual(toks[0], ("TK_PRSLCOMMENT", "/// kept\n"))
+        self.assertEqual(toks[1], ("TK_SN", "a = 1"))
+
+    def test_eof_without_semicolon(self):
+        self.assertEqual(lex("a = 1")[0][0], "TK_EOF")
+
+    def test_location(self):
+        p = vlogparser.VlogParser("  begin end", 0, "f")
+        p.get_token()
+        self.assertEqual(p.parse_last_loc_beg, "f:0")
+        self.assertEqual(p.parse_last_loc_end, "f:6")
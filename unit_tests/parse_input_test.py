@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+import sys
+sys.path.append("..")
+import algo_fsm
+import algofsm.parse_input as parse_input
+
+TESTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../tests")
+
+
+def convert(design, *opts):
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "out.v")
+        args = algo_fsm.mainCmdParser(
+            [os.path.join(TESTS, design), "-out", out, *opts]
+        )
+        parse_input.parseInputFile(args)
+        with open(out) as f:
+            return f.read()
+
+
+class Testing(unittest.TestCase):
+    def test_jobs_same_output(self):
+        serial = convert("matmul3/design.v")
+        self.assertIn("AlgoFSM1", serial)
+        self.assertEqual(convert("matmul3/design.v", "-jobs", "2"), serial)
+
+    def test_jobs_same_output_behav(self):
+        serial = convert("matmul3/design.v", "-behav")
+        self.assertEqual(
+            convert("matmul3/design.v", "-behav", "-jobs", "2"), serial
+        )
+
+    def test_scan(self):
+        txt = (
+            "module a;\r\n"
+            "  SmBegin \r\n"
+            "reg x = 0;\r\n"
+            "SmForever\n"
+            "  SmDecl: reg y = 1;\n"
+            "x = 1;\n"
+            "SmEnd\n"
+            "endmodule"
+        )
+        saved = parse_input.CHUNK_SIZE
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "in.v")
+            with open(src, "w", newline="") as f:
+                f.write(txt)
+            args = algo_fsm.mainCmdParser([src])
+            try:
+                parse_input.CHUNK_SIZE = 4
+                items = list(parse_input.scanInputFile(args))
+            finally:
+                parse_input.CHUNK_SIZE = saved
+        self.assertEqual(items[0], "module a;\n")
+        blk = items[1]
+        self.assertEqual(blk.decl_in, "reg x = 0;\n  reg y = 1;\n")
+        self.assertEqual(blk.inp, "x = 1;\n")
+        self.assertEqual((blk.line_decl_base, blk.line_forever_base), (2, 4))
+        self.assertEqual("".join(items[2:]), "endmodule")
@@ -0,0 +1,76 @@
+import unittest
+import sys
+sys.path.append("..")
+import algofsm
+
+TEXT = """module m(input clk, input rst_n, input go);
+SmBegin
+   reg a = 0;
+SmForever
+   while (~go) `tick;
+   if (a) begin
+      `tick;
+      `tick;
+   end
+   else
+      `tick;
+   a = ~a;
+SmEnd
+endmodule
+"""
+
+
+def convert(text, **options):
+    return algofsm.convert(text, options, "t.v").output
+
+
+class Testing(unittest.TestCase):
+    def test_states(self):
+        out = convert(TEXT, perfcounters=True, perfcounters_width=16)
+        for line in (
+            "`ifdef ALGOFSM_PERFCOUNTERS",
+            "//   0 SM0_0: tick at lines 4, 5",
+            "//   2 SM0_2: tick at lines 8, 11",
+            "reg [15:0] algofsm0_cycles [0:2];",
+            "algofsm0_cycles[algofsm0_i] <= 0;",
+            "if (~&algofsm0_cycles[1]) algofsm0_cycles[1] <= "
+            "algofsm0_cycles[1] + 1;",
+            "task algofsm0_perf_report;",
+            '$display("    SM0_2 (tick at lines 8, 11): %0d", '
+            "algofsm0_cycles[2]);",
+        ):
+            self.assertIn(line, out)
+        self.assertNotIn("algofsm0_transitions", out)
+
+    def test_transitions(self):
+        out = convert(TEXT, perfcounters=True, perfcounters_transitions=True)
+        self.assertIn("reg [31:0] algofsm0_transitions [0:4];", out)
+        self.assertIn("//   3 SM0_1 -> SM0_2", out)
+        # the transition out of a state with a single one is always taken
+        self.assertIn(
+            "SM0_1: begin\n"
+            "                state0 = SM0_2;\n"
+            "                `ifdef ALGOFSM_PERFCOUNTERS\n"
+            "                if (~&algofsm0_cycles[1]) algofsm0_cycles[1] <= "
+            "algofsm0_cycles[1] + 1;\n"
+            "                if (~&algofsm0_transitions[3]) ",
+            out,
+        )
+        self.assertIn(
+            "SM0_0: if (~&algofsm0_transitions[0]) algofsm0_transitions[0]",
+            out,
+        )
+        out = convert(
+            TEXT, perfcounters=True, perfcounters_transitions=True,
+            encoding="onehot",
+        )
+        self.assertIn("state0[SM0_0]: if (~&algofsm0_transitions[0])", out)
+
+    def test_off(self):
+        self.assertNotIn("ALGOFSM_PERFCOUNTERS", convert(TEXT))
+        with self.assertRaises(algofsm.AlgoFsmError):
+            convert(TEXT, perfcounters=True, perfcounters_width=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import sys
+sys.path.append("..")
+import algofsm
+
+# the `tick at lines 7 and 16 and the code around them can't be reached
+DEAD = """module m(input clk, input rst_n, input go);
+SmBegin
+   reg a = 0;
+SmForever
+   if (0) begin
+      a = 1;
+      `tick;
+      a = 0;
+   end
+   while (go) `tick;
+   while (1) begin
+      a = ~a;
+      `tick;
+   end
+   a = 0;
+   `tick;
+   a = 1;
+SmEnd
+endmodule
+"""
+
+
+class Testing(unittest.TestCase):
+    def test_dropped(self):
+        res = algofsm.convert(DEAD, {}, "t.v")
+        self.assertEqual(
+            res.warnings,
+            ["SM0: dropped 2 states (`tick at lines 7, 16) and 4 statements "
+             "the FSM can't reach"],
+        )
+        out = res.output
+        self.assertIn("reg [0:0] state0_r, state0;", out)
+        self.assertNotIn("SM0_2", out)
+        self.assertNotIn("a = 1;", out)
+        self.assertIn(
+            "SM0_0: begin\n"
+            "                if (!(go)) begin\n"
+            "                    a = ~a;\n"
+            "                    state0 = SM0_1;\n",
+            out,
+        )
+
+    def test_statements_only(self):
+        text = DEAD.replace("   `tick;\n   a = 1;\n", "")
+        res = algofsm.convert(text, {}, "t.v")
+        self.assertEqual(
+            res.warnings,
+            ["SM0: dropped 1 state (`tick at line 7) and 3 statements the "
+             "FSM can't reach"],
+        )
+        text = text.replace("      a = 1;\n      `tick;\n      a = 0;\n",
+                            "      a = 1;\n")
+        res = algofsm.convert(text, {}, "t.v")
+        self.assertEqual(
+            res.warnings, ["SM0: dropped 1 statement the FSM can't reach"]
+        )
+
+    def test_nothing_dropped(self):
+        text = DEAD.replace("if (0)", "if (go)").replace("while (1)", "while (~go)")
+        self.assertEqual(algofsm.convert(text, {}, "t.v").warnings, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,273 @@
+import os
+import random
+import unittest
+import sys
+sys.path.append("..")
+import algofsm
+from algofsm import vlog_expr
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def models(design, **options):
+    file = os.path.join(ROOT, "tests", design, "design.v")
+    with open(file) as f:
+        text = f.read()
+    options = dict(prep=True, pymodel=True, **options)
+    res = algofsm.convert(text, options, file)
+    ns = {}
+    exec(res.output, ns)
+    return [cls() for cls in ns["MODELS"]]
+
+
+# --- the algorithms of the designs written in Python, a yield per `tick
+def for1():
+    while True:
+        cnt = 0
+        for y in range(5):
+            for x in range(10):
+                cnt += 1
+                yield dict(cnt=cnt, x=x, y=y)
+            yield dict(cnt=cnt, x=10, y=y)
+        yield dict(cnt=cnt, x=10, y=5)
+
+
+def forLoops():
+    cnt = 0
+    while True:
+        for z in range(5):
+            for y in range(10):
+                for x in range(15):
+                    cnt = (cnt + 1) & 0xFF
+                    yield dict(cnt=cnt, x=x, y=y, z=z)
+
+
+def tpgLine(s, t):
+    if s["x"] == t["tHS_START"]:
+        s["hs"] = 1
+    elif s["x"] == t["tHS_END"]:
+        s["hs"] = 0
+    if s["x"] == t["tHACT_START"]:
+        s["vld"] = s["y_active"]
+    elif s["x"] == t["tHACT_END"]:
+        s["vld"] = 0
+    if s["vld"]:
+        s["cnt"] = (s["cnt"] + 1) & 0xFF
+
+
+def tpgFrame(s, t):
+    if s["y"] == t["tVS_START"]:
+        s["vs"] = 1
+    elif s["y"] == t["tVS_END"]:
+        s["vs"] = 0
+    if s["y"] == t["tVACT_START"]:
+        s["y_active"] = 1
+    elif s["y"] == t["tVACT_END"]:
+        s["y_active"] = 0
+
+
+def tpg(t, variant):
+    s = dict(hs=0, vs=0, vld=0, y_active=0, cnt=0, x=0, y=0)
+    while True:
+        s["y"] = 0
+        while variant != 3 or s["y"] != t["tV_END"]:
+            s["x"] = 0
+            while variant != 3 or s["x"] != t["tH_END"]:
+                tpgLine(s, t)
+                if variant != 3:
+                    s["x"] += 1
+                yield dict(s)
+                if variant == 3:
+                    s["x"] += 1
+                elif s["x"] == t["tH_END"]:
+                    break
+            tpgFrame(s, t)
+            if variant == 1:
+                s["y"] += 1
+            yield dict(s)
+            if variant != 1:
+                s["y"] += 1
+            if variant != 3 and s["y"] == t["tV_END"]:
+                break
+        yield dict(s)
+
+
+def motor(inputs):
+    s = dict(motor_up=0, motor_dn=0)
+
+    def wait1(name):
+        yield dict(s)
+        while not inputs[name]:
+            yield dict(s)
+
+    while True:
+        out = "motor_dn" if inputs["up_limit"] else "motor_up"
+        until = "dn_limit" if inputs["up_limit"] else "up_limit"
+        yield from wait1("activate")
+        s[out] = 1
+        yield from wait1(until)
+        s[out] = 0
+        yield dict(s)
+
+
+# --- two cycle latency memory of models/mem.v next to the SM blocks of a
+# --- design, returns the memory accesses done and when ret was first set
+def runMemory(blocks, params, cycles):
+    accesses = []
+    rdata = vld = raw = raw_vld = 0
+    outs = [blk.outputs() for blk in blocks]
+    ret = None
+    for cycle in range(cycles):
+        wires = dict(params, go=int(cycle == 2), mem_rdata=rdata)
+        wires.update(mem_rdata_vld=vld, sm_ena0=1, sm_ena1=1)
+        for out in outs:
+            wires.update(out)
+        o = outs[0]
+        rdata, vld = raw, raw_vld
+        raw = raw_vld = 0
+        if o["mem_req"] and o["mem_write"]:
+            accesses.append(("W", o["mem_addr"], o["mem_wdata"]))
+        elif o["mem_req"]:
+            accesses.append(("R", o["mem_addr"]))
+            raw, raw_vld = o["mem_addr"], 1
+        outs = [blk.step(wires) for blk in blocks]
+        if ret is None and outs[0]["ret"]:
+            ret = cycle
+    return accesses, ret
+
+
+class Testing(unittest.TestCase):
+    def check(self, model, golden, inputs, cycles):
+        for cycle in range(cycles):
+            out = model.step(inputs)
+            expected = next(golden)
+            got = {name: out[name] for name in expected}
+            self.assertEqual(got, expected, f"cycle {cycle}")
+
+    def test_translate(self):
+        regs = {"x": 8, "y": 12, "go": 1}
+        tr = vlog_expr.Translator(lambda n: (n, regs[n]), {"PW": 8})
+        env = dict(x=0xF0, y=0xABC, go=1)
+        for expr, value in (
+            ("x + 8'h20", 0x10),
+            ("x + 'h20", 0x110),
+            ("~go", 0),
+            ("~x == 8'h0f", 1),
+            ("x + 8'h20 == 8'h10", 1),
+            ("x + 8'h20 == 'h10", 0),
+            ("y[PW-1:4]", 0xB),
+            ("{x[3:0], y[11], 2'b10}", 0b0000110),
+            ("{2{go, 1'b0}}", 0b1010),
+            ("go ? x - 1 : y", 0xEF),
+            ("&x[7:4] && |y", 1),
+            ("(x << 4) >> 8", 0),
+            ("x - 8'hf1", 0xFF),
+            ("x - 'hf1", 0xFFFFFFFF),
+        ):
+            code = tr.clean(vlog_expr.parse(expr))
+            self.assertEqual(eval(code, dict(env)), value, expr)
+        for stm, x, y in (
+            ("x = y", 0xBC, 0xABC),
+            ("x = x + 8'h20", 0x10, 0xABC),
+            ("x[3] = 1", 0xF8, 0xABC),
+            ("y[11:8] = x", 0xF0, 0x0BC),
+            ("{x, y} = 20'h12345", 0x12, 0x345),
+        ):
+            ns = dict(env)
+            exec("\n".join(tr.statement(stm)), ns)
+            self.assertEqual((ns["x"], ns["y"]), (x, y), stm)
+
+    def test_for(self):
+        (m,) = models("for1")
+        self.check(m, for1(), {"rst_n": 1}, 200)
+        for design in ("for2", "for3", "for4"):
+            (m,) = models(design)
+            self.check(m, forLoops(), {"rst_n": 1}, 1600)
+
+    def test_tpg(self):
+        timing = dict(
+            tHS_START=2, tHS_END=4, tHACT_START=5, tHACT_END=10, tH_END=12,
+            tVS_START=1, tVS_END=2, tVACT_START=3, tVACT_END=6, tV_END=8,
+        )
+        for variant in (1, 2, 3):
+            (m,) = models(f"tpg{variant}")
+            inputs = dict(timing, rst_n=1)
+            self.check(m, tpg(timing, variant), inputs, 400)
+
+    def test_motor(self):
+        (m,) = models("motor")
+        rnd = random.Random(1)
+        inputs = {"rst_n": 1}
+        golden = motor(inputs)
+        for cycle in range(500):
+            for name in ("up_limit", "dn_limit", "activate"):
+                inputs[name] = int(rnd.random() < 0.3)
+            out = m.step(inputs)
+            self.assertEqual(out, next(golden), f"cycle {cycle}")
+
+    def test_memory(self):
+        params = dict(
+            aBASE=0x100, bBASE=0x200, cBASE=0x300, aROWS=3, aCOLS=4,
+            bCOLS=5, aSTRIDE=8, bSTRIDE=8, cSTRIDE=8, rst_n=1,
+        )
+        # the tasks writing memory are inlined
+        blocks = models("test_seq1")
+        accesses, ret = runMemory(blocks, params, 100)
+        expected = [("W", 0x101 + i, 0xFFFFFFFF - 1 - i) for i in range(3)]
+        self.assertEqual(accesses, expected)
+        self.assertIsNotNone(ret)
+        blocks = models("test_seq2")
+        accesses, ret = runMemory(blocks, params, 100)
+        expected = [
+            ("W", 0x101 + 8 * i + j, 0xFFFFFFFF - 1 - i - j)
+            for i in range(3)
+            for j in range(4)
+        ]
+        self.assertEqual(accesses, expected)
+        # two reads per product and a write per element of the result,
+        # but MEM_done in the same cycle drops the last read of each one
+        # (and in matmul1 the write of the last column too)
+        for design in ("matmul1", "matmul2", "matmul3"):
+            expected = []
+            for i in range(3):
+                for j in range(4):
+                    for k in range(5):
+                        expected.append(("R", 0x100 + 8 * i + k))
+                        if k < 4:
+                            expected.append(("R", 0x200 + j + 8 * k))
+                    if j < 3 or design != "matmul1":
+                        expected.append(("W", 0x300 + 8 * i + j))
+            blocks = models(design, ena="sm_ena")
+            self.assertEqual(len(blocks), 2)
+            accesses, ret = runMemory(blocks, params, 1000)
+            # requests held for several cycles are repeated
+            addrs = [
+                a[:2]
+                for i, a in enumerate(accesses)
+                if i == 0 or a != accesses[i - 1]
+            ]
+            self.assertEqual(addrs, expected, design)
+            self.assertIsNotNone(ret, design)
+
+    def test_reset_ena(self):
+        (m,) = models("for1", ena="sm_ena")
+        inputs = {"rst_n": 1, "sm_ena0": 1}
+        for _ in range(5):
+            out = m.step(inputs)
+        self.assertEqual(out["cnt"], 5)
+        self.assertEqual(m.step(dict(inputs, sm_ena0=0)), out)
+        self.assertEqual(m.step(inputs)["cnt"], 6)
+        self.assertEqual(m.step(dict(inputs, rst_n=0))["cnt"], 0)
+        self.assertEqual(m.step(inputs)["cnt"], 1)
+
+    def test_errors(self):
+        with self.assertRaises(algofsm.AlgoFsmError) as cm:
+            models("spi-s")
+        self.assertIn(
+            "cannot assign to rxd_vld, not declared in SmBegin",
+            str(cm.exception),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
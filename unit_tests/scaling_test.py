@@ -0,0 +1,55 @@
+import unittest
+import sys
+sys.path.append("..")
+import algofsm
+from bench.scaling import gen
+from bench.scaling import fit
+from bench.scaling import stages
+from bench.scaling.__main__ import compare
+
+
+class Testing(unittest.TestCase):
+    def test_designs_convert(self):
+        for kw in (
+            {"ticks": 8, "depth": 3, "fanout": 3, "loop_mix": 0.0},
+            {"ticks": 8, "depth": 3, "fanout": 1, "loop_mix": 1.0},
+            {"ticks": 4, "depth": 0, "decls": 20},
+        ):
+            text = gen.gen_design(gen.DesignParams(**kw))
+            res = algofsm.convert(text)
+            self.assertEqual(res.blocks, 1)
+            run, sizes = stages.run_stages(text, trace_memory=True)
+            self.assertEqual(set(run.secs), set(stages.STAGES))
+            self.assertEqual(set(run.peak_kb), set(stages.STAGES))
+            self.assertGreater(sizes["states"], 1)
+
+    def test_fit(self):
+        ns = [10, 20, 40, 80]
+        res = fit.fit(ns, [3e-6 * n * n for n in ns])
+        self.assertAlmostEqual(res["exponent"], 2.0)
+        self.assertEqual(res["class"], "O(n^2)")
+        self.assertEqual(fit.fit(ns, [1e-3] * 4)["class"], "O(1)")
+
+    def test_compare(self):
+        def results(secs, exp):
+            points = [
+                {"n": n, "stages": {s: {"secs": secs} for s in stages.STAGES}}
+                for n in (1, 2, 3)
+            ]
+            fits = {s: {"exponent": exp} for s in stages.STAGES}
+            return {"series": {"ticks": {"points": points, "fit": fits}}}
+
+        base = results(0.1, 1.0)
+        self.assertEqual(compare(results(0.11, 1.2), base, 0.25, 0.5, 0), [])
+        self.assertEqual(
+            len(compare(results(0.2, 1.0), base, 0.25, 0.5, 0)),
+            len(stages.STAGES),
+        )
+        self.assertEqual(
+            len(compare(results(0.1, 2.0), base, 0.25, 0.5, 0)),
+            len(stages.STAGES),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
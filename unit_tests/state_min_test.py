@@ -0,0 +1,51 @@
+import unittest
+import sys
+sys.path.append("..")
+import algo_fsm
+import algofsm.fsm_converter_rtl as fsm_converter_rtl
+
+
+def convert(body):
+    args = algo_fsm.mainCmdParser(["-check"])
+    conv = fsm_converter_rtl.FsmConverterRTL(args)
+    out = conv.process_block(body, "", 0, "test")
+    states = [n for n in conv.parser.nodes if n.typ == "tk"]
+    return out, states
+
+
+class Testing(unittest.TestCase):
+    def test_identical_code_merged(self):
+        _, states = convert(
+            "if (c) begin x = 1; `tick; end\n"
+            "else begin x = 1; `tick; end\n"
+            "y = 2;\n"
+        )
+        self.assertEqual(len(states), 2)
+
+    def test_different_code_kept(self):
+        _, states = convert(
+            "if (c) begin `tick; x = 1; end\n"
+            "else begin `tick; x = 2; end\n"
+        )
+        self.assertEqual(len(states), 3)
+
+    def test_equivalent_cycles_merged(self):
+        # two cycles of states that only match up to their renaming
+        _, states = convert(
+            "if (c) begin\n"
+            "   while (1) begin x = 1; `tick; x = 2; `tick; end\n"
+            "end else begin\n"
+            "   while (1) begin x = 1; `tick; x = 2; `tick; end\n"
+            "end\n"
+        )
+        self.assertEqual(len(states), 3)
+
+    def test_self_loops_merged(self):
+        out, states = convert(
+            "`tick;\n"
+            "while (~go) `tick;\n"
+            "x = 1;\n"
+        )
+        # the wait state only leaves when go is set
+        self.assertEqual(len(states), 2)
+        self.assertIn("if (!(~go)) begin", out)
@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+import sys
+sys.path.append("..")
+import algofsm
+from algofsm import state_encoding
+from algofsm import state_profile
+
+# a ring of 8 states
+RING = (
+    "module m(input clk, input rst_n);\n"
+    "SmBegin\n"
+    "   reg [2:0] a = 0;\n"
+    "SmForever\n"
+    + "".join(f"    a = {i};\n    `tick;\n" for i in range(7))
+    + "SmEnd\nendmodule\n"
+)
+
+# FSM 0 in two instances (" and %) and FSM 1 with a 1 bit register ($)
+HEADER = """$date today $end
+$comment $scope module fake $end $end
+$timescale 1ns $end
+$scope module tb $end
+$var reg 1 ! clk $end
+$var reg 3 !" other [2:0] $end
+$scope module dut1 $end
+$scope begin algofsm0 $end
+$var reg 3 " state0_r [2:0] $end
+$var reg 3 # state0 [2:0] $end
+$upscope $end
+$scope begin algofsm1 $end
+$var reg 1 $ state1_r $end
+$upscope $end
+$upscope $end
+$scope module dut2 $end
+$scope begin algofsm0 $end
+$var reg 3 % state0_r [2:0] $end
+$upscope $end
+$upscope $end
+$upscope $end
+$enddefinitions $end
+"""
+
+
+def writeVcd(tmp, changes):
+    path = os.path.join(tmp, "tb.vcd")
+    with open(path, "w") as f:
+        f.write(HEADER + "#0\n$dumpvars\nbx \"\nbx %\nx$\n$end\n")
+        for t, change in enumerate(changes):
+            f.write(f"#{10 * t + 10}\n1!\n{change}\n#{10 * t + 15}\n0!\n")
+    return path
+
+
+class Testing(unittest.TestCase):
+    def test_read(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = writeVcd(tmp, [
+                'b0 "\nb0 %\n0$',
+                'b1 "\nb0 #\nb111 !"\n1$',
+                'b11 "\nb10 %',
+                'bx "\n0$',
+                'b0 "\nb1 %',
+            ])
+            counts = state_profile.readVcd(path, "algofsm", "state", "_r")
+        self.assertEqual(
+            counts,
+            {0: {(0, 1): 1, (1, 3): 1, (0, 2): 1, (2, 1): 1},
+             1: {(0, 1): 1, (1, 0): 1}},
+        )
+
+    def test_codes(self):
+        # hot transitions between states 0 and 3, 1 and 2
+        weights = {(0, 3): 50, (3, 0): 50, (1, 2): 10, (0, 1): 1}
+        codes = state_encoding.profileCodes(4, 2, weights)
+        self.assertEqual(sorted(codes), [0, 1, 2, 3])
+        self.assertEqual(bin(codes[0] ^ codes[3]).count("1"), 1)
+        self.assertEqual(bin(codes[1] ^ codes[2]).count("1"), 1)
+        self.assertLess(
+            state_encoding.toggles(codes, weights),
+            state_encoding.toggles(range(4), weights),
+        )
+
+    def test_convert(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # the ring bouncing between states 3 and 4 and 7 and 0
+            seq = [0, 1, 2, 3] + [4, 3] * 20 + [4, 5, 6, 7] + [0, 7] * 20
+            path = writeVcd(tmp, [f'b{s:b} "' for s in seq])
+            res = algofsm.convert(RING, {"state_profile": path}, "t.v")
+            self.assertEqual(res.warnings, [])
+            self.assertIn("(profile code, 89 toggles instead of 251)",
+                          res.output)
+            with self.assertRaises(algofsm.AlgoFsmError) as cm:
+                algofsm.convert(
+                    RING, {"state_profile": path, "encoding": "gray"}, "t.v"
+                )
+            self.assertIn("can't be combined with -encoding gray",
+                          str(cm.exception))
+            path = writeVcd(tmp, ['b0 "', 'b1001 "'])
+            with self.assertRaises(algofsm.AlgoFsmError) as cm:
+                algofsm.convert(RING, {"state_profile": path}, "t.v")
+            self.assertIn("state0_r takes the value 9 but there are 8 "
+                          "states", str(cm.exception))
+
+    def test_not_profiled(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = writeVcd(tmp, [])
+            res = algofsm.convert(RING, {"state_profile": path}, "t.v")
+        self.assertEqual(res.output, algofsm.convert(RING).output)
+        self.assertEqual(len(res.warnings), 1)
+        self.assertIn("no transition of state0_r", res.warnings[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
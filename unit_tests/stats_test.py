@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+import unittest
+import sys
+sys.path.append("..")
+import algo_fsm
+import algofsm.parse_input as parse_input
+
+TESTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../tests")
+
+
+def convert(design, *opts):
+    with tempfile.TemporaryDirectory() as tmp:
+        stats = os.path.join(tmp, "stats.json")
+        prof = os.path.join(tmp, "prof")
+        args = algo_fsm.mainCmdParser(
+            [
+                os.path.join(TESTS, design),
+                "-out",
+                os.path.join(tmp, "out.v"),
+                "-stats",
+                stats,
+                "-profile",
+                prof,
+                *opts,
+            ]
+        )
+        parse_input.parseInputFile(args)
+        with open(stats) as f:
+            return json.load(f), sorted(os.listdir(prof))
+
+# both branches lead to states with the same code
+MERGING = """
+SmBegin
+reg y = 0;
+SmForever
+if (a) begin
+    y = 1;
+    `tick;
+end
+else begin
+    y = 1;
+    `tick;
+end
+y = 2;
+SmEnd
+"""
+
+
+class Testing(unittest.TestCase):
+    def test_stats(self):
+        data, profiles = convert("matmul3/design.v")
+        self.assertEqual(profiles, ["SM0.pstats", "SM1.pstats"])
+        self.assertEqual([blk["sm"] for blk in data["blocks"]], [0, 1])
+        blk = data["blocks"][0]
+        self.assertEqual(
+            [p["name"] for p in blk["passes"]],
+            ["parse", "expand", "to_dag", "prune", "merge", "dump"],
+        )
+        self.assertEqual(blk["passes"][0]["nodes_before"]["live"], 0)
+        self.assertGreater(blk["passes"][0]["nodes_after"]["live"], 0)
+        self.assertEqual(blk["states"], 4)
+        self.assertEqual(blk["state_width"], 2)
+        self.assertGreater(blk["out_bytes"], 0)
+        self.assertIn("merges", blk)
+        self.assertEqual(blk["dropped_states"], 0)
+
+    def test_stats_jobs(self):
+        data, _ = convert("for1/design.v", "-jobs", "2")
+        self.assertEqual(len(data["blocks"]), 1)
+        self.assertEqual(len(data["blocks"][0]["passes"]), 6)
+
+    def test_merges_counted(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "in.v")
+            with open(src, "w") as f:
+                print(MERGING, file=f)
+            data, _ = convert(src)
+        blk = data["blocks"][0]
+        self.assertEqual((blk["merges"], blk["merge_iterations"]), (1, 1))
+        merge = blk["passes"][4]
+        live = merge["nodes_before"]["live"] - merge["nodes_after"]["live"]
+        self.assertEqual(live, blk["merges"])
+
+
+if __name__ == "__main__":
+    unittest.main()
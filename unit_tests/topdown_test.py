@@ -0,0 +1,107 @@
+import unittest
+import sys
+sys.path.append("..")
+import algofsm.topdown as td
+import algofsm.vlogparser as vlogparser
+import algofsm.dag_utils as dag_utils
+
+
+class Testing(unittest.TestCase):
+    def test_preds_follow_links(self):
+        p = td.TopDown(0, "test")
+        a = p.node_add("sn", "a")
+        b = p.node_add("sn", "b")
+        c = p.node_add("if", "c", nxt=b, child=[None, a, b])
+        self.assertEqual(set(b.preds), {(c, 2), (c, "nx")})
+        c.child[2] = a
+        self.assertEqual(set(b.preds), {(c, "nx")})
+        self.assertEqual(set(a.preds), {(c, 1), (c, 2)})
+        c.child = [None, None, None]
+        self.assertEqual(a.preds, {})
+        p.check_preds()
+
+    def test_preinsert(self):
+        p = td.TopDown(0, "test")
+        ref = p.node_add("sn", "ref")
+        x = p.node_add("sn", "x", nxt=ref)
+        y = p.node_add("if", "y", child=[None, ref])
+        new = p.node_add("sn", "new")
+        p.node_preinsert(new, ref)
+        self.assertIs(x.nxt, new)
+        self.assertIs(y.child[1], new)
+        self.assertIs(new.nxt, ref)
+        self.assertEqual(set(ref.preds), {(new, "nx")})
+        p.check_preds()
+
+    def test_links_to(self):
+        p = td.TopDown(0, "test")
+        dst = p.node_add("tk", "0")
+        src = p.node_add("eif", "c", nxt=dst, child=[None, dst, dst])
+        links = vlogparser.VlogParser.links_to(p, dst)
+        self.assertEqual(links, {src: ["bt", "bf", "nx"]})
+
+    def test_transformations_keep_index(self):
+        inp = (
+            "while(1) begin\n`tick;\n"
+            "for (i=0; i!=3; i=i+1) begin\n"
+            "  if (a) begin x = 1; `tick; end\n"
+            "  do begin `tick; end while (b);\n"
+            "end\n"
+            "end\n"
+        )
+        p = vlogparser.VlogParser(inp, 0, "test")
+        root = p.start_rule()
+        dag_utils.expand_tree_structs(p, root, root, "", 0, 0)
+        p.check_preds()
+        dag_utils.convert_to_dag(p, root, root, "", 0, 0)
+        p.check_preds()
+
+    def test_has_tick_cache_invalidated(self):
+        p = vlogparser.VlogParser("", 0, "test")
+        p.check = True
+        tk = p.node_add("tk", "0")
+        sn = p.node_add("sn", "x = 1")
+        body = p.node_add("sn", "y = 1", nxt=sn)
+        loop = p.node_add("wh", "c", child=[None, body])
+        top = p.node_add("if", "d", child=[None, loop])
+        self.assertFalse(p.has_tick(top))
+        # a tick appended deep in the body is seen from the top
+        sn.nxt = tk
+        self.assertTrue(p.has_tick(top))
+        p.node_rm(tk)
+        self.assertFalse(p.has_tick(top))
+        loop.child[1] = p.node_add("tk", "1")
+        self.assertTrue(p.has_tick(top))
+
+    def test_compact(self):
+        p = td.TopDown(0, "test")
+        p.check = True
+        a = p.node_add("sn", "a")
+        b = p.node_add("sn", "b", nxt=a)
+        c = p.node_add("if", "c", nxt=a, child=[None, b])
+        p.node_rm(b)
+        c.child[1] = a
+        self.assertEqual(p.compact(), 1)
+        self.assertEqual(p.nodes, [a, c])
+        self.assertEqual(set(a.preds), {(c, 1), (c, "nx")})
+        self.assertIsNone(b.nxt)
+        self.assertEqual(p.compact(), 0)
+        p.check_preds()
+        # uids keep growing, they are not reused
+        self.assertEqual(p.node_add("sn", "d").uid, 3)
+        self.assertFalse(hasattr(a, "__dict__"))
+
+    def test_transformations_compact(self):
+        inp = (
+            "while(1) begin\n`tick;\n"
+            "do begin x = 1; `tick; end while (b);\n"
+            "end\n"
+        )
+        p = vlogparser.VlogParser(inp, 0, "test")
+        p.check = True
+        root = p.start_rule()
+        dag_utils.expand_tree_structs(p, root, root, "", 0, 0)
+        dag_utils.convert_to_dag(p, root, root, "", 0, 0)
+        self.assertGreater(p.compact(), 0)
+        self.assertFalse(any(n.typ.startswith("rm") for n in p.nodes))
+        p.check_preds()
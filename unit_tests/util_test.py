@@ -74,3 +74,27 @@ class Testing(unittest.TestCase):
         self.assertTrue(utils. is_nonblocking_assign(" asd12_22 <= asdf "))
         self.assertFalse(utils. is_nonblocking_assign(" asd12_22 = asdf "))
         self.assertFalse(utils. is_nonblocking_assign(" if (a <-5) x=1 "))
+
+    def test_dumper(self):
+        out = utils.Dumper()
+        out.dump()
+        out.dump("a", "b")
+        out.dump_nonl("c")
+        lines = [str(i) for i in range(3 * utils.Dumper.BLOCK)]
+        for line in lines:
+            out.dump(line)
+        self.assertEqual(out.val(), "\n".join(["", "a bc"] + lines))
+
+    def test_code_writer(self):
+        out = utils.Dumper()
+        out.dump("top")
+        w = utils.CodeWriter(out, "  ", ">")
+        out.dump()
+        w.line("if (a) begin")
+        w.indent()
+        w.raw("// x\n")
+        w.dedent()
+        w.line("end")
+        out.dump_nonl("tail")
+        self.assertEqual(out.val(), "top\n>if (a) begin\n>  // x\n>end\ntail")
+        self.assertEqual(w.size, len(out.val()) - len("top\n") - len("tail"))
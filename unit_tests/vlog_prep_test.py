@@ -0,0 +1,112 @@
+import os
+import re
+import tempfile
+import unittest
+import sys
+sys.path.append("..")
+import algofsm
+from algofsm.vlog_prep import VlogPreprocessor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def prep(text, defines=None, include_dirs=None):
+    return VlogPreprocessor(defines, include_dirs).process(text, "t.v")
+
+
+class Testing(unittest.TestCase):
+    def test_macros(self):
+        text = (
+            "`define incr(x, amnt=1'b1)  x = x + amnt // comment\n"
+            "`define wait1(cond) `tick; while(!(cond)) `tick \n"
+            "`define W 8\n"
+            "`incr(a); `incr( b , 2);\n"
+            "`wait1(go[0]);\n"
+            "reg [`W-1:0] r; // `W kept in comments\n"
+            '$display("`W");\n'
+        )
+        self.assertEqual(
+            prep(text),
+            "\n\n\n"
+            "a = a + 1'b1; b = b + 2;\n"
+            "`tick; while(!(go[0])) `tick;\n"
+            "reg [8-1:0] r; // `W kept in comments\n"
+            '$display("`W");\n',
+        )
+
+    def test_arguments(self):
+        text = (
+            "`define next(var, limit, inc=1'b1) var = var + inc; "
+            "end while(var != limit)\n"
+            "`define f(a, b) {a, b}\n"
+            "`next(x, f(1, 2));\n"
+            "`f((a, b), c)\n"
+            "`f(`f(x, y), z)\n"
+        )
+        self.assertEqual(
+            prep(text),
+            "\n\n"
+            "x = x + 1'b1; end while(x != f(1, 2));\n"
+            "{(a, b), c}\n"
+            "{{x, y}, z}\n",
+        )
+
+    def test_conditionals(self):
+        text = (
+            "`ifdef BEHAV\n"
+            "a\n"
+            "`elsif GLS\n"
+            "b\n"
+            "`else\n"
+            "c\n"
+            "`endif\n"
+            "`ifndef BEHAV d `endif\n"
+        )
+        self.assertEqual(prep(text, ["BEHAV=1"]), "\na\n\n\n\n\n\n\n")
+        self.assertEqual(prep(text, ["GLS"]), "\n\n\nb\n\n\n\n d \n")
+        self.assertEqual(prep(text), "\n\n\n\n\nc\n\n d \n")
+        self.assertEqual(
+            prep("`define A\n`undef A\n`ifdef A\nx\n`endif\n"), "\n\n\n\n\n"
+        )
+
+    def test_include(self):
+        with tempfile.TemporaryDirectory() as d:
+            with open(os.path.join(d, "defs.vh"), "w") as f:
+                f.write("`define N 4\nwire w;\n")
+            p = VlogPreprocessor(include_dirs=[d])
+            out = p.process('`include "defs.vh"\nreg [`N:0] r;\n', "t.v")
+            self.assertEqual(out, "\nwire w;\n\nreg [4:0] r;\n")
+            self.assertEqual(p.included, [os.path.join(d, "defs.vh")])
+
+    def test_errors(self):
+        for text, line, msg in (
+            ("`foo\n", 1, "macro `foo is not defined"),
+            ("\n`ifdef A\n", 3, "`ifdef/`ifndef without `endif"),
+            ("`endif\n", 1, "`endif without `ifdef/`ifndef"),
+            ("`define m(a) a\n`m\n", 2, "macro `m expects arguments"),
+            ('`include "none.vh"\n', 1, "`include: none.vh not found"),
+        ):
+            with self.assertRaises(algofsm.AlgoFsmError) as cm:
+                prep(text)
+            self.assertEqual(str(cm.exception), msg)
+            self.assertEqual(
+                (cm.exception.file, cm.exception.line), ("t.v", line)
+            )
+
+    def test_designs(self):
+        # spi-s includes ../../common/control.vh, relative to its directory
+        for design in ("for4", "matmul3", "spi-s"):
+            file = os.path.join(ROOT, "tests", design, "design.v")
+            with open(file) as f:
+                text = f.read()
+            res = algofsm.convert(text, {"prep": True}, file=file)
+            # macros are only left in comments
+            uses = re.search(r"^[^/]*`(?!tick)\w", res.output, re.M)
+            self.assertIsNone(uses)
+            behav = {"prep": True, "behav": True, "D": ["BEHAV"]}
+            res_behav = algofsm.convert(text, behav, file=file)
+            self.assertEqual(res_behav.blocks, res.blocks)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import unittest
+import sys
+sys.path.append("..")
+import algo_fsm
+from algofsm import watch
+
+TESTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../tests")
+
+INCLUDES = """`include "inc.vh"
+module m(input clk, input rst_n, input go);
+SmBegin
+   reg [3:0] a = 0;
+SmForever
+   while (~go) `tick;
+   a = `VAL;
+   `tick;
+SmEnd
+endmodule
+"""
+
+
+def convert(src, dst, *opts):
+    args = algo_fsm.mainCmdParser([src, "-out", dst, *opts])
+    w = watch.WatchedFile(args, src, dst)
+    w.poll()
+
+
+class Testing(unittest.TestCase):
+    def test_only_changed_blocks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "design.v")
+            dst = os.path.join(tmp, "out.v")
+            shutil.copy(os.path.join(TESTS, "matmul3", "design.v"), src)
+            args = algo_fsm.mainCmdParser([src, "-out", dst])
+            w = watch.WatchedFile(args, src, dst)
+            self.assertTrue(w.poll())
+            self.assertFalse(w.poll())
+            self.assertEqual(w.convert(), (0, 2))
+
+            with open(src) as f:
+                text = f.read()
+            with open(src, "w") as f:
+                f.write(text.replace("acc_rdy=1;", "acc_rdy=1; acc=0;", 1))
+            self.assertEqual(w.convert(), (1, 2))
+            with open(dst) as f:
+                out = f.read()
+            convert(src, dst)
+            with open(dst) as f:
+                self.assertEqual(out, f.read())
+
+    def test_lines_added_above(self):
+        # blocks that only moved are kept, unless their code names lines
+        for opts, changed in (
+            ([], 0),
+            (["-behav"], 2),
+            (["-latency"], 2),
+            (["-perfcounters"], 2),
+            (["-max_depth", "20"], 2),
+        ):
+            with tempfile.TemporaryDirectory() as tmp:
+                src = os.path.join(tmp, "design.v")
+                dst = os.path.join(tmp, "out.v")
+                shutil.copy(os.path.join(TESTS, "matmul3", "design.v"), src)
+                args = algo_fsm.mainCmdParser([src, "-out", dst, *opts])
+                w = watch.WatchedFile(args, src, dst)
+                w.poll()
+                with open(src) as f:
+                    text = f.read()
+                with open(src, "w") as f:
+                    f.write("// a comment\n" + text)
+                self.assertEqual(w.convert(), (changed, 2))
+                with open(dst) as f:
+                    out = f.read()
+                convert(src, dst, *opts)
+                with open(dst) as f:
+                    self.assertEqual(out, f.read())
+
+    def test_prep_include(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "design.v")
+            inc = os.path.join(tmp, "inc.vh")
+            dst = os.path.join(tmp, "out.v")
+            with open(src, "w") as f:
+                f.write(INCLUDES)
+            with open(inc, "w") as f:
+                print("`define VAL 1", file=f)
+            args = algo_fsm.mainCmdParser([src, "-out", dst, "-prep"])
+            w = watch.WatchedFile(args, src, dst)
+            self.assertTrue(w.poll())
+            self.assertEqual(w.deps, [src, inc])
+            self.assertFalse(w.poll())
+            with open(inc, "w") as f:
+                print("`define VAL 3", file=f)
+            os.utime(inc, ns=(0, 0))
+            self.assertTrue(w.poll())
+            with open(dst) as f:
+                self.assertIn("a = 3;", f.read())
+
+    def test_error_keeps_output(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "design.v")
+            dst = os.path.join(tmp, "out.v")
+            shutil.copy(os.path.join(TESTS, "matmul3", "design.v"), src)
+            args = algo_fsm.mainCmdParser([src, "-out", dst])
+            w = watch.WatchedFile(args, src, dst)
+            w.poll()
+            with open(dst) as f:
+                out = f.read()
+            with open(src, "a") as f:
+                print("SmBegin\nSmForever\n", file=f)
+            os.utime(src, ns=(0, 0))
+            self.assertFalse(w.poll())
+            with open(dst) as f:
+                self.assertEqual(out, f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()